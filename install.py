@@ -1,35 +1,293 @@
-from collections import ChainMap
 import collections.abc
+import concurrent.futures
+import contextlib
+import copy
+import fcntl
+import filecmp
+import fnmatch
+import graphlib
+import hashlib
+import io
+import json
 import logging
 import os
+import platform
 import re
+import shlex
 import shutil
+import signal
+import stat
 import subprocess
+import sys
+import tarfile
 from pathlib import Path
 import tempfile
+import threading
+import time
 from typing import Iterable
 
 import click
-from ruamel.yaml import YAML
 
 
-yaml = YAML()
+def YAML(**kwargs):
+    """
+    Create a ruamel YAML instance. ruamel.yaml is imported on first use
+    so listing and planning from the cached catalogue do not load it.
+    YAML objects are not thread-safe, callers create their own instances.
+    """
+    from ruamel.yaml import YAML
+
+    return YAML(**kwargs)
+
 
+PLACEHOLDER_PATTERN = re.compile(r"\{\{ ?([\w\-]+:[\w\-\/\.]+) ?\}\}")
+
+
+class UnresolvedPlaceholdersError(KeyError):
+    """
+    Raised when some of the placeholders used in a template could not be
+    resolved. All the unresolved keys are reported together.
+    """
 
-class TemplateYamlLoader(YAML):
-    def __init__(self, mapping, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self._mapping = mapping
-        self.Constructor.add_constructor(
-            "tag:yaml.org,2002:str", self.replace_placeholder
+    def __init__(self, errors: dict):
+        super().__init__(*errors)
+        self.errors = errors
+
+    def __str__(self):
+        return "Unresolved placeholders: " + ", ".join(
+            f"{key} ({error})" for key, error in self.errors.items()
         )
 
-    def _match_repl(self, match):
-        return self._mapping[match.group(1)]
 
-    def replace_placeholder(self, loader, node):
-        value = loader.construct_scalar(node)
-        return re.sub(r"\{\{ ?([\w\-]+:[\w\-\/\.]+) ?\}\}", self._match_repl, value)
+class CompiledString:
+    """
+    String split into literal parts and placeholder keys once, so
+    rendering it is a join of the parts and the resolved values.
+    """
+
+    __slots__ = ("parts",)
+
+    def __init__(self, text: str):
+        # literal parts at even positions, placeholder keys at odd ones
+        self.parts = PLACEHOLDER_PATTERN.split(text)
+
+    @property
+    def keys(self):
+        return self.parts[1::2]
+
+    def render(self, context: collections.abc.Mapping) -> str:
+        if len(self.parts) == 1:
+            return self.parts[0]
+        parts = self.parts.copy()
+        parts[1::2] = [context[key] for key in self.keys]
+        return "".join(parts)
+
+
+def compile_tree(data):
+    """
+    Find string values containing placeholders in the nested mappings
+    and lists. Tagged scalars, such as ``!include``, are not strings
+    and are left as they are.
+
+    :return:
+        List of (container, key, compiled string) references.
+    """
+    slots = []
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, collections.abc.Mapping):
+            items = node.items()
+        elif isinstance(node, list):
+            items = enumerate(node)
+        else:
+            continue
+        for key, value in items:
+            if isinstance(value, str):
+                if PLACEHOLDER_PATTERN.search(value):
+                    slots.append((node, key, CompiledString(value)))
+            else:
+                stack.append(value)
+    return slots
+
+
+class CompiledTree:
+    """
+    Nested mappings and lists whose strings contain placeholders, such as
+    structured install file variables. Rendering returns a new copy.
+    """
+
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        self.data = data
+
+    @property
+    def keys(self):
+        return [key for _, _, compiled in compile_tree(self.data) for key in compiled.keys]
+
+    def render(self, context: collections.abc.Mapping):
+        data = copy.deepcopy(self.data)
+        for node, key, compiled in compile_tree(data):
+            node[key] = compiled.render(context)
+        return data
+
+
+def compile_value(value):
+    """Compile the placeholders of a string or of the strings nested in the value."""
+    if isinstance(value, str):
+        return CompiledString(value)
+    if isinstance(value, (collections.abc.Mapping, list)):
+        return CompiledTree(value)
+    return value
+
+
+class ServiceTemplate:
+    """
+    Service template loaded and compiled once. Rendering only resolves
+    the placeholders actually used in the template.
+
+    :param Path path:
+        Path to the service template file.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        # YAML objects are not thread-safe, each template has its own
+        self.yaml = YAML()
+        with tracer.span("template.load", template=path.name):
+            self.data = self.yaml.load(path)
+            self.slots = compile_tree(self.data)
+
+    @property
+    def keys(self) -> set[str]:
+        return {key for _, _, compiled in self.slots for key in compiled.keys}
+
+    def render(self, context: "TemplateContext"):
+        """
+        Replace placeholders in the template data with the values from
+        the context and return the data.
+
+        :raise UnresolvedPlaceholdersError:
+            If any of the placeholders could not be resolved.
+        """
+        context.resolve(self.keys)
+        for node, key, compiled in self.slots:
+            node[key] = compiled.render(context)
+        self.slots = []
+        return self.data
+
+
+class TemplateContext(collections.abc.Mapping):
+    """
+    Placeholder values looked up in the maps in order and memoized, so each
+    key is resolved at most once. ``var:`` keys are rendered from the
+    variables which may refer to other variables; they are resolved after
+    the variables they depend on. Placeholders in the strings nested in
+    mapping and list variables are rendered too.
+
+    :param maps:
+        Mappings providing placeholder values.
+    :param dict variables:
+        Variables of the install file, without the ``var:`` prefix.
+    """
+
+    def __init__(self, *maps, variables=None):
+        self.maps = list(maps)
+        self.variables = {
+            f"var:{key}": compile_value(value)
+            for key, value in (variables or {}).items()
+        }
+        self._cache = {}
+
+    def __getitem__(self, key):
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        if key in self.variables:
+            self._resolve_variables(key)
+        else:
+            self._cache[key] = self._lookup(key)
+        return self._cache[key]
+
+    def _lookup(self, key):
+        for mapping in self.maps:
+            try:
+                return mapping[key]
+            except KeyError:
+                pass
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter({*self.variables, *self._cache})
+
+    def __len__(self):
+        return len({*self.variables, *self._cache})
+
+    def dependencies(self, keys: Iterable[str]) -> dict[str, set[str]]:
+        """
+        Return the graph of variables used by the keys, directly or
+        through other variables.
+        """
+        graph = {}
+        stack = [key for key in keys if key in self.variables]
+        while stack:
+            key = stack.pop()
+            if key in graph:
+                continue
+            value = self.variables[key]
+            keys = value.keys if isinstance(value, (CompiledString, CompiledTree)) else []
+            graph[key] = {k for k in keys if k in self.variables}
+            stack.extend(graph[key])
+        return graph
+
+    def required_keys(self, keys: Iterable[str]) -> set[str]:
+        """
+        Return the keys together with the keys used by the variables
+        they refer to.
+        """
+        keys = set(keys)
+        for key in self.dependencies(keys):
+            value = self.variables[key]
+            if isinstance(value, (CompiledString, CompiledTree)):
+                keys.update(value.keys)
+        return keys
+
+    def _resolve_variables(self, key):
+        sorter = graphlib.TopologicalSorter(self.dependencies([key]))
+        try:
+            order = list(sorter.static_order())
+        except graphlib.CycleError as e:
+            raise ValueError(f"Circular variable references: {' -> '.join(e.args[1])}")
+        for var_key in order:
+            if var_key not in self._cache:
+                value = self.variables[var_key]
+                if isinstance(value, (CompiledString, CompiledTree)):
+                    value = value.render(self)
+                self._cache[var_key] = value
+
+    def resolve(self, keys: Iterable[str]):
+        """
+        Resolve all the keys.
+
+        :raise UnresolvedPlaceholdersError:
+            Listing every key that could not be resolved.
+        """
+        errors = {}
+        for key in sorted(set(keys)):
+            try:
+                self[key]
+            # the docker map reports missing executables and failed
+            # introspection with OSError and CalledProcessError
+            except (KeyError, ValueError, OSError, subprocess.CalledProcessError) as e:
+                errors[key] = e
+        if errors:
+            raise UnresolvedPlaceholdersError(errors)
+
+
+INSTALLER_NAMES = ("conda", "docker", "skip")
+COPY_MODES = ("auto", "reflink", "hardlink", "symlink", "copy")
 
 
 @click.command()
@@ -42,12 +300,375 @@ class TemplateYamlLoader(YAML):
     default=[""],
     show_default="all services",
 )
+@click.option(
+    "--installer",
+    "-i",
+    "installer_choices",
+    multiple=True,
+    metavar="[PATTERN=]INSTALLER[,INSTALLER...]",
+    help="Installer preference for services matching the pattern. "
+    "Implies --unattended.",
+)
+@click.option(
+    "--plan-file",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    help="YAML file mapping service patterns to installers. Implies --unattended.",
+)
+@click.option("--unattended", is_flag=True, help="Install without prompting.")
+@click.option(
+    "--list",
+    "list_services",
+    is_flag=True,
+    help="List the selected services and their installers and exit.",
+)
+@click.option("--jobs", "-j", type=click.IntRange(min=1), default=4, show_default=True)
+@click.option("--conda-jobs", type=click.IntRange(min=1), default=1, show_default=True)
+@click.option("--docker-jobs", type=click.IntRange(min=1), default=2, show_default=True)
+@click.option("--copy-jobs", type=click.IntRange(min=1), default=2, show_default=True)
+@click.option(
+    "--copy-mode",
+    type=click.Choice(COPY_MODES),
+    default="copy",
+    show_default=True,
+    help="How data directories are deployed to the project. "
+    "auto uses reflinks or hardlinks where possible and falls back to copying. "
+    "Hardlinked and symlinked files are shared with the installer checkout.",
+)
+@click.option(
+    "--copy-threads",
+    type=click.IntRange(min=1),
+    default=8,
+    show_default=True,
+    help="Number of files copied concurrently.",
+)
+@click.option(
+    "--overwrite/--keep-existing",
+    default=None,
+    help="Overwrite or keep existing environments and data directories. "
+    "Prompt if not specified, keep existing in unattended mode.",
+)
+@click.option(
+    "--env-store",
+    type=click.Path(file_okay=False, path_type=Path),
+    envvar="SLIVKA_ENV_STORE",
+    help="Directory of the conda environment store shared between projects.",
+)
+@click.option(
+    "--env-store-mode",
+    type=click.Choice(["link", "clone"]),
+    default="link",
+    show_default=True,
+    help="Symlink or clone environments from the store.",
+)
+@click.option(
+    "--gc-env-store",
+    is_flag=True,
+    help="Remove environments not used by any project from the store and exit.",
+)
+@click.option(
+    "--relock",
+    is_flag=True,
+    help="Solve conda environments and rewrite lock files even if they are up to date.",
+)
+@click.option(
+    "--launch-mode",
+    type=click.Choice(["direct", "conda-run"]),
+    default="direct",
+    show_default=True,
+    help="Run conda tools directly with the activation captured at install time "
+    "or through 'conda run' on every job.",
+)
+@click.option(
+    "--job-concurrency",
+    multiple=True,
+    metavar="[PROFILE=]JOBS",
+    help="Number of jobs of the runner profile expected to run at the same time. "
+    "Multi-threaded tools get an equal share of the cores, or the service's "
+    "default number of threads if not specified.",
+)
+@click.option(
+    "--image-cache/--no-image-cache",
+    default=True,
+    show_default=True,
+    help="Cache environment variables and executable paths resolved in docker images.",
+)
+@click.option(
+    "--bake",
+    is_flag=True,
+    help="Build all docker images up front with a single 'docker buildx bake'. "
+    "Unattended installations only.",
+)
+@click.option(
+    "--build-cache",
+    type=click.Path(file_okay=False, path_type=Path),
+    help="Local directory to import and export docker build cache. "
+    "Requires a buildx builder with the docker-container driver.",
+)
+@click.option(
+    "--pull",
+    type=click.Choice(["always", "missing"]),
+    default="always",
+    show_default=True,
+    help="Pull images always or only if missing locally.",
+)
+@click.option(
+    "--docker-pool",
+    type=click.IntRange(min=0),
+    default=0,
+    show_default=True,
+    help="Run docker jobs in up to N warm containers per image instead of "
+    "starting a container for every job.",
+)
+@click.option(
+    "--docker-plan",
+    is_flag=True,
+    help="Launch docker jobs from a plan written at install time, binding the "
+    "directories of the input files and passing only the allowed variables.",
+)
+@click.option(
+    "--docker-env",
+    "docker_env_names",
+    multiple=True,
+    metavar="NAME",
+    help="Variable or glob pattern passed to docker jobs launched from a plan, "
+    "in addition to the service's env.",
+)
+@click.option(
+    "--export-images",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="Save docker images of the selected services to the bundle file and exit.",
+)
+@click.option(
+    "--import-images",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    help="Load docker images from the bundle file and exit.",
+)
+@click.option(
+    "--pack-envs",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="Pack conda environments and data of the selected services installed "
+    "in the project into a relocatable archive and exit.",
+)
+@click.option(
+    "--unpack-envs",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    help="Unpack and relocate the archive created with --pack-envs into the project and exit.",
+)
+@click.option(
+    "--dry-run",
+    is_flag=True,
+    help="Print the actions the installer would take for each service and exit "
+    "without running conda, docker or slivka.",
+)
+@click.option(
+    "--force",
+    is_flag=True,
+    help="Reinstall services even if their inputs have not changed.",
+)
+@click.option(
+    "--verify",
+    is_flag=True,
+    help="Run the tests of the selected services installed in the project and exit.",
+)
+@click.option(
+    "--verify-jobs",
+    type=click.IntRange(min=1),
+    show_default="available cores",
+    help="Number of service tests run at the same time.",
+)
+@click.option(
+    "--regression-threshold",
+    type=click.FloatRange(min=0),
+    default=0.25,
+    show_default=True,
+    help="Relative increase of a test's wall or CPU time over the baseline "
+    "reported as a regression.",
+)
+@click.option(
+    "--update-baseline",
+    is_flag=True,
+    help="Record the results of the passed tests as the new baseline.",
+)
+@click.option(
+    "--trace",
+    "trace_file",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="Write timed spans of the installation phases to the file as JSON lines.",
+)
+@click.option(
+    "--chrome-trace",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="Write the installation phases to the file as a Chrome/Perfetto trace.",
+)
+@click.option(
+    "--profile",
+    "profile_file",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="Profile the installer with cProfile and dump the stats to the file.",
+)
 @click.option("--log-level", type=click.Choice(["DEBUG", "INFO", "WARNING", "ERROR"]), default="WARNING")
-@click.argument("path", type=Path)
-def main(conda_exe, services, log_level: str, path: Path):
+@click.argument("path", type=Path, required=False)
+def main(
+    conda_exe,
+    services,
+    installer_choices,
+    plan_file,
+    unattended,
+    list_services,
+    jobs,
+    conda_jobs,
+    docker_jobs,
+    copy_jobs,
+    copy_mode,
+    copy_threads,
+    overwrite,
+    env_store,
+    env_store_mode,
+    gc_env_store,
+    relock,
+    launch_mode,
+    job_concurrency,
+    image_cache,
+    bake,
+    build_cache,
+    pull,
+    docker_pool,
+    docker_plan,
+    docker_env_names,
+    export_images,
+    import_images,
+    pack_envs,
+    unpack_envs,
+    dry_run,
+    force,
+    verify,
+    verify_jobs,
+    regression_threshold,
+    update_baseline,
+    trace_file,
+    chrome_trace,
+    profile_file,
+    log_level: str,
+    path: Path,
+):
     logging.basicConfig(level=getattr(logging, log_level))
+    if trace_file or chrome_trace or profile_file:
+        tracer.start(trace_file, profile=profile_file is not None)
+        ctx = click.get_current_context()
+        ctx.call_on_close(lambda: tracer.finish(chrome_trace, profile_file))
+        ctx.with_resource(tracer.profile_thread())
+    if env_store is not None:
+        env_store = CondaEnvStore(env_store, mode=env_store_mode)
+    if gc_env_store:
+        if env_store is None:
+            raise click.UsageError("--gc-env-store requires --env-store.")
+        removed = env_store.collect_garbage()
+        click.echo(f"Removed {len(removed)} conda env(s) from the store.")
+        return
+    services_root = Path.cwd() / "services"
+    with tracer.span("catalogue.scan"):
+        catalogue = ServiceCatalogue(
+            services_root, ServiceCatalogue.default_cache_file(services_root)
+        )
+    selected = catalogue.select(services)
+    if list_services:
+        for entry in selected:
+            label = f"{entry['name']}:{entry['version']}"
+            installer_names = ", ".join(entry["installers"]) or "none"
+            click.echo(f"{entry['base-name']:<28} {label:<40} [{installer_names}]")
+        return
+    service_files = [catalogue.path(entry) for entry in selected]
+    if export_images is not None or import_images is not None:
+        docker_installer = DockerInstaller()
+        docker_files = [
+            service_file.with_name(service_file.name.replace(".service.yaml", ".docker.yaml"))
+            for service_file in sorted(service_files)
+        ]
+        docker_files = [file for file in docker_files if file.is_file()]
+        if import_images is not None:
+            docker_installer.import_images(import_images, docker_files)
+        if export_images is not None:
+            docker_installer.export_images(docker_files, export_images)
+        return
+    if path is None:
+        raise click.UsageError("Missing argument 'PATH'.")
+    if pack_envs is not None:
+        pack_conda_envs(
+            path,
+            sorted(f.name[: -len(".service.yaml")] for f in service_files),
+            pack_envs,
+        )
+        return
+    if unpack_envs is not None:
+        init_slivka(path)
+        copy_shared_files(path)
+        unpack_conda_envs(unpack_envs, path, conda_exe)
+        return
+    if verify:
+        passed = verify_services(
+            path,
+            [entry["base-name"] for entry in selected],
+            jobs=verify_jobs,
+            threshold=regression_threshold,
+            update_baseline=update_baseline,
+        )
+        if not passed:
+            raise SystemExit(1)
+        return
+    installer_rules = []
+    if plan_file is not None:
+        installer_rules.extend(load_plan_file(plan_file))
+    try:
+        installer_rules.extend(parse_installer_choices(installer_choices))
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--installer")
+    try:
+        concurrency = parse_job_concurrency(job_concurrency)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--job-concurrency")
+    unattended = unattended or bool(installer_rules)
+    if unattended and overwrite is None:
+        overwrite = False
+    job_threads = ThreadAllocation(concurrency=concurrency)
+    if dry_run:
+        print_install_plan(
+            selected,
+            catalogue,
+            installer_rules,
+            path,
+            force=force,
+            fingerprint_options={
+                name: rendering_options(
+                    name,
+                    job_threads,
+                    launch_mode=launch_mode,
+                    pool_size=docker_pool,
+                    launch_plan=docker_plan,
+                    env_names=docker_env_names,
+                )
+                for name in ("conda", "docker")
+            },
+            copy_mode=copy_mode,
+            env_store=env_store,
+            relock=relock,
+            overwrite=overwrite,
+        )
+        return
+    limits = PhaseLimits(conda=conda_jobs, docker=docker_jobs, copy=copy_jobs)
+
     try:
-        conda_installer = CondaInstaller(conda_exe, path / "conda_env")
+        conda_installer = CondaInstaller(
+            conda_exe,
+            path / "conda_env",
+            limits=limits,
+            overwrite=overwrite,
+            env_store=env_store,
+            relock=relock,
+            copy_mode=copy_mode,
+            copy_threads=copy_threads,
+            launch_mode=launch_mode,
+            job_threads=job_threads,
+        )
     except Exception as e:
         conda_installer = None
         click.echo(f"Failed to init conda installer: {e}")
@@ -55,55 +676,119 @@ def main(conda_exe, services, log_level: str, path: Path):
         click.echo(f"Conda available: '{conda_installer.conda_exe}'")
 
     try:
-        docker_installer = DockerInstaller()
+        docker_installer = DockerInstaller(
+            limits=limits,
+            overwrite=overwrite,
+            copy_mode=copy_mode,
+            copy_threads=copy_threads,
+            image_cache=(
+                ImageIntrospectionCache(installer_cache_dir() / "images")
+                if image_cache else None
+            ),
+            build_cache=build_cache,
+            pull_policy=pull,
+            job_threads=job_threads,
+            pool_size=docker_pool,
+            launch_plan=docker_plan,
+            env_names=docker_env_names,
+        )
     except Exception as e:
         docker_installer = None
         click.echo(f"Failed to init docker installer: {e}")
     else:
         click.echo(f"Docker available: '{docker_installer.docker_exe}'")
+        if build_cache is not None and buildx_driver(docker_installer.docker_exe) == "docker":
+            raise click.BadParameter(
+                "The local build cache is not supported by the 'docker' driver "
+                "of the active buildx builder. Create and select a builder with "
+                "'docker buildx create --use --driver docker-container'.",
+                param_hint="--build-cache",
+            )
 
-    service_files = [
-        path
-        for path in Path.cwd().joinpath("services").glob("**/*.service.yaml")
-        for name in services
-        if path.name.startswith(name)
-    ]
     if not service_files:
         click.echo("Nothing to install.")
         raise click.Abort
     click.echo("Installing:")
-    for service_file in sorted(service_files):
-        yaml_data = yaml.load(service_file)
-        click.echo(f" - {yaml_data['name']}:{yaml_data['version']}")
-    click.confirm("Confirm", default=True, abort=True)
+    for entry in selected:
+        click.echo(f" - {entry['name']}:{entry['version']}")
+    if not unattended:
+        click.confirm("Confirm", default=True, abort=True)
 
     init_slivka(path)
     copy_shared_files(path)
 
+    state = InstallState(path)
+    interrupted = state.begin_run()
+    if interrupted:
+        click.echo(f"Resuming interrupted installation of: {', '.join(sorted(interrupted))}")
+    installers = {"conda": conda_installer, "docker": docker_installer}
+    if unattended:
+        report = InstallReport()
+        tasks = []
+        for service_file in service_files:
+            base_name = service_file.name[: -len(".service.yaml")]
+            applicable = applicable_installers(service_file, installers)
+            choice = choose_installer(base_name, installer_rules, applicable)
+            if choice is None:
+                report.add(base_name, None, skipped="no applicable installer")
+            elif choice == "skip":
+                report.add(base_name, None, skipped="skipped by plan")
+            else:
+                installer, installer_file = applicable[choice]
+                fingerprint = service_fingerprint(
+                    service_file, choice, installer.rendering_options()
+                )
+                if not force and state.is_up_to_date(base_name, choice, fingerprint):
+                    report.add(base_name, choice, skipped="up to date")
+                    continue
+                tasks.append((base_name, choice, installer, installer_file, fingerprint))
+        if bake and docker_installer is not None:
+            bake_images(
+                docker_installer,
+                [task[3] for task in tasks if task[1] == "docker"],
+            )
+        install_concurrently(tasks, path, jobs, report, state=state)
+        state.end_run()
+        report.print()
+        if report.failed:
+            raise SystemExit(1)
+        return
+
+    if bake:
+        # installers are chosen one service at a time, images are built
+        # only for the services installed with docker
+        click.echo("Ignoring --bake in interactive mode, images are built one by one.")
     for service_file in service_files:
         base_name = service_file.name[: -len(".service.yaml")]
-        click.echo(f"Installing: {base_name}")
-        applicable_installers = []
+        applicable = applicable_installers(service_file, installers)
+        installed = state.services.get(base_name)
         if (
-            service_file.with_name(f"{base_name}.conda.yaml").is_file()
-            and conda_installer is not None
-        ):
-            applicable_installers.append(conda_installer)
-        if (
-            service_file.with_name(f"{base_name}.docker.yaml").is_file()
-            and docker_installer is not None
+            not force
+            and installed is not None
+            and installed["installer"] in applicable
+            and state.is_up_to_date(
+                base_name,
+                installed["installer"],
+                service_fingerprint(
+                    service_file,
+                    installed["installer"],
+                    applicable[installed["installer"]][0].rendering_options(),
+                ),
+            )
         ):
-            applicable_installers.append(docker_installer)
-        if not applicable_installers:
+            click.echo(f"Up to date: {base_name}")
+            continue
+        click.echo(f"Installing: {base_name}")
+        if not applicable:
             click.echo(f"No applicable installer for {base_name}")
             continue
         while True:
             installer_names = ["[s]kip"]
             choices = ["s"]
-            if conda_installer in applicable_installers:
+            if "conda" in applicable:
                 installer_names.append("[c]onda")
                 choices.append("c")
-            if docker_installer in applicable_installers:
+            if "docker" in applicable:
                 installer_names.append("[d]ocker")
                 choices.append("d")
             ans = click.prompt(
@@ -115,20 +800,37 @@ def main(conda_exe, services, log_level: str, path: Path):
                 click.echo("Skipping")
                 break
             if ans == "c":
-                installer = conda_installer
-                installer_file = service_file.with_name(f"{base_name}.conda.yaml")
+                installer_name = "conda"
             elif ans == "d":
-                installer = docker_installer
-                installer_file = service_file.with_name(f"{base_name}.docker.yaml")
+                installer_name = "docker"
             else:
                 raise ValueError(f"Invalid installer choice: {ans}") 
+            installer, installer_file = applicable[installer_name]
+            fingerprint = service_fingerprint(
+                service_file, installer_name, installer.rendering_options()
+            )
+            state.started(base_name, installer_name, fingerprint)
             try:
-                output_file = installer.install_service(installer_file, path)
+                with tracer.span("install", service=base_name, installer=installer_name):
+                    output_file = installer.install_service(
+                        installer_file,
+                        path,
+                        overwrite=True if base_name in interrupted else None,
+                    )
+                state.finished(
+                    base_name,
+                    installer_name,
+                    service_fingerprint(
+                        service_file, installer_name, installer.rendering_options()
+                    ),
+                    output_file,
+                )
                 click.echo(
                     f"{click.style('Installed', fg='bright_green')}: {output_file.name}"
                 )
                 break
             except Exception as e:
+                state.failed(base_name, installer_name, e)
                 click.echo(f"{type(e).__name__}: {e}")
                 ans = click.prompt(
                     "[R]etry, [S]kip, [A]bort",
@@ -140,6 +842,1287 @@ def main(conda_exe, services, log_level: str, path: Path):
                     break
                 elif ans == "a":
                     raise click.Abort
+    state.end_run()
+
+
+def bake_images(docker_installer, install_files):
+    try:
+        built = docker_installer.bake_images(install_files)
+    except Exception as e:
+        click.echo(f"Failed to bake images, images will be built one by one. {e}")
+    else:
+        for tag in built:
+            click.echo(f"{click.style('Built', fg='bright_green')}: {tag}")
+
+
+def _construct_include(loader, node):
+    return f"!include {loader.construct_scalar(node)}"
+
+
+def read_service_entry(directory: Path, base_name: str) -> dict:
+    """
+    Read catalogue entry of the service from its template and install files.
+
+    :param Path directory:
+        Directory containing the service files.
+    :param str base_name:
+        Service file name without the .service.yaml suffix.
+    """
+    # the C safe loader is much faster than round-trip loading
+    yaml_safe = YAML(typ="safe")
+    yaml_safe.constructor.add_constructor("!include", _construct_include)
+    service = yaml_safe.load(directory / f"{base_name}.service.yaml")
+    installers = {}
+    for installer_name in INSTALLER_NAMES:
+        install_file = directory / f"{base_name}.{installer_name}.yaml"
+        if installer_name == "skip" or not install_file.is_file():
+            continue
+        config = yaml_safe.load(install_file) or {}
+        installers[installer_name] = {"files": config.get("files", [])}
+        if installer_name == "docker":
+            with contextlib.suppress(KeyError, TypeError):
+                installers[installer_name]["image"] = image_reference(config)
+                installers[installer_name]["build"] = "build" in config
+    return {
+        "base-name": base_name,
+        "name": service.get("name"),
+        "version": str(service.get("version", "")),
+        "description": (service.get("description") or "").strip(),
+        "installers": installers,
+        "runners": (service.get("execution") or {}).get("runners", {}),
+    }
+
+
+class ServiceCatalogue:
+    """
+    Index of the services found in the services directory, cached as
+    JSON in the installer cache. Directories whose modification time has
+    not changed are not listed again and service files whose
+    modification time has not changed are not parsed again.
+
+    :param Path root:
+        Services directory.
+    :param Path cache_file:
+        Path to the JSON cache, no caching if None.
+    """
+
+    VERSION = 1
+
+    def __init__(self, root: Path, cache_file: Path = None):
+        self.root = root
+        self.cache_file = cache_file
+        self._dirs = {}
+        self.services = {}
+        self._changed = False
+        cached = self._load()
+        self._scan(".", cached.get("dirs", {}), cached.get("services", {}))
+        if self._changed:
+            self._save()
+
+    @classmethod
+    def default_cache_file(cls, root: Path) -> Path:
+        root_hash = hashlib.sha256(str(root.resolve()).encode()).hexdigest()[:16]
+        return installer_cache_dir() / "catalogue" / f"{root_hash}.json"
+
+    def _load(self):
+        if self.cache_file is None:
+            return {}
+        try:
+            with open(self.cache_file) as fp:
+                cached = json.load(fp)
+        except (OSError, json.JSONDecodeError):
+            return {}
+        if cached.get("version") != self.VERSION or cached.get("root") != str(self.root):
+            return {}
+        return cached
+
+    def _save(self):
+        if self.cache_file is None:
+            return
+        data = {
+            "version": self.VERSION,
+            "root": str(self.root),
+            "dirs": self._dirs,
+            "services": self.services,
+        }
+        try:
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.cache_file.with_name(f"{self.cache_file.name}.{os.getpid()}.tmp")
+            with open(tmp_file, "w") as fp:
+                json.dump(data, fp)
+            os.replace(tmp_file, self.cache_file)
+        except OSError as e:
+            logging.info("Could not save the service catalogue: %s", e)
+
+    def _scan(self, rel_dir: str, cached_dirs: dict, cached_services: dict):
+        directory = self.root / rel_dir
+        try:
+            mtime = directory.stat().st_mtime_ns
+        except FileNotFoundError:
+            return
+        listing = cached_dirs.get(rel_dir)
+        if listing is None or listing["mtime"] != mtime:
+            self._changed = True
+            subdirs, files = [], []
+            for entry in os.scandir(directory):
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.name)
+                elif entry.name.endswith(".yaml"):
+                    files.append(entry.name)
+            listing = {"mtime": mtime, "dirs": sorted(subdirs), "files": sorted(files)}
+        self._dirs[rel_dir] = listing
+        for filename in listing["files"]:
+            if filename.endswith(".service.yaml"):
+                self._add_service(rel_dir, filename, listing["files"], cached_services)
+        for subdir in listing["dirs"]:
+            self._scan(os.path.normpath(os.path.join(rel_dir, subdir)), cached_dirs, cached_services)
+
+    def _add_service(self, rel_dir, filename, dir_files, cached_services):
+        base_name = filename[: -len(".service.yaml")]
+        rel_path = os.path.normpath(os.path.join(rel_dir, filename))
+        mtimes = {}
+        for name in dir_files:
+            if name.startswith(f"{base_name}.") and name.count(".") == base_name.count(".") + 2:
+                with contextlib.suppress(FileNotFoundError):
+                    mtimes[name] = (self.root / rel_dir / name).stat().st_mtime_ns
+        entry = cached_services.get(rel_path)
+        if entry is None or entry["mtimes"] != mtimes:
+            self._changed = True
+            try:
+                entry = read_service_entry(self.root / rel_dir, base_name)
+            except Exception as e:
+                logging.warning("Could not read service %s: %s", rel_path, e)
+                return
+            entry["path"] = rel_path
+            entry["mtimes"] = mtimes
+        self.services[rel_path] = entry
+
+    def select(self, prefixes: Iterable[str] = ("",)) -> list[dict]:
+        """
+        Return entries of the services whose file names start with any
+        of the prefixes, sorted by the file name.
+        """
+        prefixes = tuple(prefixes)
+        return sorted(
+            (
+                entry
+                for entry in self.services.values()
+                if entry["base-name"].startswith(prefixes)
+            ),
+            key=lambda entry: entry["base-name"],
+        )
+
+    def path(self, entry: dict) -> Path:
+        return self.root / entry["path"]
+
+
+def applicable_installers(service_file: Path, installers: dict) -> dict:
+    """
+    Find installers which can install the service.
+
+    :param Path service_file:
+        Path to the service template file.
+    :param dict installers:
+        Mapping of installer names to installer instances or None
+        if the installer is not available.
+    :return:
+        Mapping of installer names to (installer, install file) pairs.
+    """
+    base_name = service_file.name[: -len(".service.yaml")]
+    applicable = {}
+    for name, installer in installers.items():
+        install_file = service_file.with_name(f"{base_name}.{name}.yaml")
+        if installer is not None and install_file.is_file():
+            applicable[name] = (installer, install_file)
+    return applicable
+
+
+def parse_installer_choices(choices: Iterable[str]) -> list[tuple[str, list[str]]]:
+    """
+    Parse installer choices given as ``[PATTERN=]INSTALLER[,INSTALLER...]``.
+    Missing pattern matches all services.
+
+    :return: List of (pattern, installer preference list) rules.
+    """
+    rules = []
+    for choice in choices:
+        pattern, _, names = choice.rpartition("=")
+        rules.append((pattern or "*", _parse_installer_names(names)))
+    return rules
+
+
+def load_plan_file(plan_file: Path) -> list[tuple[str, list[str]]]:
+    """
+    Load installer choices from the plan file. The plan file is a YAML
+    mapping of service name patterns to an installer name or a list of
+    installer names in the order of preference, e.g.::
+
+        "*": [conda, docker]
+        absolve-prot: docker
+        mpnn_design_residues-*: skip
+
+    :return: List of (pattern, installer preference list) rules.
+    """
+    plan = YAML().load(plan_file) or {}
+    if not isinstance(plan, collections.abc.Mapping):
+        raise click.BadParameter("Plan must be a mapping.", param_hint="--plan-file")
+    rules = []
+    for pattern, names in plan.items():
+        if not isinstance(names, str):
+            names = ",".join(names)
+        try:
+            rules.append((str(pattern), _parse_installer_names(names)))
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="--plan-file")
+    return rules
+
+
+def _parse_installer_names(names: str) -> list[str]:
+    names = [name.strip().lower() for name in names.split(",")]
+    for name in names:
+        if name not in INSTALLER_NAMES:
+            raise ValueError(
+                f"Invalid installer: '{name}', expected one of {', '.join(INSTALLER_NAMES)}"
+            )
+    return names
+
+
+def choose_installer(base_name: str, rules: list, applicable: collections.abc.Container):
+    """
+    Choose the installer for the service using the last rule matching
+    the service name. The first applicable installer from the rule's
+    preference list is chosen.
+
+    :return:
+        Installer name, "skip" or None if no applicable installer found.
+    """
+    preference = ["conda", "docker"]
+    for pattern, names in rules:
+        if fnmatch.fnmatchcase(base_name, pattern):
+            preference = names
+    for name in preference:
+        if name == "skip" or name in applicable:
+            return name
+    return None
+
+
+class InstallReport:
+    """Collects installation outcomes for the end-of-run summary."""
+
+    def __init__(self):
+        self.installed = []
+        self.skipped = []
+        self.failed = []
+        self._lock = threading.Lock()
+
+    def add(self, base_name, installer_name, output_file=None, skipped=None, error=None):
+        with self._lock:
+            if error is not None:
+                self.failed.append((base_name, installer_name, error))
+            elif skipped is not None:
+                self.skipped.append((base_name, skipped))
+            else:
+                self.installed.append((base_name, installer_name, output_file))
+
+    def print(self):
+        click.echo("Installation report:")
+        for base_name, installer_name, output_file in sorted(self.installed):
+            click.echo(
+                f" {click.style('installed', fg='bright_green')}: "
+                f"{base_name} ({installer_name}) -> {output_file}"
+            )
+        for base_name, reason in sorted(self.skipped):
+            click.echo(f" {click.style('skipped', fg='yellow')}: {base_name} ({reason})")
+        for base_name, installer_name, error in sorted(self.failed, key=lambda it: it[0]):
+            click.echo(
+                f" {click.style('failed', fg='red')}: {base_name} ({installer_name}) "
+                f"{type(error).__name__}: {error}"
+            )
+
+
+def install_concurrently(
+    tasks, project_path: Path, jobs: int, report: InstallReport, state=None
+):
+    """
+    Run service installations in a pool of worker threads.
+
+    :param tasks:
+        Iterable of (base name, installer name, installer, install file,
+        fingerprint) tuples. The fingerprint recorded on completion is
+        computed again after the installation.
+    :param Path project_path:
+        Path to the target project directory.
+    :param int jobs:
+        Maximum number of services installed at the same time.
+    :param InstallReport report:
+        Report collecting installation outcomes.
+    :param InstallState state:
+        Project installation state recording the installed services.
+    """
+    state = state or InstallState(None)
+
+    def install(base_name, installer_name, installer, install_file, fingerprint):
+        state.started(base_name, installer_name, fingerprint)
+        try:
+            with tracer.profile_thread(), tracer.span(
+                "install", service=base_name, installer=installer_name
+            ):
+                output_file = installer.install_service(
+                    install_file,
+                    project_path,
+                    # partial artifacts of an interrupted installation are replaced
+                    overwrite=True if base_name in state.interrupted else None,
+                )
+        except Exception as e:
+            state.failed(base_name, installer_name, e)
+            raise
+        # inputs written by the installation, e.g. lock files, are included
+        fingerprint = service_fingerprint(
+            install_file.with_name(f"{base_name}.service.yaml"),
+            installer_name,
+            installer.rendering_options(),
+        )
+        state.finished(base_name, installer_name, fingerprint, output_file)
+        return output_file
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {
+            executor.submit(install, *task): (task[0], task[1]) for task in tasks
+        }
+        for future in concurrent.futures.as_completed(futures):
+            base_name, installer_name = futures[future]
+            try:
+                output_file = future.result()
+            except Exception as e:
+                logging.debug("Installation of %s failed", base_name, exc_info=True)
+                click.echo(f"{click.style('Failed', fg='red')}: {base_name}")
+                report.add(base_name, installer_name, error=e)
+            else:
+                click.echo(
+                    f"{click.style('Installed', fg='bright_green')}: {output_file.name}"
+                )
+                report.add(base_name, installer_name, output_file=output_file)
+
+
+class PhaseLimits:
+    """
+    Limits the number of concurrently running installation phases.
+    Phases without a limit are not restricted.
+    """
+
+    def __init__(self, **limits: int):
+        self._semaphores = {
+            phase: threading.BoundedSemaphore(limit)
+            for phase, limit in limits.items()
+        }
+
+    @contextlib.contextmanager
+    def acquire(self, phase: str):
+        semaphore = self._semaphores.get(phase)
+        if semaphore is None:
+            yield
+            return
+        with semaphore:
+            yield
+
+
+class ThreadAllocation:
+    """
+    Number of threads given to the jobs of multi-threaded services. The
+    available cores are divided between the jobs of a runner profile
+    expected to run at the same time.
+
+    :param int cores:
+        Number of cores of the host, the available cores if None.
+    :param dict concurrency:
+        Maximum number of concurrent jobs keyed by the profile name.
+        The empty name is the default for other profiles.
+    """
+
+    def __init__(self, cores: int = None, concurrency: dict = None):
+        self.cores = cores or available_cores()
+        self.concurrency = concurrency or {}
+
+    def allocates(self, profile: str) -> bool:
+        """Check if the concurrency of the profile's jobs was given."""
+        return profile in self.concurrency or "" in self.concurrency
+
+    def threads(self, profile: str, maximum: int = None) -> int:
+        jobs = self.concurrency.get(profile, self.concurrency.get("", 1))
+        threads = max(1, self.cores // jobs)
+        if maximum:
+            threads = min(threads, maximum)
+        return threads
+
+
+def parse_job_concurrency(values: Iterable[str]) -> dict:
+    """Parse ``[PROFILE=]JOBS`` values into a dictionary keyed by the profile."""
+    concurrency = {}
+    for value in values:
+        profile, _, jobs = value.rpartition("=")
+        if not jobs.isdigit() or int(jobs) < 1:
+            raise ValueError(f"Invalid number of jobs in '{value}'.")
+        concurrency[profile] = int(jobs)
+    return concurrency
+
+
+def runner_profile(service_config: collections.abc.Mapping) -> str:
+    """
+    Return the name of the profile the service's default runner includes,
+    or the runner name if the runner is not included from the profiles.
+    """
+    runners = (service_config.get("execution") or {}).get("runners") or {}
+    for name, runner in runners.items():
+        value = getattr(runner, "value", runner)
+        if isinstance(value, str) and "::" in value:
+            return value.rsplit("::", 1)[1]
+        return name
+    return "default"
+
+
+def apply_threads(service_config: collections.abc.MutableMapping, allocation=None):
+    """
+    Replace the ``threads`` metadata of the service with the ``_threads``
+    argument passing the number of threads allocated to its jobs. The
+    metadata holds the argument template, e.g. ``--threads=$(value)``,
+    and optionally the maximum number of threads the tool uses well and
+    the default number of threads used if the concurrency of the jobs of
+    the service's runner profile is not given. Without the default the
+    tool's own default applies. The metadata is removed even if no
+    allocation is given.
+    """
+    metadata = service_config.pop("threads", None)
+    if metadata is None or allocation is None:
+        return
+    profile = runner_profile(service_config)
+    if allocation.allocates(profile):
+        threads = allocation.threads(profile, metadata.get("max"))
+    elif "default" in metadata:
+        threads = int(metadata["default"])
+    else:
+        return
+    argument = {"arg": metadata["arg"], "default": str(threads)}
+    args = service_config.setdefault("args", {})
+    # options go before the positional arguments of the tool
+    if hasattr(args, "insert"):
+        args.insert(0, "_threads", argument)
+    else:
+        service_config["args"] = {"_threads": argument, **args}
+    logging.info("Jobs of %s use %d thread(s)", service_config.get("name"), threads)
+
+
+class Tracer:
+    """
+    Records timed spans around the installation phases. Spans are written
+    as JSON lines as soon as they end and can be exported as a Chrome
+    trace, viewable in chrome://tracing or Perfetto. Subprocesses started
+    within a span are counted from the "subprocess.Popen" audit events.
+    Spans are not recorded until the tracer is started.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.spans = []
+        self._jsonl = None
+        self._profile = False
+        self._profiles = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter_ns()
+        self._hooked = False
+
+    def start(self, jsonl_file: Path = None, profile=False):
+        """
+        Start recording spans.
+
+        :param Path jsonl_file:
+            File the spans are written to as JSON lines.
+        :param bool profile:
+            Whether to profile threads wrapped in :meth:`profile_thread`.
+        """
+        self.enabled = True
+        self._profile = profile
+        if jsonl_file is not None:
+            self._jsonl = open(jsonl_file, "w")
+        if not self._hooked:
+            # audit hooks cannot be removed, the hook checks if it's enabled
+            sys.addaudithook(self._audit)
+            self._hooked = True
+
+    def _stack(self) -> list:
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    def _audit(self, event, args):
+        if event == "subprocess.Popen" and self.enabled:
+            for span in self._stack():
+                span["subprocesses"] += 1
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attributes):
+        """
+        Record the time spent in the block. Yields a dictionary of the
+        span attributes, which the block can extend e.g. with byte counts.
+        """
+        if not self.enabled:
+            yield attributes
+            return
+        stack = self._stack()
+        span = {"subprocesses": 0}
+        stack.append(span)
+        start = time.perf_counter_ns()
+        try:
+            yield attributes
+        except BaseException as e:
+            attributes["error"] = type(e).__name__
+            raise
+        finally:
+            end = time.perf_counter_ns()
+            stack.pop()
+            thread = threading.current_thread()
+            record = {
+                "name": name,
+                "start": (start - self._origin) / 1e9,
+                "duration": (end - start) / 1e9,
+                "thread": thread.name,
+                "tid": thread.ident,
+                "subprocesses": span["subprocesses"],
+                **attributes,
+            }
+            with self._lock:
+                self.spans.append(record)
+                if self._jsonl is not None:
+                    self._jsonl.write(json.dumps(record, default=str) + "\n")
+                    self._jsonl.flush()
+
+    @contextlib.contextmanager
+    def profile_thread(self):
+        """Profile the Python code of the current thread if profiling is on."""
+        if not self._profile:
+            yield
+            return
+        import cProfile
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # profilers built on sys.monitoring already cover all threads
+            yield
+            return
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self._lock:
+                self._profiles.append(profile)
+
+    def write_chrome_trace(self, path: Path):
+        pid = os.getpid()
+        events = []
+        threads = {}
+        for span in self.spans:
+            threads[span["tid"]] = span["thread"]
+            args = {
+                key: value
+                for key, value in span.items()
+                if key not in ("name", "start", "duration", "thread", "tid")
+            }
+            events.append({
+                "name": span["name"],
+                "cat": span["name"].split(".")[0],
+                "ph": "X",
+                "ts": span["start"] * 1e6,
+                "dur": span["duration"] * 1e6,
+                "pid": pid,
+                "tid": span["tid"],
+                "args": args,
+            })
+        for tid, thread_name in threads.items():
+            events.append({
+                "name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                "args": {"name": thread_name},
+            })
+        with open(path, "w") as fp:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, fp, default=str)
+
+    def finish(self, chrome_trace: Path = None, profile_file: Path = None):
+        """
+        Stop recording and write the Chrome trace and the profile.
+        """
+        self.enabled = False
+        if self._jsonl is not None:
+            self._jsonl.close()
+            self._jsonl = None
+        if chrome_trace is not None:
+            self.write_chrome_trace(chrome_trace)
+        if profile_file is not None and self._profiles:
+            import pstats
+
+            pstats.Stats(*self._profiles).dump_stats(profile_file)
+
+
+# Installation phases are traced by the module-level tracer
+tracer = Tracer()
+
+
+def service_fingerprint(service_file: Path, installer_name: str, options: dict = None) -> str:
+    """
+    Compute the fingerprint of all the inputs of the service installation
+    i.e. the service, installer, environment and lock files, the Dockerfile,
+    the data directories and the installer options changing the installed
+    service file. Data files are fingerprinted by their size and
+    modification time which avoids reading large databases on every run.
+
+    :param Path service_file:
+        Path to the service template file.
+    :param str installer_name:
+        Name of the installer, either "conda" or "docker".
+    :param dict options:
+        Installer options as returned by :func:`rendering_options`.
+    :return: Hex digest of the inputs.
+    """
+    base_name = service_file.name[: -len(".service.yaml")]
+    install_file = service_file.with_name(f"{base_name}.{installer_name}.yaml")
+    config = YAML(typ="safe").load(install_file) or {}
+    input_files = [service_file, install_file]
+    if installer_name == "conda":
+        if "environment" not in config:
+            input_files.append(
+                install_file.with_name(config.get("environment-file", "environment.yaml"))
+            )
+        input_files.append(
+            install_file.with_name(f"{base_name}.{conda_platform()}.conda.lock")
+        )
+    if installer_name == "docker" and "build" in config:
+        input_files.append(install_file.parent / config["build"]["dockerfile"])
+    digest = hashlib.sha256(installer_name.encode())
+    digest.update(json.dumps(options or {}, sort_keys=True).encode())
+    for input_file in input_files:
+        digest.update(f"\0{input_file.name}\0".encode())
+        try:
+            digest.update(input_file.read_bytes())
+        except FileNotFoundError:
+            digest.update(b"\0missing")
+    src_root = install_file.parent
+    for data_dir in sorted(find_data_dirs(src_root, config.get("files", []))):
+        for root, dirs, files in os.walk(src_root / data_dir):
+            dirs.sort()
+            for filename in sorted(files):
+                file_path = Path(root, filename)
+                file_stat = file_path.stat()
+                digest.update(
+                    f"\0{file_path.relative_to(src_root)}"
+                    f"\0{file_stat.st_size}\0{file_stat.st_mtime_ns}".encode()
+                )
+    return digest.hexdigest()
+
+
+def rendering_options(
+    installer_name: str,
+    job_threads: ThreadAllocation = None,
+    launch_mode="direct",
+    pool_size=0,
+    launch_plan=False,
+    env_names: Iterable[str] = (),
+) -> dict:
+    """
+    Collect the options of the installer which change the installed
+    service file, so that services are installed again when they change.
+    """
+    options = {}
+    if job_threads is not None:
+        options["job-threads"] = {
+            "cores": job_threads.cores,
+            "concurrency": job_threads.concurrency,
+        }
+    if installer_name == "conda":
+        options["launch-mode"] = launch_mode
+    elif installer_name == "docker":
+        options.update({
+            "docker-pool": pool_size,
+            "docker-plan": launch_plan,
+            "docker-env": sorted(env_names),
+        })
+    return options
+
+
+class InstallState:
+    """
+    Installation state of the project, stored in the project's
+    ``.slivka-installer`` directory.
+
+    The state file records the fingerprint of each installed service.
+    The journal file records start and completion of service installations
+    so that services whose installation was interrupted are known on the
+    next run. A state without the project path is kept in memory only.
+    """
+
+    def __init__(self, project_path: Path = None):
+        self._lock = threading.Lock()
+        self.project_path = project_path
+        self.services = {}
+        self.interrupted = set()
+        if project_path is None:
+            self.state_file = self.journal_file = None
+            return
+        state_dir = project_path / ".slivka-installer"
+        self.state_file = state_dir / "state.json"
+        self.journal_file = state_dir / "journal.jsonl"
+        try:
+            with open(self.state_file) as fp:
+                self.services = json.load(fp)["services"]
+        except FileNotFoundError:
+            pass
+
+    def begin_run(self) -> set[str]:
+        """
+        Start the installation run.
+
+        :return: Services whose installation was interrupted in previous runs.
+        """
+        self.interrupted = self._read_unfinished()
+        if self.journal_file is not None and not self.interrupted:
+            self.journal_file.parent.mkdir(parents=True, exist_ok=True)
+            self.journal_file.write_text("")
+        self._append({"event": "run-start"})
+        return self.interrupted
+
+    def end_run(self):
+        self._append({"event": "run-end"})
+
+    def _read_unfinished(self) -> set[str]:
+        unfinished = set()
+        if self.journal_file is None:
+            return unfinished
+        try:
+            with open(self.journal_file) as fp:
+                for line in fp:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # last line may be truncated by a crash
+                        continue
+                    if entry["event"] == "start":
+                        unfinished.add(entry["service"])
+                    elif entry["event"] in ("done", "failed"):
+                        # failures were reported, only crashes are resumed
+                        unfinished.discard(entry["service"])
+        except FileNotFoundError:
+            pass
+        return unfinished
+
+    def _append(self, entry: dict):
+        if self.journal_file is None:
+            return
+        with self._lock:
+            self.journal_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.journal_file, "a") as fp:
+                fp.write(json.dumps({**entry, "time": time.time()}) + "\n")
+                fp.flush()
+                os.fsync(fp.fileno())
+
+    def is_up_to_date(self, base_name: str, installer_name: str, fingerprint: str) -> bool:
+        installed = self.services.get(base_name)
+        return (
+            base_name not in self.interrupted
+            and installed is not None
+            and installed["installer"] == installer_name
+            and installed["fingerprint"] == fingerprint
+            and self.project_path is not None
+            and (self.project_path / installed["output"]).is_file()
+        )
+
+    def started(self, base_name: str, installer_name: str, fingerprint: str):
+        self._append({
+            "event": "start",
+            "service": base_name,
+            "installer": installer_name,
+            "fingerprint": fingerprint,
+        })
+
+    def failed(self, base_name: str, installer_name: str, error: Exception):
+        self._append({
+            "event": "failed",
+            "service": base_name,
+            "installer": installer_name,
+            "error": f"{type(error).__name__}: {error}",
+        })
+
+    def finished(self, base_name: str, installer_name: str, fingerprint: str, output_file: Path):
+        with self._lock:
+            self.services[base_name] = {
+                "installer": installer_name,
+                "fingerprint": fingerprint,
+                "output": os.path.relpath(output_file, self.project_path or "."),
+                "installed": time.time(),
+            }
+            if self.state_file is not None:
+                self.state_file.parent.mkdir(parents=True, exist_ok=True)
+                tmp_file = self.state_file.with_suffix(".json.tmp")
+                with open(tmp_file, "w") as fp:
+                    json.dump({"services": self.services}, fp, indent=2)
+                os.replace(tmp_file, self.state_file)
+        self._append({"event": "done", "service": base_name, "installer": installer_name})
+
+
+def print_install_plan(
+    entries,
+    catalogue,
+    installer_rules,
+    project_path,
+    force=False,
+    fingerprint_options: dict = None,
+    **options,
+):
+    """
+    Print the actions the installer would take for each of the services.
+    Installers are chosen by the rules as in the unattended installation.
+    Options of the installers changing the service files, keyed by the
+    installer name, are compared with the installed services.
+    """
+    fingerprint_options = fingerprint_options or {}
+    state = InstallState(project_path)
+    for entry in entries:
+        base_name = entry["base-name"]
+        service_file = catalogue.path(entry)
+        installer_name = choose_installer(base_name, installer_rules, entry["installers"])
+        if installer_name is None or installer_name == "skip":
+            reason = "no applicable installer" if installer_name is None else "skipped by plan"
+            click.echo(f"{base_name}: {reason}")
+            continue
+        click.echo(f"{base_name} ({installer_name}):")
+        fingerprint = service_fingerprint(
+            service_file, installer_name, fingerprint_options.get(installer_name)
+        )
+        if not force and state.is_up_to_date(base_name, installer_name, fingerprint):
+            click.echo("  up to date, nothing to do")
+            continue
+        for action in plan_service(
+            entry, service_file, installer_name, project_path, **options
+        ):
+            click.echo(f"  {action}")
+
+
+def format_size(size: int) -> str:
+    for unit in ("B", "kB", "MB", "GB"):
+        if size < 1000 or unit == "GB":
+            break
+        size /= 1000
+    return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+
+
+def directory_size(path: Path) -> tuple[int, int]:
+    """Return the number of files and their total size in the directory."""
+    count = size = 0
+    for root, _, files in os.walk(path):
+        for filename in files:
+            with contextlib.suppress(OSError):
+                size += os.stat(os.path.join(root, filename)).st_size
+                count += 1
+    return count, size
+
+
+def plan_service(
+    entry: dict,
+    service_file: Path,
+    installer_name: str,
+    project_path: Path,
+    copy_mode="copy",
+    env_store=None,
+    relock=False,
+    overwrite=None,
+) -> list[str]:
+    """
+    Describe the actions the installer would take to install the service
+    without initializing the installers or running any of them.
+
+    :param dict entry:
+        Catalogue entry of the service.
+    :param Path service_file:
+        Path to the service template file.
+    :param str installer_name:
+        Name of the installer chosen for the service.
+    :param Path project_path:
+        Path to the target project.
+    :param bool | None overwrite:
+        Whether existing environment and data directories are
+        overwritten, the user is asked if None.
+    :return:
+        List of the actions.
+    """
+    base_name = entry["base-name"]
+    installer_entry = entry["installers"][installer_name]
+    src_root = service_file.parent
+    actions = []
+    if installer_name == "conda":
+        env_path = Path(os.path.abspath(project_path / "conda_env" / base_name))
+        env_exists = env_path.exists() or env_path.is_symlink()
+        if env_exists and overwrite is False:
+            actions.append(f"keep existing env {env_path}")
+        else:
+            if env_exists:
+                actions.append(
+                    f"{'ask to ' if overwrite is None else ''}overwrite existing env {env_path}"
+                )
+            actions.extend(plan_conda_env(
+                src_root / f"{base_name}.conda.yaml", env_path, env_store, relock
+            ))
+    elif installer_name == "docker":
+        image = installer_entry.get("image", "<unknown image>")
+        if installer_entry.get("build"):
+            actions.append(f"build image {image}")
+        else:
+            actions.append(f"pull image {image}")
+    dst_data_dir = project_path / "data" / base_name
+    for rel_path in sorted(find_data_dirs(src_root, list(installer_entry["files"]))):
+        dst_path = dst_data_dir / rel_path
+        if (dst_path.exists() or dst_path.is_symlink()) and overwrite is False:
+            actions.append(f"keep existing {dst_path}")
+            continue
+        count, size = directory_size(src_root / rel_path)
+        actions.append(
+            f"{copy_mode} {src_root / rel_path} -> {dst_data_dir / rel_path} "
+            f"({count} file{'' if count == 1 else 's'}, {format_size(size)})"
+        )
+    actions.append(f"write service file {project_path / 'services' / service_file.name}")
+    return actions
+
+
+def plan_conda_env(install_file: Path, env_path: Path, env_store=None, relock=False):
+    """
+    Describe how the conda environment of the install file would be
+    created at the path, from the env store, the lock file or solved.
+    """
+    lock_file = install_file.with_name(
+        f"{install_file.name[: -len('.conda.yaml')]}.{conda_platform()}.conda.lock"
+    )
+    spec = read_conda_env_spec(install_file) if env_store is not None else None
+    if spec is not None:
+        key = conda_env_key(spec)
+        store_path = env_store.env_path(key)
+        # mirrors the store hit check of CondaEnvStore.provide
+        if env_store.read_meta(key) is not None and store_path.is_dir():
+            return [f"{env_store.mode} stored env {store_path} to {env_path}"]
+    actions = []
+    if lock_file.is_file() and not relock:
+        actions.append(f"create env {env_path} from lock file {lock_file.name}")
+    else:
+        actions.append(f"solve and create env {env_path}, write lock file {lock_file.name}")
+    if env_store is not None:
+        actions.append(f"share env through the store {env_store.root}")
+    return actions
+
+
+def read_conda_env_spec(install_file: Path):
+    """
+    Read the environment specification of the conda install file given
+    inline or in the environment file. Return None if there is none.
+    """
+    yaml_safe = YAML(typ="safe")
+    if not install_file.is_file():
+        return None
+    config = yaml_safe.load(install_file) or {}
+    if "environment" in config:
+        return config["environment"]
+    env_file = install_file.with_name(config.get("environment-file", "environment.yaml"))
+    if not env_file.is_file():
+        return None
+    return yaml_safe.load(env_file)
+
+
+def available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def read_installed_service(service_file: Path) -> dict:
+    yaml_safe = YAML(typ="safe")
+    yaml_safe.constructor.add_constructor("!include", _construct_include)
+    return yaml_safe.load(service_file)
+
+
+def _expand_env_vars(text: str, env: collections.abc.Mapping) -> str:
+    # unknown variables are left in place like os.path.expandvars does
+    return re.sub(
+        r"\$(?:\{(\w+)\}|(\w+))",
+        lambda match: env.get(match.group(1) or match.group(2), match.group(0)),
+        text,
+    )
+
+
+def _parameter_arg(parameter: dict, value):
+    """Convert the parameter value to its command line value like slivka."""
+    if value is None:
+        return None
+    if isinstance(value, list):
+        return [str(item) for item in value]
+    if parameter.get("type") in ("flag", "boolean"):
+        if isinstance(value, str):
+            value = value.lower() not in ("false", "no", "off", "0", "")
+        return "true" if value else None
+    return str(value)
+
+
+def build_test_command(
+    service: dict, inputs: dict, work_dir: Path, base_env=None
+) -> tuple[list, dict]:
+    """
+    Build the command line and environment of the service job like
+    slivka's shell runner does. Input files of arguments having
+    a ``symlink`` are linked into the job working directory.
+
+    :param dict service:
+        Installed service configuration.
+    :param dict inputs:
+        Parameter values of the job.
+    :param Path work_dir:
+        Working directory of the job.
+    :param dict base_env:
+        Environment of the job the service variables are added to,
+        defaults to the current environment.
+    :return:
+        Command line arguments and environment variables.
+    """
+    base_env = os.environ if base_env is None else base_env
+    env = dict(base_env)
+    for name, value in (service.get("env") or {}).items():
+        env[name] = _expand_env_vars(str(value), base_env)
+    command = service["command"]
+    if isinstance(command, str):
+        command = shlex.split(command)
+    args = [_expand_env_vars(str(arg), env) for arg in command]
+    parameters = service.get("parameters") or {}
+    for key, argument in (service.get("args") or {}).items():
+        parameter = parameters.get(key) or {}
+        value = _parameter_arg(
+            parameter, inputs.get(key, parameter.get("default"))
+        )
+        if value is None:
+            value = argument.get("default")
+        if value is None or value is False:
+            continue
+        values = value if isinstance(value, list) else [value]
+        if argument.get("symlink"):
+            for index, file_path in enumerate(values):
+                link_name = argument["symlink"]
+                if len(values) > 1:
+                    link_name = f"{link_name}.{index}"
+                (work_dir / link_name).symlink_to(Path(file_path).absolute())
+                values[index] = link_name
+        if argument.get("join") is not None:
+            values = [argument["join"].join(values)]
+        for item in values:
+            arg = str(argument["arg"]).replace("$(value)", str(item))
+            args.extend(_expand_env_vars(part, env) for part in shlex.split(arg))
+    return args, env
+
+
+def run_service_test(args: list, env: dict, work_dir: Path, timeout: float) -> dict:
+    """
+    Run the test job and measure its resource usage. The job runs in its
+    own process group which is killed when the timeout expires.
+
+    :return:
+        Result with the exit code, wall time, CPU time (seconds)
+        and peak resident set size (kilobytes).
+    """
+    start = time.perf_counter()
+    with open(work_dir / "stdout", "wb") as stdout, open(work_dir / "stderr", "wb") as stderr:
+        try:
+            proc = subprocess.Popen(
+                args,
+                cwd=work_dir,
+                env=env,
+                stdin=subprocess.DEVNULL,
+                stdout=stdout,
+                stderr=stderr,
+                start_new_session=True,
+            )
+        except OSError as e:
+            return {"status": "failed", "error": f"{type(e).__name__}: {e}"}
+    timed_out = threading.Event()
+
+    def kill():
+        timed_out.set()
+        with contextlib.suppress(ProcessLookupError):
+            os.killpg(proc.pid, signal.SIGKILL)
+
+    timer = threading.Timer(timeout, kill) if timeout else None
+    if timer is not None:
+        timer.start()
+    try:
+        # wait4 reports the resource usage of the job and its descendants
+        _, status, rusage = os.wait4(proc.pid, 0)
+    finally:
+        if timer is not None:
+            timer.cancel()
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    result = {
+        "exit-code": proc.returncode,
+        "wall-time": time.perf_counter() - start,
+        "cpu-time": rusage.ru_utime + rusage.ru_stime,
+        "max-rss": rusage.ru_maxrss,
+    }
+    if timed_out.is_set():
+        result["status"] = "timeout"
+    elif proc.returncode != 0:
+        result["status"] = "failed"
+    else:
+        result["status"] = "passed"
+    return result
+
+
+class VerifyBaseline:
+    """
+    Reference resource usage of the service tests, stored in the project's
+    ``.slivka-installer`` directory. A test whose wall or CPU time exceeds
+    the reference by more than the threshold is a regression. Differences
+    below :attr:`MIN_DIFFERENCE` seconds are considered noise.
+    """
+
+    MIN_DIFFERENCE = 0.5
+
+    def __init__(self, path: Path, threshold=0.25):
+        self.path = path
+        self.threshold = threshold
+        try:
+            with open(path) as fp:
+                self.tests = json.load(fp)["tests"]
+        except FileNotFoundError:
+            self.tests = {}
+
+    def compare(self, key: str, result: dict) -> list[str]:
+        """Return descriptions of the regressions of the test result."""
+        reference = self.tests.get(key)
+        if reference is None or result["status"] != "passed":
+            return []
+        regressions = []
+        for metric in ("wall-time", "cpu-time"):
+            difference = result[metric] - reference[metric]
+            if (
+                difference > self.MIN_DIFFERENCE
+                and result[metric] > reference[metric] * (1 + self.threshold)
+            ):
+                regressions.append(
+                    f"{metric} {result[metric]:.2f} s, baseline {reference[metric]:.2f} s "
+                    f"({reference.get('installer')})"
+                )
+        return regressions
+
+    def update(self, key: str, result: dict, overwrite=False):
+        if result["status"] == "passed" and (overwrite or key not in self.tests):
+            self.tests[key] = {**result, "recorded": time.time()}
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.path.with_suffix(".json.tmp")
+        with open(tmp_file, "w") as fp:
+            json.dump({"tests": self.tests}, fp, indent=2, sort_keys=True)
+        os.replace(tmp_file, self.path)
+
+
+def verify_services(
+    project_path: Path,
+    base_names: Iterable[str],
+    jobs: int = None,
+    threshold=0.25,
+    update_baseline=False,
+) -> bool:
+    """
+    Run the tests of the installed services concurrently and print their
+    outcomes and resource usage. Working directories of the failed tests
+    are kept in ``.slivka-installer/verify``.
+
+    :param Path project_path:
+        Path to the project the services are installed in.
+    :param base_names:
+        Names of the services to verify, those not installed are skipped.
+    :param int jobs:
+        Number of tests run at the same time, the available cores if None.
+    :param float threshold:
+        Relative increase of the wall or CPU time reported as a regression.
+    :param bool update_baseline:
+        Replace the baseline with the results of the passed tests.
+        Tests without a baseline are always recorded.
+    :return:
+        Whether all tests passed without regressions.
+    """
+    state = InstallState(project_path)
+    baseline = VerifyBaseline(
+        project_path / ".slivka-installer" / "verify-baseline.json", threshold
+    )
+    work_root = project_path / ".slivka-installer" / "verify"
+    base_env = {**os.environ, "SLIVKA_HOME": str(project_path.absolute())}
+    tasks = []
+    for base_name in base_names:
+        service_file = project_path / "services" / f"{base_name}.service.yaml"
+        if not service_file.is_file():
+            continue
+        service = read_installed_service(service_file)
+        installer_name = (state.services.get(base_name) or {}).get("installer")
+        tests = [
+            test for test in service.get("tests") or []
+            if "default" in test.get("applicable-runners", ["default"])
+        ]
+        if not tests:
+            click.echo(f" {click.style('no tests', fg='yellow')}: {base_name}")
+        for index, test in enumerate(tests):
+            key = base_name if len(tests) == 1 else f"{base_name}#{index}"
+            tasks.append((key, installer_name, service, test))
+
+    def verify(key, installer_name, service, test):
+        work_dir = work_root / key
+        shutil.rmtree(work_dir, ignore_errors=True)
+        work_dir.mkdir(parents=True)
+        with tracer.span("verify.test", service=key) as span:
+            args, env = build_test_command(
+                service, test.get("parameters") or {}, work_dir, base_env
+            )
+            result = run_service_test(args, env, work_dir, test.get("timeout"))
+            span["status"] = result["status"]
+        if result["status"] == "passed":
+            shutil.rmtree(work_dir, ignore_errors=True)
+        return {**result, "installer": installer_name}
+
+    ok = True
+    jobs = jobs or available_cores()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(verify, *task): task[0] for task in tasks}
+        results = {}
+        for future in concurrent.futures.as_completed(futures):
+            key = futures[future]
+            try:
+                results[key] = future.result()
+            except Exception as e:
+                logging.debug("Test of %s failed", key, exc_info=True)
+                results[key] = {"status": "failed", "error": f"{type(e).__name__}: {e}"}
+    click.echo("Verification report:")
+    for key, result in sorted(results.items()):
+        status = result["status"]
+        if "wall-time" in result:
+            usage = (
+                f"wall {result['wall-time']:.2f} s, cpu {result['cpu-time']:.2f} s, "
+                f"max rss {format_size(result['max-rss'] * 1024)}"
+            )
+        else:
+            usage = result["error"]
+        color = {"passed": "bright_green", "timeout": "yellow"}.get(status, "red")
+        click.echo(f" {click.style(status, fg=color)}: {key} ({usage})")
+        if status == "failed" and "exit-code" in result:
+            click.echo(f"   exit code {result['exit-code']}, output in {work_root / key}")
+        regressions = baseline.compare(key, result)
+        for regression in regressions:
+            click.echo(f"   {click.style('regression', fg='red')}: {regression}")
+        ok = ok and status == "passed" and not regressions
+        baseline.update(key, result, overwrite=update_baseline)
+    baseline.save()
+    return ok
 
 
 class DataFilesContextMap(dict):
@@ -157,6 +2140,31 @@ def runtime_paths_context(paths, dst_root):
     return DataFilesContextMap(paths, dst_root, key_prefix="runtime-")
 
 
+class SharedPathsContextMap:
+    """
+    Resolves ``shared-path:`` placeholders to the files copied from
+    the shared directory, e.g. ``{{ shared-path:scripts }}``.
+
+    :param dst_root:
+        Directory the shared files are seen at by the jobs.
+    """
+
+    prefix = "shared-path:"
+
+    def __init__(self, dst_root):
+        self.dst_root = dst_root
+
+    def __getitem__(self, item):
+        if not item.startswith(self.prefix):
+            raise KeyError(item)
+        return str(self.dst_root / item[len(self.prefix):])
+
+    @classmethod
+    def required_paths(cls, keys: Iterable[str]) -> list[str]:
+        """Return the shared paths the placeholder keys refer to."""
+        return sorted(key[len(cls.prefix):] for key in keys if key.startswith(cls.prefix))
+
+
 def find_data_dirs(src_root: Path, patterns: list[dict]) -> collections.abc.Collection[Path]:
     """
     Find data directories under the given path matching the given patterns.
@@ -195,34 +2203,211 @@ def find_data_dirs(src_root: Path, patterns: list[dict]) -> collections.abc.Coll
     return matched
 
 
-def copy_data_dirs(copy_list: Iterable[tuple[Path, Path]]):
+def copy_data_dirs(
+    copy_list: Iterable[tuple[Path, Path]], overwrite=None, mode="copy", threads=1
+):
     """
     Copy data directories to the target root.
 
+    Existing directories are synchronized with the source when overwritten,
+    files which did not change are kept.
+
     :param Iterable[tuple[Path, Path]] copy_paths:
         Tuples of source and target absolute paths.
+    :param bool | None overwrite:
+        Whether to overwrite existing directories. Prompt if None.
+    :param str mode:
+        Copy mode, one of :data:`COPY_MODES`. The symlink mode links
+        the whole directory, other modes deploy individual files.
+        The auto mode tries reflink, hardlink and copy in that order.
+    :param int threads:
+        Number of files deployed concurrently.
     :return:
         List of copied paths
     """
+    if mode not in COPY_MODES:
+        raise ValueError(f"Invalid copy mode: {mode}")
     copied = []
     for src_path, dst_path in copy_list:
-        logging.info("Copying data from %s to %s", src_path, dst_path)
-        if dst_path.exists():
-            if click.confirm(
-                f"Directory exists: {dst_path}. Overwrite?", default=False
-            ):
-                shutil.rmtree(dst_path)
+        logging.info("Copying data from %s to %s (%s)", src_path, dst_path, mode)
+        # fail before an existing destination is replaced
+        check_source_dir(src_path)
+        if dst_path.exists() or dst_path.is_symlink():
+            if confirm_overwrite(f"Directory exists: {dst_path}. Overwrite?", overwrite):
+                if dst_path.is_symlink():
+                    dst_path.unlink()
+                elif mode == "symlink":
+                    shutil.rmtree(dst_path)
             else:
                 click.echo(f"Skipping: {dst_path}")
                 continue
-        shutil.copytree(src_path, dst_path)
+        with tracer.span("copy.data_dir", src=str(src_path), mode=mode) as span:
+            if mode == "symlink":
+                dst_path.parent.mkdir(parents=True, exist_ok=True)
+                dst_path.symlink_to(src_path.resolve(), target_is_directory=True)
+            else:
+                deployer = sync_tree(src_path, dst_path, mode, threads)
+                span.update(
+                    files=deployer.deployed,
+                    unchanged=deployer.unchanged,
+                    bytes=deployer.deployed_bytes,
+                )
         copied.append((src_path, dst_path))
     logging.debug("Copied data directories: %s", copied)
     return copied
 
 
+def check_source_dir(src_root: Path):
+    """Raise the error ``shutil.copytree`` would if the source is not a directory."""
+    if not src_root.exists():
+        raise FileNotFoundError(f"No such directory: {src_root}")
+    if not src_root.is_dir():
+        raise NotADirectoryError(f"Not a directory: {src_root}")
+
+
+def sync_tree(src_root: Path, dst_root: Path, mode="copy", threads=1):
+    """
+    Make the destination directory a copy of the source directory and
+    return the deployer with the numbers of deployed and unchanged files.
+    Files having the same size and modification time or content
+    as their source are not copied again. Files and directories
+    missing from the source are removed.
+
+    :param str mode: One of "auto", "reflink", "hardlink" or "copy".
+    :param int threads: Number of files deployed concurrently.
+    :raise FileNotFoundError: If the source directory does not exist.
+    :raise NotADirectoryError: If the source is not a directory.
+    """
+    check_source_dir(src_root)
+    file_pairs = []
+    for root, dirs, files in os.walk(src_root):
+        rel_root = Path(root).relative_to(src_root)
+        dst_dir = dst_root / rel_root
+        if dst_dir.is_symlink() or dst_dir.is_file():
+            dst_dir.unlink()
+        dst_dir.mkdir(parents=True, exist_ok=True)
+        expected = {*dirs, *files}
+        for entry in os.scandir(dst_dir):
+            if entry.name in expected:
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path)
+            else:
+                os.unlink(entry.path)
+        file_pairs.extend((Path(root, name), dst_dir / name) for name in files)
+    deployer = _FileDeployer(mode)
+    if threads > 1 and len(file_pairs) > 1:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+            # consume results to propagate exceptions
+            list(executor.map(lambda pair: deployer.deploy(*pair), file_pairs))
+    else:
+        for src_file, dst_file in file_pairs:
+            deployer.deploy(src_file, dst_file)
+    logging.debug(
+        "Synchronized %s: %d files deployed, %d unchanged",
+        dst_root, deployer.deployed, deployer.unchanged
+    )
+    return deployer
+
+
+class _FileDeployer:
+    def __init__(self, mode):
+        self.mode = mode
+        self.deployed = 0
+        self.deployed_bytes = 0
+        self.unchanged = 0
+        self._lock = threading.Lock()
+
+    def deploy(self, src: Path, dst: Path):
+        src_stat = src.stat()
+        try:
+            dst_stat = dst.lstat()
+        except FileNotFoundError:
+            dst_stat = None
+        if dst_stat is not None:
+            if _is_unchanged(src, src_stat, dst, dst_stat):
+                with self._lock:
+                    self.unchanged += 1
+                return
+            if stat.S_ISDIR(dst_stat.st_mode):
+                shutil.rmtree(dst)
+            else:
+                dst.unlink()
+        mode = self.mode
+        if mode == "auto":
+            for mode in ("reflink", "hardlink", "copy"):
+                try:
+                    _DEPLOY_FUNCTIONS[mode](src, dst)
+                except OSError:
+                    if mode == "copy":
+                        raise
+                    logging.debug("Cannot %s %s to %s", mode, src, dst)
+                    continue
+                with self._lock:
+                    # stick to the first method that works
+                    self.mode = mode
+                break
+        else:
+            _DEPLOY_FUNCTIONS[mode](src, dst)
+        with self._lock:
+            self.deployed += 1
+            self.deployed_bytes += src_stat.st_size
+
+
+def _is_unchanged(src: Path, src_stat, dst: Path, dst_stat) -> bool:
+    if (src_stat.st_dev, src_stat.st_ino) == (dst_stat.st_dev, dst_stat.st_ino):
+        return True
+    if not stat.S_ISREG(dst_stat.st_mode) or src_stat.st_size != dst_stat.st_size:
+        return False
+    if src_stat.st_mtime_ns == dst_stat.st_mtime_ns:
+        return True
+    if file_digest(src) == file_digest(dst):
+        os.utime(dst, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+        return True
+    return False
+
+
+def file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# ioctl request cloning a file on copy-on-write filesystems (btrfs, xfs)
+_FICLONE = 0x40049409
+
+
+def reflink_file(src: Path, dst: Path):
+    """
+    Clone the file sharing its data blocks with the source.
+    Raises OSError if the filesystem does not support it.
+    """
+    with open(src, "rb") as src_fp, open(dst, "wb") as dst_fp:
+        try:
+            fcntl.ioctl(dst_fp.fileno(), _FICLONE, src_fp.fileno())
+        except OSError:
+            dst_fp.close()
+            os.unlink(dst)
+            raise
+    shutil.copystat(src, dst)
+
+
+_DEPLOY_FUNCTIONS = {
+    "reflink": reflink_file,
+    "hardlink": os.link,
+    "copy": shutil.copy2,
+}
+
+
 def find_and_copy_data_dirs(
-    src_root: Path, patterns: list[dict], target_root: Path
+    src_root: Path,
+    patterns: list[dict],
+    target_root: Path,
+    overwrite=None,
+    mode="copy",
+    threads=1,
 ) -> list[tuple[Path, Path]]:
     """
     Find data directories under the given path matching the given patterns
@@ -236,34 +2421,66 @@ def find_and_copy_data_dirs(
         List of patterns to match source data directories.
     :param Path target_root:
         Target directory to copy data directories to.
+    :param bool | None overwrite:
+        Whether to overwrite existing directories. Prompt if None.
+    :param str mode:
+        Copy mode, see :func:`copy_data_dirs`.
+    :param int threads:
+        Number of files deployed concurrently.
+    """
+    files_mapping = [(match, match) for match in find_data_dirs(src_root, patterns)]
+    copy_data_dirs(
+        (
+            (src_root / src_path, target_root / dst_path)
+            for src_path, dst_path in files_mapping
+        ),
+        overwrite=overwrite,
+        mode=mode,
+        threads=threads,
+    )
+    return files_mapping
+
+
+def confirm_overwrite(message, overwrite=None):
+    """
+    Ask the user for confirmation unless the decision is already made.
+
+    :param bool | None overwrite:
+        Predefined answer or None to prompt the user.
     """
-    files_mapping = [(match, match) for match in find_data_dirs(src_root, patterns)]
-    copy_data_dirs(
-        (src_root / src_path, target_root / dst_path)
-        for src_path, dst_path in files_mapping
-    )
-    return files_mapping
+    if overwrite is None:
+        return click.confirm(message, default=False)
+    return overwrite
 
 
 def copy_service_file(
-    template_file: Path, target_root: Path, template_data: dict, prepend_command=[]
+    template_file: "Path | ServiceTemplate",
+    target_root: Path,
+    template_data: "TemplateContext",
+    prepend_command=[],
+    env=None,
+    threads: ThreadAllocation = None,
 ):
-    logging.info("Building service file: %s", template_file)
-    yaml = TemplateYamlLoader(template_data)
-    service_config = yaml.load(template_file)
+    if not isinstance(template_file, ServiceTemplate):
+        template_file = ServiceTemplate(template_file)
+    logging.info("Building service file: %s", template_file.path)
+    with tracer.span("template.render", template=template_file.path.name):
+        service_config = template_file.render(template_data)
     service_config["command"] = [*prepend_command, *service_config["command"]]
+    apply_threads(service_config, threads)
+    if env:
+        # variables set by the service take precedence over the activation
+        service_config["env"] = {**env, **service_config.get("env", {})}
     logging.debug("Service config: \n%s", service_config)
     (target_root / "services").mkdir(exist_ok=True)
-    dest_file = target_root / "services" / template_file.name
-    yaml.dump(service_config, dest_file)
+    dest_file = target_root / "services" / template_file.path.name
+    template_file.yaml.dump(service_config, dest_file)
     logging.info("Service file created: %s", dest_file)
     return dest_file
 
 
 def interpolate_string(data: str, context: collections.abc.Mapping):
-    return re.sub(
-        r"\{\{ ?([\w\-]+:[\w\/\.]+) ?\}\}", lambda m: context[m.group(1)], data
-    )
+    return CompiledString(data).render(context)
 
 
 def interpolate_list(data: collections.abc.Sequence, context: collections.abc.Mapping):
@@ -307,15 +2524,90 @@ class CondaEnvContextMap:
         raise KeyError(item)
 
 
+# variables which describe the activating shell rather than the environment
+_VOLATILE_ENV_VARS = {
+    "_", "SHLVL", "PWD", "OLDPWD", "PS1", "CONDA_SHLVL", "CONDA_PROMPT_MODIFIER"
+}
+
+
+def capture_activation(conda_exe, env_path: Path, base_env=None):
+    """
+    Activate the environment once with conda run and return variables
+    the activation sets or changes. Directories prepended to path-like
+    variables are followed by a ``${VAR}`` reference to the value of
+    the variable at job run time.
+
+    :param str conda_exe:
+        Path to the conda executable.
+    :param Path env_path:
+        Path to the conda environment.
+    :param dict base_env:
+        Environment to compare the activated environment against.
+        Defaults to the installer environment.
+    """
+    if base_env is None:
+        base_env = dict(os.environ)
+    with tracer.span("conda.activation", prefix=str(env_path)):
+        proc = subprocess.run(
+            [conda_exe, "run", "-p", str(env_path), "env", "-0"],
+            env=base_env,
+            capture_output=True,
+            check=True,
+        )
+    activated = dict(
+        item.split("=", 1)
+        for item in proc.stdout.decode().split("\0")
+        if "=" in item
+    )
+    env = {}
+    for key, value in activated.items():
+        if (
+            key in _VOLATILE_ENV_VARS
+            or key.startswith("CONDA_PREFIX_")
+            or base_env.get(key) == value
+        ):
+            continue
+        old_entries = base_env.get(key, "").split(os.pathsep)
+        new_entries = value.split(os.pathsep)
+        if base_env.get(key) and set(old_entries) <= set(new_entries):
+            added = [entry for entry in new_entries if entry not in old_entries]
+            value = os.pathsep.join([*added, f"${{{key}}}"])
+        env[key] = value
+    return env
+
+
 class CondaInstaller:
-    def __init__(self, conda_exe, conda_env_root: Path):
+    def __init__(
+        self,
+        conda_exe,
+        conda_env_root: Path,
+        limits=None,
+        overwrite=None,
+        env_store=None,
+        relock=False,
+        copy_mode="copy",
+        copy_threads=1,
+        launch_mode="direct",
+        job_threads: ThreadAllocation = None,
+    ):
         logging.debug(f"Initializing CondaInstaller with conda_exe={conda_exe}, conda_env_root={conda_env_root}")
         self.conda_exe = shutil.which(conda_exe) if conda_exe else detect_conda_exe()
         if not self.conda_exe:
             raise FileNotFoundError(f"Invalid conda exe: {conda_exe}")
         self.conda_env_root = conda_env_root
-
-    def install_service(self, install_file: Path, project_path: Path):
+        self.limits = limits or PhaseLimits()
+        self.overwrite = overwrite
+        self.env_store: CondaEnvStore | None = env_store
+        self.relock = relock
+        self.copy_mode = copy_mode
+        self.copy_threads = copy_threads
+        self.launch_mode = launch_mode
+        self.job_threads = job_threads
+
+    def rendering_options(self) -> dict:
+        return rendering_options("conda", self.job_threads, launch_mode=self.launch_mode)
+
+    def install_service(self, install_file: Path, project_path: Path, overwrite=None):
         """
         Install conda environment from the given install file.
 
@@ -323,73 +2615,416 @@ class CondaInstaller:
             Path to the conda install file.
         :param Path project_path:
             Path to the target project directory.
+        :param bool | None overwrite:
+            Whether to overwrite existing environment and data directories.
+            Defaults to the installer setting.
         """
-        config = yaml.load(install_file)
+        if overwrite is None:
+            overwrite = self.overwrite
+        config = YAML().load(install_file)
         # strip .conda.yaml suffix
         base_name = install_file.name[: -len(".conda.yaml")]
 
+        lock_file = install_file.with_name(f"{base_name}.{conda_platform()}.conda.lock")
         if "environment" in config:
             with tempfile.NamedTemporaryFile(suffix=".yaml") as env_file:
-                yaml.dump(config["environment"], env_file)
+                YAML().dump(config["environment"], env_file)
                 env_file.flush()
-                env_path = self.create_env(base_name, Path(env_file.name))
+                env_path = self.create_env(
+                    base_name, Path(env_file.name), lock_file, overwrite=overwrite
+                )
         else:
             env_file = config.get("environment-file", "environment.yaml")
             env_file = install_file.with_name(env_file)
-            env_path = self.create_env(base_name, env_file)
+            env_path = self.create_env(base_name, env_file, lock_file, overwrite=overwrite)
         env_context = CondaEnvContextMap(self.conda_exe, env_path)
 
         dst_data_dir = project_path / "data" / base_name
-        copied_data_dirs = find_and_copy_data_dirs(
-            src_root=install_file.parent,
-            target_root=dst_data_dir,
-            patterns=config.get("files", []),
-        )
+        with self.limits.acquire("copy"):
+            copied_data_dirs = find_and_copy_data_dirs(
+                src_root=install_file.parent,
+                target_root=dst_data_dir,
+                patterns=config.get("files", []),
+                overwrite=overwrite,
+                mode=self.copy_mode,
+                threads=self.copy_threads,
+            )
         data_dirs_context = local_paths_context(copied_data_dirs, dst_root=dst_data_dir)
         runtime_data_dirs_context = runtime_paths_context(
             copied_data_dirs, dst_root=dst_data_dir
         )
 
-        context_map = ChainMap(
-            env_context, data_dirs_context, runtime_data_dirs_context
+        context_map = TemplateContext(
+            env_context,
+            data_dirs_context,
+            runtime_data_dirs_context,
+            SharedPathsContextMap(project_path),
+            variables=config.get("vars", {}),
         )
-        vars_context = {
-            f"var:{key}": val
-            for key, val in interpolate_dict(
-                config.get("vars", {}), context_map
-            ).items()
-        }
-        context_map.maps.insert(0, vars_context)
 
         command_prefix = [self.conda_exe, "run", "-p", str(env_path)]
+        activation_env = None
+        if self.launch_mode == "direct":
+            try:
+                activation_env = capture_activation(self.conda_exe, env_path)
+            except (OSError, subprocess.CalledProcessError) as e:
+                logging.warning(
+                    "Failed to capture activation of %s, using conda run: %s", env_path, e
+                )
+            else:
+                command_prefix = []
         return copy_service_file(
             template_file=install_file.with_name(f"{base_name}.service.yaml"),
             target_root=project_path,
             template_data=context_map,
             prepend_command=command_prefix,
+            env=activation_env,
+            threads=self.job_threads,
         )
 
-    def create_env(self, env_name: str, env_file: Path):
+    def create_env(
+        self, env_name: str, env_file: Path, lock_file: Path = None, overwrite=None
+    ):
+        """
+        Create conda environment in the conda env root.
+
+        :param str env_name:
+            Name of the environment directory.
+        :param Path env_file:
+            Conda environment file.
+        :param Path lock_file:
+            Lock file the environment is created from if it matches the
+            environment file. The lock file is written after solving
+            the environment otherwise.
+        :param bool | None overwrite:
+            Whether to overwrite existing environment. Defaults to
+            the installer setting.
+        :return: Path to the environment.
+        """
+        if overwrite is None:
+            overwrite = self.overwrite
         if not env_file.is_file():
             raise FileNotFoundError(f"{env_file}")
         os.makedirs(self.conda_env_root, exist_ok=True)
         if not self.conda_env_root.is_dir():
             raise NotADirectoryError(f"Invalid conda env root: {self.conda_env_root}")
-        env_path = (self.conda_env_root / env_name).resolve()
-        if env_path.exists():
-            if not click.confirm(f"Conda env already exists: {env_path}. Overwrite?"):
+        # not resolved, the env may be a symlink to the env store
+        env_path = Path(os.path.abspath(self.conda_env_root / env_name))
+        if env_path.exists() or env_path.is_symlink():
+            if not confirm_overwrite(
+                f"Conda env already exists: {env_path}. Overwrite?", overwrite
+            ):
                 return env_path
-        proc = subprocess.run(
-            [
-                self.conda_exe, "env", "create",
-                "--prefix", env_path,
-                "--file", env_file,
-                "--yes", "--quiet"
-            ]
-        )
-        proc.check_returncode()
+            if env_path.is_symlink():
+                env_path.unlink()
+            else:
+                # the store links or clones into the path, neither replaces it
+                shutil.rmtree(env_path)
+        spec = YAML(typ="safe").load(env_file)
+        if self.env_store is not None:
+            self.env_store.provide(
+                spec,
+                target=env_path,
+                create=lambda prefix: self._create_prefix(prefix, env_file, spec, lock_file),
+                clone=self._clone_prefix,
+            )
+        else:
+            self._create_prefix(env_path, env_file, spec, lock_file)
         return env_path
 
+    def _create_prefix(self, prefix: Path, env_file: Path, spec, lock_file: Path = None):
+        spec_hash = conda_env_key(spec)
+        if (
+            lock_file is not None
+            and not self.relock
+            and read_lock_spec_hash(lock_file) == spec_hash
+        ):
+            logging.info("Creating conda env %s from lock file %s", prefix, lock_file)
+            with self.limits.acquire("conda"), tracer.span("conda.create", prefix=str(prefix)):
+                proc = subprocess.run(
+                    [
+                        self.conda_exe, "create",
+                        "--prefix", prefix,
+                        "--file", lock_file,
+                        "--yes", "--quiet"
+                    ]
+                )
+            proc.check_returncode()
+            return
+        # solving, downloading and linking the packages in one step
+        with self.limits.acquire("conda"), tracer.span("conda.solve", prefix=str(prefix)):
+            proc = subprocess.run(
+                [
+                    self.conda_exe, "env", "create",
+                    "--prefix", prefix,
+                    "--file", env_file,
+                    "--yes", "--quiet"
+                ]
+            )
+        proc.check_returncode()
+        if lock_file is None:
+            return
+        if "pip" in normalize_env_spec(spec):
+            logging.info("Not locking %s, pip dependencies cannot be locked", lock_file)
+            return
+        self.write_lock_file(prefix, lock_file, spec_hash)
+
+    def write_lock_file(self, prefix: Path, lock_file: Path, spec_hash: str):
+        """
+        Write the explicit list of packages installed in the environment
+        to the lock file headed by the hash of the environment specification.
+        """
+        if Path(self.conda_exe).name.startswith("micromamba"):
+            export_args = ["env", "export", "--explicit", "--md5"]
+        else:
+            export_args = ["list", "--explicit", "--md5"]
+        with tracer.span("conda.lock", prefix=str(prefix)):
+            explicit = subprocess.check_output(
+                [self.conda_exe, *export_args, "--prefix", prefix], text=True
+            )
+        tmp_file = lock_file.with_name(lock_file.name + ".tmp")
+        with open(tmp_file, "w") as fp:
+            fp.write(
+                "# Generated by slivka-bio-installer. Do not edit.\n"
+                f"{LOCK_SPEC_HASH_PREFIX}{spec_hash}\n"
+            )
+            fp.write(explicit)
+        os.replace(tmp_file, lock_file)
+        logging.info("Lock file written: %s", lock_file)
+
+    def _clone_prefix(self, src_prefix: Path, prefix: Path):
+        with self.limits.acquire("conda"), tracer.span("conda.clone", prefix=str(prefix)):
+            proc = subprocess.run(
+                [
+                    self.conda_exe, "create",
+                    "--clone", src_prefix,
+                    "--prefix", prefix,
+                    "--yes", "--quiet"
+                ]
+            )
+        proc.check_returncode()
+
+
+LOCK_SPEC_HASH_PREFIX = "# spec-hash: "
+
+
+def read_lock_spec_hash(lock_file: Path):
+    """
+    Read the hash of the environment specification the lock file was
+    solved for. Return None if the file does not exist or has no hash.
+    """
+    try:
+        with open(lock_file) as fp:
+            for line in fp:
+                if not line.startswith("#"):
+                    break
+                if line.startswith(LOCK_SPEC_HASH_PREFIX):
+                    return line[len(LOCK_SPEC_HASH_PREFIX):].strip()
+    except FileNotFoundError:
+        pass
+    return None
+
+
+def conda_platform():
+    """
+    Return the conda subdir of the current platform e.g. linux-64.
+    The CONDA_SUBDIR environment variable takes precedence.
+    """
+    if os.environ.get("CONDA_SUBDIR"):
+        return os.environ["CONDA_SUBDIR"]
+    system = {"linux": "linux", "darwin": "osx", "win32": "win"}.get(
+        sys.platform, sys.platform
+    )
+    machine = platform.machine().lower()
+    arch = {"x86_64": "64", "amd64": "64", "arm64": "arm64"}.get(machine, machine)
+    if system == "linux" and machine == "arm64":
+        arch = "aarch64"
+    return f"{system}-{arch}"
+
+
+def normalize_env_spec(spec: collections.abc.Mapping) -> dict:
+    """
+    Normalize conda environment specification so that equivalent
+    specifications produce identical output. Environment name and
+    prefix are dropped and the dependencies are sorted.
+    """
+    spec = json.loads(json.dumps(spec or {}))
+    spec.pop("name", None)
+    spec.pop("prefix", None)
+    dependencies = []
+    pip_dependencies = []
+    for dependency in spec.pop("dependencies", None) or []:
+        if isinstance(dependency, collections.abc.Mapping):
+            pip_dependencies.extend(dependency.get("pip", []))
+        else:
+            dependencies.append(" ".join(str(dependency).split()))
+    normalized = {
+        **spec,
+        "channels": list(spec.get("channels") or []),
+        "dependencies": sorted(dependencies),
+    }
+    if pip_dependencies:
+        normalized["pip"] = sorted(pip_dependencies)
+    return normalized
+
+
+def conda_env_key(spec: collections.abc.Mapping, platform_name=None) -> str:
+    """
+    Compute the content address of the conda environment from its
+    normalized specification and target platform.
+    """
+    data = {
+        "spec": normalize_env_spec(spec),
+        "platform": platform_name or conda_platform(),
+    }
+    encoded = json.dumps(data, sort_keys=True, separators=(",", ":")).encode()
+    return hashlib.sha256(encoded).hexdigest()[:32]
+
+
+class CondaEnvStore:
+    """
+    Content-addressed store of conda environments shared between projects.
+
+    Environments are stored under ``envs/<key>`` where the key is a hash
+    of the normalized environment specification and the platform.
+    Each environment has a ``envs/<key>.json`` metadata file listing
+    the project environments referencing it, written once the environment
+    is complete. Projects either symlink the stored environment (link mode)
+    or clone it (clone mode).
+    """
+
+    MARKER_FILE = ".slivka-env-store"
+
+    def __init__(self, root: Path, mode="link"):
+        if mode not in ("link", "clone"):
+            raise ValueError(f"Invalid env store mode: {mode}")
+        self.root = Path(os.path.abspath(root))
+        self.mode = mode
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def env_path(self, key: str) -> Path:
+        return self.root / "envs" / key
+
+    def _meta_path(self, key: str) -> Path:
+        return self.root / "envs" / f"{key}.json"
+
+    def read_meta(self, key: str):
+        try:
+            with open(self._meta_path(key)) as fp:
+                return json.load(fp)
+        except FileNotFoundError:
+            return None
+
+    def _write_meta(self, key: str, meta: dict):
+        meta_path = self._meta_path(key)
+        tmp_path = meta_path.with_suffix(".json.tmp")
+        with open(tmp_path, "w") as fp:
+            json.dump(meta, fp, indent=2)
+        os.replace(tmp_path, meta_path)
+
+    @contextlib.contextmanager
+    def lock(self, key: str):
+        """Lock the store entry against other threads and processes."""
+        with self._locks_guard:
+            thread_lock = self._locks.setdefault(key, threading.Lock())
+        with thread_lock:
+            lock_path = self.root / "locks" / f"{key}.lock"
+            lock_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(lock_path, "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                yield
+
+    def provide(self, spec, target: Path, create, clone=None):
+        """
+        Make the environment matching the specification available at
+        the target path, creating it in the store if missing.
+
+        :param spec:
+            Conda environment specification.
+        :param Path target:
+            Path of the project environment.
+        :param create:
+            Function creating the environment at the given prefix.
+        :param clone:
+            Function cloning the environment from the first prefix
+            to the second one. Required in clone mode.
+        :return: Store key of the environment.
+        """
+        key = conda_env_key(spec)
+        store_path = self.env_path(key)
+        with self.lock(key):
+            meta = self.read_meta(key)
+            # an environment removed from the store leaves its links dangling
+            if meta is None or not store_path.is_dir():
+                logging.info("Creating conda env in the store: %s", store_path)
+                if store_path.exists():
+                    # leftover of an interrupted creation
+                    shutil.rmtree(store_path)
+                store_path.parent.mkdir(parents=True, exist_ok=True)
+                create(store_path)
+                meta = {
+                    "key": key,
+                    "spec": normalize_env_spec(spec),
+                    "platform": conda_platform(),
+                    "references": meta["references"] if meta is not None else [],
+                }
+            else:
+                click.echo(f"Using stored conda env: {store_path}")
+            if self.mode == "link":
+                target.parent.mkdir(parents=True, exist_ok=True)
+                target.symlink_to(store_path, target_is_directory=True)
+            else:
+                clone(store_path, target)
+                (target / self.MARKER_FILE).write_text(key)
+            meta["references"] = sorted({*meta["references"], str(target)})
+            self._write_meta(key, meta)
+        return key
+
+    def is_reference(self, key: str, path: Path) -> bool:
+        if path.is_symlink():
+            return path.resolve() == self.env_path(key).resolve()
+        marker = path / self.MARKER_FILE
+        return marker.is_file() and marker.read_text().strip() == key
+
+    def collect_garbage(self) -> list[str]:
+        """
+        Remove environments not referenced by any project and leftovers
+        of interrupted environment creation.
+
+        :return: List of removed keys.
+        """
+        envs_dir = self.root / "envs"
+        if not envs_dir.is_dir():
+            return []
+        removed = []
+        for meta_path in sorted(envs_dir.glob("*.json")):
+            key = meta_path.stem
+            with self.lock(key):
+                meta = self.read_meta(key)
+                if meta is None:
+                    continue
+                references = [
+                    ref for ref in meta["references"] if self.is_reference(key, Path(ref))
+                ]
+                if references:
+                    if references != meta["references"]:
+                        self._write_meta(key, {**meta, "references": references})
+                    continue
+                logging.info("Removing unreferenced conda env: %s", key)
+                shutil.rmtree(self.env_path(key), ignore_errors=True)
+                meta_path.unlink()
+                removed.append(key)
+        for path in sorted(envs_dir.iterdir()):
+            if path.is_dir() and not self._meta_path(path.name).exists():
+                with self.lock(path.name):
+                    if self._meta_path(path.name).exists():
+                        continue
+                    logging.info("Removing incomplete conda env: %s", path.name)
+                    shutil.rmtree(path, ignore_errors=True)
+                    removed.append(path.name)
+        return removed
+
 
 def detect_conda_exe():
     try:
@@ -406,11 +3041,151 @@ def _iter_conda_exe():
     yield shutil.which("conda")
 
 
+# Prints environment variables followed by the separator and the paths
+# of the programs given as arguments, one "name=path" pair per line.
+_INTROSPECTION_SEPARATOR = "--- slivka-installer which ---"
+_INTROSPECTION_SCRIPT = (
+    f'env; echo "{_INTROSPECTION_SEPARATOR}"; '
+    'for prog in "$@"; do printf "%s=%s\\n" "$prog" "$(command -v "$prog")"; done'
+)
+
+
+def parse_introspection_output(output: str) -> tuple[dict, dict]:
+    """
+    Parse the output of the introspection script.
+
+    :return:
+        Environment variables and paths of the programs, None
+        for the programs which were not found.
+    """
+    env_output, _, which_output = f"\n{output}".partition(
+        f"\n{_INTROSPECTION_SEPARATOR}\n"
+    )
+    env_vars = dict(
+        line.split("=", 1) for line in env_output.splitlines() if "=" in line
+    )
+    which = {}
+    for line in which_output.splitlines():
+        name, _, path = line.partition("=")
+        # command -v prints names of shell builtins and functions
+        which[name] = path if path.startswith("/") else None
+    return env_vars, which
+
+
+def installer_cache_dir() -> Path:
+    """
+    Directory for the installer caches, $SLIVKA_INSTALLER_CACHE or
+    slivka-bio-installer in the user cache directory.
+    """
+    if os.environ.get("SLIVKA_INSTALLER_CACHE"):
+        return Path(os.environ["SLIVKA_INSTALLER_CACHE"])
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home, "slivka-bio-installer")
+
+
+class ImageIntrospectionCache:
+    """
+    On-disk cache of environment variables and executable paths resolved
+    in docker images. Entries are keyed by the image id, so rebuilt or
+    re-pulled images never use stale values.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _entry_path(self, image_id: str) -> Path:
+        return self.root / f"{image_id.replace(':', '-')}.json"
+
+    def load(self, image_id: str) -> dict:
+        try:
+            with open(self._entry_path(image_id)) as fp:
+                return json.load(fp)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def save(self, image_id: str, entry: dict):
+        with self._lock:
+            self.root.mkdir(parents=True, exist_ok=True)
+            path = self._entry_path(image_id)
+            tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+            with open(tmp_path, "w") as fp:
+                json.dump(entry, fp, indent=2)
+            os.replace(tmp_path, path)
+
+
 class DockerEnvContextMap:
-    def __init__(self, docker_exe, image_name):
+    def __init__(self, docker_exe, image_name, cache: ImageIntrospectionCache = None):
         self.docker_exe = docker_exe
         self.image_name = image_name
         self._env_vars = None
+        self._which = {}
+        self._cache = cache
+        self._image_id = None
+        if cache is not None:
+            self._image_id = self._read_image_id()
+        if self._image_id is not None:
+            entry = cache.load(self._image_id)
+            self._env_vars = entry.get("env")
+            self._which.update(entry.get("which", {}))
+            if entry:
+                logging.debug("Loaded cached introspection of %s", image_name)
+
+    def _read_image_id(self):
+        try:
+            output = subprocess.check_output(
+                [
+                    self.docker_exe, "image", "inspect",
+                    "--format", "{{.Id}}",
+                    self.image_name
+                ],
+                text=True,
+            )
+        except subprocess.CalledProcessError as e:
+            logging.info("Cannot read id of image %s: %s", self.image_name, e)
+            return None
+        return output.strip() or None
+
+    def _save_cache(self):
+        if self._image_id is None:
+            return
+        self._cache.save(
+            self._image_id,
+            {"image": self.image_name, "env": self._env_vars, "which": self._which},
+        )
+
+    def prefetch(self, keys: Iterable[str]):
+        """
+        Resolve all env and which keys in a single container run.
+        Keys which could not be prefetched are resolved on access.
+        """
+        keys = [k.partition(":") for k in keys]
+        if not any(key in ("env", "which") for key, _, _ in keys):
+            return
+        programs = sorted(
+            {name for key, _, name in keys if key == "which"} - self._which.keys()
+        )
+        if not programs and self._env_vars is not None:
+            return
+        logging.debug("Introspecting image %s for: %s", self.image_name, programs)
+        try:
+            with tracer.span("docker.introspect", image=self.image_name):
+                output = subprocess.check_output(
+                    [
+                        self.docker_exe, "run", "--rm",
+                        "--entrypoint", "sh",
+                        self.image_name,
+                        "-c", _INTROSPECTION_SCRIPT, "sh", *programs
+                    ],
+                    text=True,
+                )
+        except subprocess.CalledProcessError as e:
+            logging.info("Introspection of image %s failed: %s", self.image_name, e)
+            return
+        env_vars, which = parse_introspection_output(output)
+        self._env_vars = env_vars
+        self._which.update(which)
+        self._save_cache()
 
     def __getitem__(self, item):
         logging.debug(f"DockerEnvContextMap __getitem__({item})")
@@ -427,6 +3202,7 @@ class DockerEnvContextMap:
     def get_env_var(self, name):
         if self._env_vars is None:
             self._env_vars = self._populate_env_vars()
+            self._save_cache()
         return self._env_vars[name]
 
     def _populate_env_vars(self):
@@ -441,6 +3217,11 @@ class DockerEnvContextMap:
         return env_vars
 
     def get_which(self, prog_name):
+        if prog_name in self._which:
+            path = self._which[prog_name]
+            if path is None:
+                raise FileNotFoundError(f"Executable not found: {prog_name}")
+            return path
         logging.debug("Finding executable '%s' in image: %s", prog_name, self.image_name)
         try:
             output = subprocess.check_output(
@@ -457,50 +3238,94 @@ class DockerEnvContextMap:
             )
         except subprocess.CalledProcessError as e:
             if e.returncode == 1:
+                self._which[prog_name] = None
+                self._save_cache()
                 raise FileNotFoundError(f"Executable not found: {prog_name}")
             raise
         path = output.strip()
         logging.debug("Found executable '%s' at: %s", prog_name, path)
+        self._which[prog_name] = path
+        self._save_cache()
         return path
 
 
 class DockerInstaller:
-    def __init__(self):
+    def __init__(
+        self,
+        limits=None,
+        overwrite=None,
+        copy_mode="copy",
+        copy_threads=1,
+        image_cache: ImageIntrospectionCache = None,
+        build_cache: Path = None,
+        pull_policy="always",
+        job_threads: ThreadAllocation = None,
+        pool_size=0,
+        launch_plan=False,
+        env_names: Iterable[str] = (),
+    ):
         docker_exe = shutil.which("docker")
         if not docker_exe:
             docker_exe = shutil.which("podman")
         if not docker_exe:
             raise FileNotFoundError("Docker not found.")
         self.docker_exe: str = docker_exe
+        self.limits = limits or PhaseLimits()
+        self.overwrite = overwrite
+        self.copy_mode = copy_mode
+        self.copy_threads = copy_threads
+        self.image_cache = image_cache
+        self.build_cache = build_cache
+        self.pull_policy = pull_policy
+        self.job_threads = job_threads
+        self.pool_size = pool_size
+        self.launch_plan = launch_plan
+        self.env_names = list(env_names)
+
+    def rendering_options(self) -> dict:
+        return rendering_options(
+            "docker",
+            self.job_threads,
+            pool_size=self.pool_size,
+            launch_plan=self.launch_plan,
+            env_names=self.env_names,
+        )
 
-    def install_service(self, install_file: Path, project_path: Path):
-        config = yaml.load(install_file)
+    def install_service(self, install_file: Path, project_path: Path, overwrite=None):
+        if overwrite is None:
+            overwrite = self.overwrite
+        config = YAML().load(install_file)
         # strip .docker.yaml suffix
         base_name = install_file.name[: -len(".docker.yaml")]
-        image_name = self._make_image(install_file.parent, config)
-        env_context = DockerEnvContextMap(self.docker_exe, image_name)
+        with self.limits.acquire("docker"):
+            image_name = self._make_image(install_file.parent, config)
+        env_context = DockerEnvContextMap(self.docker_exe, image_name, self.image_cache)
 
         dst_data_dir = project_path / "data" / base_name
-        copied_data_dirs = find_and_copy_data_dirs(
-            src_root=install_file.parent,
-            target_root=dst_data_dir,
-            patterns=config.get("files", []),
-        )
+        with self.limits.acquire("copy"):
+            copied_data_dirs = find_and_copy_data_dirs(
+                src_root=install_file.parent,
+                target_root=dst_data_dir,
+                patterns=config.get("files", []),
+                overwrite=overwrite,
+                mode=self.copy_mode,
+                threads=self.copy_threads,
+            )
         data_dirs_context = local_paths_context(copied_data_dirs, dst_root=dst_data_dir)
         runtime_data_dirs_context = runtime_paths_context(
             copied_data_dirs, dst_root=Path("/data")
         )
 
-        context_map = ChainMap(
-            env_context, data_dirs_context, runtime_data_dirs_context
+        context_map = TemplateContext(
+            env_context,
+            data_dirs_context,
+            runtime_data_dirs_context,
+            SharedPathsContextMap(Path("/shared")),
+            variables=config.get("vars", {}),
         )
-        vars_context = {
-            f"var:{key}": val
-            for key, val in interpolate_dict(
-                config.get("vars", {}), context_map
-            ).items()
-        }
-        context_map.maps.insert(0, vars_context)
+        template = ServiceTemplate(install_file.with_name(f"{base_name}.service.yaml"))
+        required_keys = context_map.required_keys(template.keys)
+        env_context.prefetch(required_keys)
 
         mount_args = sum(
             (
@@ -509,25 +3334,47 @@ class DockerInstaller:
             ),
             (),
         )
+        mount_args += sum(
+            (
+                ("--mount", f"type=bind,src={project_path / p},dst=/shared/{p},ro")
+                for p in SharedPathsContextMap.required_paths(required_keys)
+            ),
+            (),
+        )
         wrapper_script = os.path.join("${SLIVKA_HOME}", "scripts", "run_with_docker.sh")
+        if self.launch_plan:
+            plan_file = project_path / "services" / f"{base_name}.docker.plan"
+            write_docker_plan(
+                plan_file,
+                image_name,
+                mount_args,
+                [*(template.data.get("env") or {}), *self.env_names],
+            )
+            launch_args = ["--plan", os.path.join("${SLIVKA_HOME}", "services", plan_file.name)]
+        else:
+            launch_args = [*mount_args, image_name]
         command_prefix = [
             shutil.which("env"),
             # DOCKER_* variables are essential for "run_with_docker.sh" but slivka removes them
             *(f"{k}={v}" for k, v in os.environ.items() if k.startswith("DOCKER_")),
             "bash",
             wrapper_script,
-            *mount_args,
-            image_name,
+            *launch_args,
         ]
         return copy_service_file(
-            template_file=install_file.with_name(f"{base_name}.service.yaml"),
+            template_file=template,
             target_root=project_path,
             template_data=context_map,
             prepend_command=command_prefix,
+            env={"SLIVKA_DOCKER_POOL": str(self.pool_size)} if self.pool_size else None,
+            threads=self.job_threads,
         )
 
     def _make_image(self, src_root: Path, config: dict):
         if "pull" in config:
+            if self.pull_policy == "missing" and self.image_id(image_reference(config)):
+                logging.info("Image present, not pulling: %s", image_reference(config))
+                return image_reference(config)
             if isinstance(config["pull"], str):
                 return pull_docker_image(image_name=config["pull"])
             else:
@@ -550,26 +3397,326 @@ class DockerInstaller:
         if not dockerfile.is_file():
             raise FileNotFoundError(f"{dockerfile}")
         full_tag = f"{image_name}:{image_tag}" if image_tag else image_name
-        if subprocess.check_output([self.docker_exe, "image", "ls", "-q", full_tag]):
-            click.echo(f"Image already exists: {full_tag}. Skipping build.")
+        digest = dockerfile_digest(dockerfile, platform)
+        if self.image_digest(full_tag) == digest:
+            click.echo(f"Image up to date: {full_tag}. Skipping build.")
             return full_tag
         options = []
         if platform:
             options.extend(["--platform", platform])
+        if self.build_cache is not None:
+            cache_dir = self.build_cache / bake_target_name(full_tag)
+            options.extend([
+                "--cache-from", f"type=local,src={cache_dir}",
+                "--cache-to", f"type=local,dest={cache_dir},mode=max",
+            ])
+        with tracer.span("docker.build", image=full_tag):
+            proc = subprocess.run(
+                [
+                    self.docker_exe,
+                    "buildx",
+                    "build",
+                    "--tag", full_tag,
+                    "--label", f"{DOCKERFILE_DIGEST_LABEL}={digest}",
+                    *options,
+                    "--file", dockerfile,
+                    dockerfile.parent,
+                ],
+                cwd=dockerfile.parent,
+            )
+        proc.check_returncode()
+        return full_tag
+
+    def image_id(self, full_tag):
+        """Return the id of the local image or None if it does not exist."""
+        proc = subprocess.run(
+            [self.docker_exe, "image", "inspect", "--format", "{{.Id}}", full_tag],
+            capture_output=True,
+            text=True,
+        )
+        if proc.returncode != 0:
+            return None
+        return proc.stdout.strip() or None
+
+    def image_digest(self, full_tag):
+        """
+        Read the Dockerfile digest label of the local image.
+        Return None if the image or the label does not exist.
+        """
         proc = subprocess.run(
             [
-                self.docker_exe,
-                "buildx",
-                "build",
-                "--tag", full_tag,
-                *options,
-                "--file", dockerfile,
-                dockerfile.parent,
+                self.docker_exe, "image", "inspect",
+                "--format", f'{{{{ index .Config.Labels "{DOCKERFILE_DIGEST_LABEL}" }}}}',
+                full_tag
             ],
-            cwd=dockerfile.parent,
+            capture_output=True,
+            text=True,
         )
+        if proc.returncode != 0:
+            return None
+        return proc.stdout.strip() or None
+
+    def bake_images(self, install_files: Iterable[Path]) -> list[str]:
+        """
+        Build images of all the services having a build section in
+        a single ``docker buildx bake`` run. Images whose Dockerfile
+        did not change since they were built are skipped.
+
+        :return: Tags of the images built.
+        """
+        build_specs = []
+        for install_file in install_files:
+            config = YAML(typ="safe").load(install_file)
+            if "build" not in config:
+                continue
+            build = config["build"]
+            dockerfile = install_file.parent / build["dockerfile"]
+            full_tag = image_reference(config)
+            digest = dockerfile_digest(dockerfile, build.get("platform"))
+            if self.image_digest(full_tag) == digest:
+                logging.info("Image up to date: %s", full_tag)
+                continue
+            build_specs.append({
+                "dockerfile": dockerfile,
+                "tag": full_tag,
+                "platform": build.get("platform"),
+                "digest": digest,
+            })
+        if not build_specs:
+            return []
+        plan = make_bake_plan(build_specs, self.build_cache)
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as plan_file:
+            json.dump(plan, plan_file, indent=2)
+            plan_file.flush()
+            logging.debug("Bake plan:\n%s", json.dumps(plan, indent=2))
+            click.echo(f"Building images: {', '.join(spec['tag'] for spec in build_specs)}")
+            with self.limits.acquire("docker"), tracer.span(
+                "docker.bake", images=len(build_specs)
+            ):
+                proc = subprocess.run(
+                    [self.docker_exe, "buildx", "bake", "--file", plan_file.name]
+                )
         proc.check_returncode()
-        return full_tag
+        return [spec["tag"] for spec in build_specs]
+
+
+    def export_images(self, install_files: Iterable[Path], bundle_file: Path):
+        """
+        Save images used by the services to the bundle file. The bundle
+        is a tar archive containing a ``manifest.json`` describing the
+        images and their sources, and an ``images.tar`` archive created
+        by ``docker save`` in which layers shared by images are stored once.
+        """
+        manifest = make_bundle_manifest(install_files)
+        missing = []
+        for entry in manifest["images"]:
+            entry["id"] = self.image_id(entry["tag"])
+            if entry["id"] is None:
+                missing.append(entry["tag"])
+        if missing:
+            raise click.ClickException(f"Images not found: {', '.join(missing)}")
+        tags = sorted({entry["tag"] for entry in manifest["images"]})
+        save_args = ["save"]
+        if Path(self.docker_exe).name.startswith("podman"):
+            save_args.append("--multi-image-archive")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            images_file = Path(tmp_dir, "images.tar")
+            click.echo(f"Saving images: {', '.join(tags)}")
+            with tracer.span("docker.save", images=len(tags)) as span:
+                proc = subprocess.run(
+                    [self.docker_exe, *save_args, "--output", images_file, *tags]
+                )
+                proc.check_returncode()
+                span["bytes"] = images_file.stat().st_size
+            manifest_file = Path(tmp_dir, "manifest.json")
+            manifest_file.write_text(json.dumps(manifest, indent=2))
+            mode = "w:gz" if bundle_file.name.endswith((".gz", ".tgz")) else "w"
+            with tarfile.open(bundle_file, mode) as bundle:
+                bundle.add(manifest_file, arcname="manifest.json")
+                bundle.add(images_file, arcname="images.tar")
+        click.echo(f"Images saved: {bundle_file}")
+
+    def import_images(self, bundle_file: Path, install_files: Iterable[Path]):
+        """
+        Load images from the bundle file. Images in the bundle which
+        do not match the build or pull sections of the services are
+        reported as stale. Nothing is loaded if all the images are
+        already present, ``docker load`` skips existing layers otherwise.
+        """
+        with tarfile.open(bundle_file) as bundle:
+            manifest = json.load(bundle.extractfile("manifest.json"))
+            for message in check_bundle_manifest(manifest, install_files):
+                click.echo(f"{click.style('Stale', fg='yellow')}: {message}")
+            if all(
+                self.image_id(entry["tag"]) == entry["id"]
+                for entry in manifest["images"]
+            ):
+                click.echo("All images already present.")
+                return
+            click.echo(f"Loading images from: {bundle_file}")
+            with self.limits.acquire("docker"), tracer.span("docker.load") as span:
+                proc = subprocess.Popen(
+                    [self.docker_exe, "load"], stdin=subprocess.PIPE
+                )
+                with proc.stdin:
+                    shutil.copyfileobj(bundle.extractfile("images.tar"), proc.stdin, 1 << 20)
+                proc.wait()
+                span["bytes"] = bundle.getmember("images.tar").size
+        if proc.returncode != 0:
+            raise subprocess.CalledProcessError(proc.returncode, proc.args)
+
+
+def write_docker_plan(plan_file: Path, image_name, mount_args, env_names):
+    """
+    Write the launch plan of the service's docker jobs read by
+    ``run_with_docker.sh --plan``. The plan is a bash script setting
+    the image, the data mount arguments and the names or glob patterns
+    of the variables passed to the container.
+    """
+    def array(values):
+        return " ".join(shlex.quote(str(value)) for value in values)
+
+    plan_file.parent.mkdir(parents=True, exist_ok=True)
+    plan_file.write_text(
+        "# Docker launch plan written by install.py\n"
+        f"image={shlex.quote(image_name)}\n"
+        f"mount_args=({array(mount_args)})\n"
+        f"env_names=({array(dict.fromkeys(env_names))})\n"
+    )
+    logging.info("Docker launch plan created: %s", plan_file)
+
+
+def image_reference(config: dict) -> str:
+    """Return the full tag of the image specified in the docker config."""
+    if "pull" in config:
+        pull = config["pull"]
+        if isinstance(pull, str):
+            return pull
+        return f"{pull['image']}:{pull['tag']}" if pull.get("tag") else pull["image"]
+    if "build" in config:
+        build = config["build"]
+        return f"{build['image']}:{build['tag']}" if build.get("tag") else build["image"]
+    raise ValueError("No image specified in the config.")
+
+
+def make_bundle_manifest(install_files: Iterable[Path]) -> dict:
+    """
+    Describe images used by the services and their sources.
+    Image ids are filled in when the images are saved.
+    """
+    images = []
+    for install_file in install_files:
+        config = YAML(typ="safe").load(install_file)
+        entry = {
+            "service": install_file.name[: -len(".docker.yaml")],
+            "tag": image_reference(config),
+            "id": None,
+        }
+        if "build" in config:
+            dockerfile = install_file.parent / config["build"]["dockerfile"]
+            entry["source"] = "build"
+            entry["dockerfile-digest"] = dockerfile_digest(
+                dockerfile, config["build"].get("platform")
+            )
+        else:
+            entry["source"] = "pull"
+        images.append(entry)
+    return {"version": 1, "created": time.time(), "images": images}
+
+
+def check_bundle_manifest(manifest: dict, install_files: Iterable[Path]) -> list[str]:
+    """
+    Compare bundled images against the services' build and pull sections.
+
+    :return: Descriptions of the stale or missing images.
+    """
+    bundled = {entry["service"]: entry for entry in manifest["images"]}
+    current = {entry["service"]: entry for entry in make_bundle_manifest(install_files)["images"]}
+    problems = []
+    for service, entry in current.items():
+        bundled_entry = bundled.get(service)
+        if bundled_entry is None:
+            problems.append(f"{service}: image {entry['tag']} not in the bundle")
+        elif bundled_entry["tag"] != entry["tag"]:
+            problems.append(
+                f"{service}: bundle has {bundled_entry['tag']}, service uses {entry['tag']}"
+            )
+        elif bundled_entry.get("dockerfile-digest") != entry.get("dockerfile-digest"):
+            problems.append(f"{service}: Dockerfile of {entry['tag']} changed")
+    return problems
+
+
+DOCKERFILE_DIGEST_LABEL = "org.slivka.installer.dockerfile-digest"
+
+
+def dockerfile_digest(dockerfile: Path, platform=None) -> str:
+    """
+    Digest of the Dockerfile content and the target platform used to
+    decide whether the image needs rebuilding.
+    """
+    digest = hashlib.sha256(dockerfile.read_bytes())
+    digest.update(f"\0{platform or ''}".encode())
+    return digest.hexdigest()
+
+
+def buildx_driver(docker_exe="docker"):
+    """
+    Driver of the active buildx builder or None if it can't be determined.
+
+    Cache export to a local directory is not supported by the default
+    ``docker`` driver and needs a ``docker-container`` builder.
+    """
+    try:
+        proc = subprocess.run(
+            [docker_exe, "buildx", "inspect"],
+            capture_output=True, text=True
+        )
+    except OSError:
+        return None
+    if proc.returncode != 0:
+        return None
+    for line in proc.stdout.splitlines():
+        key, _, value = line.partition(":")
+        if key.strip() == "Driver":
+            return value.strip()
+    return None
+
+
+def bake_target_name(full_tag: str) -> str:
+    return re.sub(r"[^\w\-]", "_", full_tag)
+
+
+def make_bake_plan(build_specs: list[dict], cache_dir: Path = None) -> dict:
+    """
+    Make a ``docker buildx bake`` definition building all images
+    in the default group.
+
+    :param build_specs:
+        List of dicts with dockerfile, tag, platform and digest keys.
+    :param Path cache_dir:
+        Directory of the local build cache to import from and export to.
+    """
+    targets = {}
+    for spec in build_specs:
+        name = bake_target_name(spec["tag"])
+        dockerfile = Path(spec["dockerfile"])
+        target = {
+            "context": str(dockerfile.parent),
+            "dockerfile": dockerfile.name,
+            "tags": [spec["tag"]],
+            "labels": {DOCKERFILE_DIGEST_LABEL: spec["digest"]},
+            "output": ["type=docker"],
+        }
+        if spec.get("platform"):
+            target["platforms"] = [spec["platform"]]
+        if cache_dir is not None:
+            target["cache-from"] = [f"type=local,src={cache_dir / name}"]
+            target["cache-to"] = [f"type=local,dest={cache_dir / name},mode=max"]
+        targets[name] = target
+    return {
+        "group": {"default": {"targets": list(targets)}},
+        "target": targets,
+    }
 
 
 def pull_docker_image(image_name, image_tag=None, platform=None):
@@ -577,29 +3724,240 @@ def pull_docker_image(image_name, image_tag=None, platform=None):
     options = []
     if platform:
         options.extend(["--platform", platform])
-    proc = subprocess.run(["docker", "image", "pull", *options, "--quiet", full_tag])
+    with tracer.span("docker.pull", image=full_tag):
+        proc = subprocess.run(["docker", "image", "pull", *options, "--quiet", full_tag])
     proc.check_returncode()
     return full_tag
 
 
+def pack_conda_envs(project_path: Path, base_names: Iterable[str], archive: Path):
+    """
+    Pack conda environments, data directories and service files of
+    the services installed with conda into a relocatable archive.
+
+    :param Path project_path:
+        Path to the project the services are installed in.
+    :param base_names:
+        Names of the services to pack.
+    :param Path archive:
+        Path to the output tar archive, compressed if the name ends
+        with .gz or .tgz.
+    """
+    project_path = Path(os.path.abspath(project_path))
+    state = InstallState(project_path)
+    manifest = {"version": 1, "project": str(project_path), "services": {}}
+    mode = "w:gz" if archive.name.endswith((".gz", ".tgz")) else "w"
+    with tarfile.open(archive, mode) as tar:
+        for base_name in base_names:
+            installed = state.services.get(base_name)
+            if installed is None or installed["installer"] != "conda":
+                logging.info("Not packing %s, not installed with conda", base_name)
+                continue
+            click.echo(f"Packing: {base_name}")
+            # environments linked from the env store have the store prefix
+            # hard-coded in their files
+            prefix = (project_path / "conda_env" / base_name).resolve()
+            tar.add(prefix, arcname=f"conda_env/{base_name}")
+            data_dir = project_path / "data" / base_name
+            if data_dir.is_dir():
+                for entry in sorted(os.scandir(data_dir), key=lambda e: e.name):
+                    # directories deployed in symlink mode are packed by content
+                    tar.add(
+                        Path(entry.path).resolve(),
+                        arcname=f"data/{base_name}/{entry.name}",
+                    )
+            service_file = project_path / installed["output"]
+            tar.add(service_file, arcname=installed["output"])
+            command = YAML().load(service_file)["command"]
+            manifest["services"][base_name] = {
+                "prefix": str(prefix),
+                "conda-exe": command[0] if command[1:3] == ["run", "-p"] else None,
+                "state": installed,
+            }
+        manifest_data = json.dumps(manifest, indent=2).encode()
+        info = tarfile.TarInfo("slivka-pack.json")
+        info.size = len(manifest_data)
+        info.mtime = int(time.time())
+        tar.addfile(info, io.BytesIO(manifest_data))
+    click.echo(f"Packed {len(manifest['services'])} service(s): {archive}")
+    return manifest
+
+
+def unpack_conda_envs(archive: Path, project_path: Path, conda_exe=None):
+    """
+    Unpack the archive created by :func:`pack_conda_envs` into the project
+    and relocate the environments and service files to the new location.
+
+    :param Path archive:
+        Path to the packed archive.
+    :param Path project_path:
+        Path to the target project.
+    :param str conda_exe:
+        Conda executable replacing the one used in the packed service
+        files if the latter does not exist on this machine.
+    """
+    project_path = Path(os.path.abspath(project_path))
+    with tarfile.open(archive) as tar:
+        manifest = json.load(tar.extractfile("slivka-pack.json"))
+        # fail before the project is modified
+        for base_name, entry in manifest["services"].items():
+            env_path = str(project_path / "conda_env" / base_name)
+            if len(env_path) > len(entry["prefix"]) and has_binary_placeholders(tar, base_name):
+                raise ValueError(
+                    f"Cannot relocate binary files of {base_name} to a longer prefix: {env_path}"
+                )
+        for base_name in manifest["services"]:
+            # never extract through links to the env store or data sources
+            for path in [
+                project_path / "conda_env" / base_name,
+                *(project_path / "data" / base_name).glob("*"),
+            ]:
+                if path.is_symlink():
+                    path.unlink()
+        members = [m for m in tar.getmembers() if m.name != "slivka-pack.json"]
+        extract_options = {"filter": "tar"} if hasattr(tarfile, "tar_filter") else {}
+        tar.extractall(project_path, members=members, **extract_options)
+    old_project = manifest["project"]
+    state = InstallState(project_path)
+    for base_name, entry in manifest["services"].items():
+        click.echo(f"Relocating: {base_name}")
+        env_path = project_path / "conda_env" / base_name
+        relocate_prefix(env_path, entry["prefix"], str(env_path))
+        service_file = project_path / entry["state"]["output"]
+        text = replace_path(service_file.read_text(), old_project, str(project_path))
+        old_conda_exe = entry.get("conda-exe")
+        if old_conda_exe and not os.path.exists(old_conda_exe):
+            new_conda_exe = (shutil.which(conda_exe) if conda_exe else None) or detect_conda_exe()
+            if new_conda_exe:
+                text = replace_path(text, old_conda_exe, new_conda_exe)
+        service_file.write_text(text)
+        state.finished(base_name, "conda", entry["state"]["fingerprint"], service_file)
+    return manifest
+
+
+def has_binary_placeholders(tar: tarfile.TarFile, base_name: str) -> bool:
+    """
+    Check if any package of the packed environment has the prefix
+    hard-coded in binary files.
+    """
+    meta_dir = f"conda_env/{base_name}/conda-meta/"
+    for member in tar.getmembers():
+        if not (member.isfile() and member.name.startswith(meta_dir) and member.name.endswith(".json")):
+            continue
+        meta = json.load(tar.extractfile(member))
+        for path in meta.get("paths_data", {}).get("paths", []):
+            if path.get("prefix_placeholder") and path.get("file_mode") == "binary":
+                return True
+    return False
+
+
+def replace_path(text: str, old_path: str, new_path: str) -> str:
+    """
+    Replace the path in the text where it is a whole path, or the leading
+    segments of one, so that ``/srv/proj`` does not match in ``/srv/project2``.
+    """
+    pattern = re.compile(r"(?<![\w.\-/])" + re.escape(old_path) + r"(?![\w.\-])")
+    return pattern.sub(lambda _: new_path, text)
+
+
+def relocate_prefix(prefix: Path, old_prefix: str, new_prefix: str):
+    """
+    Replace the old prefix hard-coded in the environment files with the
+    new one. Files are found using conda package metadata, text files
+    are replaced in full while strings in binary files are padded with
+    null bytes which requires the new prefix to be no longer than the old one.
+    Script shebangs in the bin directory not owned by conda are updated too.
+    """
+    if old_prefix == new_prefix:
+        return
+    old, new = old_prefix.encode(), new_prefix.encode()
+    files = {}
+    for meta_file in prefix.glob("conda-meta/*.json"):
+        with open(meta_file) as fp:
+            meta = json.load(fp)
+        for path in meta.get("paths_data", {}).get("paths", []):
+            if path.get("prefix_placeholder"):
+                files[path["_path"]] = path.get("file_mode", "text")
+    bin_dir = prefix / "bin"
+    if bin_dir.is_dir():
+        for entry in os.scandir(bin_dir):
+            rel_path = f"bin/{entry.name}"
+            if rel_path not in files and entry.is_file(follow_symlinks=False):
+                with open(entry.path, "rb") as fp:
+                    if fp.read(2) == b"#!":
+                        files[rel_path] = "text"
+    for rel_path, file_mode in files.items():
+        path = prefix / rel_path
+        if path.is_symlink() or not path.is_file():
+            continue
+        data = path.read_bytes()
+        if old not in data:
+            continue
+        if file_mode == "binary":
+            data = binary_replace(data, old, new)
+        else:
+            data = data.replace(old, new)
+        file_stat = path.stat()
+        path.write_bytes(data)
+        os.chmod(path, file_stat.st_mode)
+
+
+def binary_replace(data: bytes, old: bytes, new: bytes) -> bytes:
+    """
+    Replace the old bytes with the new ones in null-terminated strings
+    of the binary data, padding strings with null bytes to keep offsets.
+    """
+    if len(new) > len(old):
+        raise ValueError(
+            f"Cannot relocate binary files to a longer prefix: {new.decode()}"
+        )
+    pattern = re.compile(re.escape(old) + b"([^\0]*?)\0")
+
+    def replace(match):
+        occurrences = match.group().count(old)
+        padding = (len(old) - len(new)) * occurrences
+        return match.group().replace(old, new) + b"\0" * padding
+
+    return pattern.sub(replace, data)
+
+
 def init_slivka(slivka_path: Path):
-    subprocess.run(["slivka", "init", slivka_path])
+    with tracer.span("slivka.init"):
+        subprocess.run(["slivka", "init", slivka_path])
+
+
+# shared directories whose files are replaced by the installer's versions,
+# other shared files such as the runner profiles are left to the user
+INSTALLER_SHARED_DIRS = ("scripts",)
 
 
 def copy_shared_files(target_root: Path):
+    """
+    Copy the shared files to the project. Existing files in the
+    :data:`INSTALLER_SHARED_DIRS` are replaced if they differ from the
+    installer's version, which the installed service files depend on.
+    """
     logging.info("Copying shared files to %s", target_root)
     shared_dir = Path.cwd() / "shared"
     for root, dirs, files in os.walk(shared_dir):
+        dirs[:] = [dirname for dirname in dirs if dirname != "__pycache__"]
         root = Path(root)
         rel_root: Path = root.relative_to(shared_dir)
         for dirname in dirs:
             (target_root / rel_root / dirname).mkdir(exist_ok=True)
+        installer_owned = rel_root.parts[:1] in [(name,) for name in INSTALLER_SHARED_DIRS]
         for filename in files:
             target_file = target_root / rel_root / filename
             if not target_file.exists():
                 shutil.copy2(root / filename, target_file)
-            else:
+            elif not installer_owned:
                 click.echo(f"File exists: {target_file}")
+            elif not filecmp.cmp(root / filename, target_file, shallow=False):
+                # replaced rather than rewritten, running jobs keep reading the old file
+                tmp_file = target_file.with_name(f".{filename}.tmp")
+                shutil.copy2(root / filename, tmp_file)
+                os.replace(tmp_file, target_file)
+                click.echo(f"File updated: {target_file}")
 
 
 if __name__ == "__main__":
@@ -1,129 +1,73 @@
 import argparse
-import enum
 import re
-import sys
-from collections import namedtuple, OrderedDict
+from collections import namedtuple
+from functools import partial
 
+from jalview import (
+    AnnotationWriter, FeatureWriter, Graph, Graphline, GraphType, Output, SEQUENCE_HEADER,
+    convert, parse_ranges
+)
 
-class GraphType(enum.Enum):
-    BAR_GRAPH = 'BAR_GRAPH'
-    LINE_GRAPH = 'LINE_GRAPH'
-    NO_GRAPH = 'NO_GRAPH'
+Record = namedtuple('record', 'name, coils, rem465, hotloops, scores')
 
+RANGES_LINE = re.compile(r'^# (COILS|REM465|HOTLOOPS)\s*((?:\d+-\d+(?:, )?)*)')
+RESIDUES_HEADER = '# RESIDUE\tCOILS\tREM465\tHOTLOOPS\n'
+# captures the REM465 score
+RESIDUE_LINE = re.compile(r'^[A-Za-z\-]\t\d+\.\d+\t(\d+\.\d+)\t\d+\.\d+$')
 
-Graph = namedtuple('graph', 'type, label, description, values')
-Graphline = namedtuple('graphline', 'value, label, colour')
-Feature = namedtuple('feature', 'description, name, index, start, end, feature_type, score')
+ANNOTATION_LABEL = 'DisemblWS (REM465)'
+ANNOTATION_DESCRIPTION = ('<html>Protein Disorder with DisemblWS - raw scores<br/>'
+                          'Above 0.1204 indicates disorder</html>')
+GRAPHLINE = Graphline(value='0.1204', label='Above 0.1204 indicates disorder', colour='ff0000')
+FEATURE_COLOURS = {'HOTLOOPS': '511e29', 'REM465': '1e5146', 'COILS': 'cfdb48'}
 
 
 def run(args):
-    result = read_file(open(args.input))
+    outputs = []
     if args.annot:
-        with open(args.annot, 'w') as fp:
-            print_annotations_file(result, fp)
+        outputs.append(Output(args.annot, AnnotationWriter, write_annotations))
     if args.feat:
-        with open(args.feat, 'w') as fp:
-            print_features_file(result, fp)
+        make_writer = partial(FeatureWriter, colours=FEATURE_COLOURS, group='DisemblWS')
+        outputs.append(Output(args.feat, make_writer, write_features))
+    # both files are written as the records are read
+    convert(args.input, read_records, outputs, jobs=args.jobs)
 
 
-def read_file(file):
-    result = OrderedDict()
-    annots = None
+def read_records(file):
+    """Read the DisEMBL output one sequence at a time."""
     line = file.readline()
     while line:
         if line == '\n':
             line = file.readline()
             continue
-        seq = re.match(r'^>\s?(.*\S)\s*$', line).group(1)
-        coils = rem465 = hotloops = ()
-        while True:
+        name = SEQUENCE_HEADER.match(line).group(1)
+        ranges = {'COILS': [], 'REM465': [], 'HOTLOOPS': []}
+        line = file.readline()
+        while (match := RANGES_LINE.match(line)) is not None:
+            ranges[match.group(1)] = parse_ranges(match.group(2))
             line = file.readline()
-            match = re.match(r'^# (COILS|REM465|HOTLOOPS)\s*((?:\d+-\d+(?:, )?)*)', line)
-            if match is None: break
-            ranges = [tuple(r.split('-')) for r in match.group(2).split(', ')] if match.group(2) else []
-            if match.group(1) == 'COILS': coils = ranges
-            elif match.group(1) == 'REM465': rem465 = ranges
-            elif match.group(1) == 'HOTLOOPS': hotloops = ranges
-        assert line == '# RESIDUE\tCOILS\tREM465\tHOTLOOPS\n'
+        if line != RESIDUES_HEADER:
+            raise ValueError(f"Residue scores expected for {name}")
+        scores = []
         line = file.readline()
-        annots = []
-        while line:
-            if not re.match(r'^[A-Za-z\-](?:\t\d+\.\d+){3}$', line): break
-            residue, v_coil, v_rem465, v_hotloop = line.split()
-            annots.append(v_rem465)
+        while (match := RESIDUE_LINE.match(line)) is not None:
+            scores.append(match.group(1))
             line = file.readline()
-        result[seq] = (coils, rem465, hotloops, annots)
-    return result
-
-
-def print_annotations_file(data, file=None):
-    file = file or sys.stdout
-    file.write('JALVIEW_ANNOTATION\n\n')
-    for seq, (coils, rem465, hotloops, annots) in data.items():
-        file.write('SEQUENCE_REF\t{}\n'.format(seq))
-        graph = Graph(
-            type=GraphType.LINE_GRAPH,
-            label="DisemblWS (REM465)",
-            description="<html>Protein Disorder with DisemblWS - raw scores<br/>"
-                                    "Above 0.1204 indicates disorder</html>",
-            values=annots
-        )
-        graphline = Graphline(
-            value='0.1204', label='Above 0.1204 indicates disorder', colour='ff0000'
-        )
-        print_annotation_row(graph, graphline, '2385b0', file=file)
-        file.write("\n")
-
-
-def print_annotation_row(graph, graphline=None, colour=None, file=None):
-    row = "{type}\t{label}\t{description}\t{values}".format(
-        type=graph.type.name,
-        label=graph.label,
-        description=graph.description,
-        values=str.join('|', map('{0},{0}'.format, graph.values))
-    )
-    print(row, file=file)
-    if graph.type == GraphType.LINE_GRAPH:
-        if graphline is not None:
-            print('GRAPHLINE\t{name}\t{value}\t{label}\t{colour}'.format(
-                name=graph.label, value=graphline.value, label=graphline.label,
-                colour=graphline.colour
-            ), file=file)
-        if colour is not None:
-            print('COLOUR\t{name}\t{colour}'.format(name=graph.label, colour=colour), file=file)
+        yield Record(name, ranges['COILS'], ranges['REM465'], ranges['HOTLOOPS'], scores)
 
 
-def print_features_file(data, file=None):
-    file = file or sys.stdout
-    file.write(
-        'HOTLOOPS\t511e29\n'
-        'REM465\t1e5146\n'
-        'COILS\tcfdb48\n\n'
-        'STARTGROUP\tDisemblWS\n'
-    )
-    for seq, (coils, rem465, hotloops, annots) in data.items():
-        groups = [coils, rem465, hotloops]
-        descs = ["Random coil", "Missing density", "Flexible loops"]
-        types = ["COILS", "REM465", "HOTLOOPS"]
-        for group, desc, ft_type in zip(groups, descs, types):
-            for region in group:
-                feature = Feature(
-                    description=desc,
-                    name=seq,
-                    index='-1',
-                    start=region[0],
-                    end=region[1],
-                    feature_type=ft_type,
-                    score=None
-                )
-                print_feature_row(feature, file=file)
-        file.write('\n')
-    file.write('ENDGROUP\tDisemblWS\n')
+def write_annotations(writer, record):
+    writer.sequence_ref(record.name)
+    graph = Graph(GraphType.LINE_GRAPH, ANNOTATION_LABEL, ANNOTATION_DESCRIPTION, record.scores)
+    writer.write_graph(graph, GRAPHLINE, '2385b0')
+    writer.blank_line()
 
 
-def print_feature_row(feature, file=None):
-    def is_not_none(val): return val is not None
-    print(str.join('\t', map(str, filter(is_not_none, feature))), file=file)
+def write_features(writer, record):
+    writer.write_ranges(record.name, record.coils, 'COILS', 'Random coil')
+    writer.write_ranges(record.name, record.rem465, 'REM465', 'Missing density')
+    writer.write_ranges(record.name, record.hotloops, 'HOTLOOPS', 'Flexible loops')
+    writer.blank_line()
 
 
 if __name__ == '__main__':
@@ -131,5 +75,7 @@ if __name__ == '__main__':
     parser.add_argument('--input', '-i', required=True)
     parser.add_argument('--annot', '-a')
     parser.add_argument('--feat', '-f')
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help='number of processes for large inputs, 0 for all cores')
     args = parser.parse_args()
     run(args)
@@ -1,9 +1,20 @@
 #! /usr/bin/env bash
 
 set -euo pipefail
-GlobPipe "$@" >output.txt
+# --parser-jobs is the number of processes converting the output
+jobs=1
+args=()
+for arg in "$@"; do
+    if [[ ${arg} == --parser-jobs=* ]]; then
+        jobs=${arg#*=}
+    else
+        args+=("$arg")
+    fi
+done
+GlobPipe ${args[@]+"${args[@]}"} >output.txt
 
 python $JALVIEW_PARSER_SCRIPT \
     --input output.txt \
     --annot globplot.jvannot \
-    --feat globplot.jvfeat
+    --feat globplot.jvfeat \
+    --jobs "$jobs"
@@ -1,124 +1,66 @@
 import argparse
-import enum
 import re
-import sys
-from collections import namedtuple, OrderedDict
+from collections import namedtuple
+from functools import partial
 
+from jalview import (
+    AnnotationWriter, FeatureWriter, Graph, Graphline, GraphType, Output, SEQUENCE_HEADER,
+    convert, parse_ranges
+)
 
-class GraphType(enum.Enum):
-    BAR_GRAPH = 'BAR_GRAPH'
-    LINE_GRAPH = 'LINE_GRAPH'
-    NO_GRAPH = 'NO_GRAPH'
+Record = namedtuple('record', 'name, domains, disorder, scores')
 
+DOMAINS_LINE = re.compile(r'^# GlobDoms\s*((?:\d+-\d+(?:, )?)*)')
+DISORDER_LINE = re.compile(r'^# Disorder\s*((?:\d+-\d+(?:, )?)*)')
 
-Graph = namedtuple('graph', 'type, label, description, values')
-Graphline = namedtuple('graphline', 'value, label, colour')
-Feature = namedtuple('feature', 'description, name, index, start, end, feature_type, score')
+ANNOTATION_LABEL = 'GlobPlotWS (Dydx)'
+ANNOTATION_DESCRIPTION = ('<html>Protein Disorder with GlobPlotWS - raw scores<br/>'
+                          'Above 0.0 indicates disorder</html>')
+GRAPHLINE = Graphline(value='0.0', label='Above 0.0 indicates disorder', colour='ff0000')
+FEATURE_COLOURS = {'Protein Disorder': 'c5b938', 'Globular Domain': '876d2a'}
 
 
 def run(args):
-    result = read_file(open(args.input))
+    outputs = []
     if args.feat:
-        with open(args.feat, 'w') as fp:
-            print_features_file(result, fp)
+        make_writer = partial(FeatureWriter, colours=FEATURE_COLOURS, group='GlobPlotWS')
+        outputs.append(Output(args.feat, make_writer, write_features))
     if args.annot:
-        with open(args.annot, 'w') as fp:
-            print_annotations_file(result, fp)
+        outputs.append(Output(args.annot, AnnotationWriter, write_annotations))
+    # both files are written as the records are read
+    convert(args.input, read_records, outputs, jobs=args.jobs)
 
 
-def read_file(file):
-    result = OrderedDict()
+def read_records(file):
+    """Read the GlobPlot output one sequence at a time."""
     for line in file:
         if line == '\n':
             continue
-        seq = re.match(r'^>\s?(.*\S)\s*$', line).group(1)
-        doms = re.match(r'^# GlobDoms\s*((?:\d+-\d+(?:, )?)*)', next(file)).group(1)
-        doms = [tuple(r.split('-')) for r in doms.split(', ')] if doms else []
-        dis = re.match(r'^# Disorder\s*((?:\d+-\d+(?:, )?)*)', next(file)).group(1)
-        dis = [tuple(r.split('-')) for r in dis.split(', ')] if dis else []
+        name = SEQUENCE_HEADER.match(line).group(1)
+        domains = parse_ranges(DOMAINS_LINE.match(next(file)).group(1))
+        disorder = parse_ranges(DISORDER_LINE.match(next(file)).group(1))
         next(file)
-        annots = []
+        scores = []
         for line in file:
-            if line == '\n': break
+            if line == '\n':
+                break
             residue, dydx, raw, smoothed = line.split()
-            annots.append(dydx)
-        result[seq] = (doms, dis, annots)
-    return result
+            scores.append(dydx)
+        yield Record(name, domains, disorder, scores)
 
 
-def print_annotations_file(data, file=None):
-    file = file or sys.stdout
-    file.write('JALVIEW_ANNOTATION\n\n')
-    for seq, (doms, dis, annots) in data.items():
-        file.write('SEQUENCE_REF\t{}\n'.format(seq))
-        graph = Graph(
-            type=GraphType.LINE_GRAPH,
-            label="GlobPlotWS (Dydx)",
-            description="<html>Protein Disorder with GlobPlotWS - raw scores<br/>"
-                                    "Above 0.0 indicates disorder</html>",
-            values=annots
-        )
-        graphline = Graphline(
-            value='0.0', label='Above 0.0 indicates disorder', colour='ff0000'
-        )
-        print_annotation_row(graph, graphline, '8123cc', file=file)
-        file.write('\n')
+def write_annotations(writer, record):
+    writer.sequence_ref(record.name)
+    graph = Graph(GraphType.LINE_GRAPH, ANNOTATION_LABEL, ANNOTATION_DESCRIPTION, record.scores)
+    writer.write_graph(graph, GRAPHLINE, '8123cc')
+    writer.blank_line()
 
 
-def print_annotation_row(graph, graphline=None, colour=None, file=None):
-    row = "{type}\t{label}\t{description}\t{values}".format(
-        type=graph.type.name,
-        label=graph.label,
-        description=graph.description,
-        values=str.join('|', map('{0},{0}'.format, graph.values))
+def write_features(writer, record):
+    writer.write_ranges(record.name, record.domains, 'Globular Domain', 'Predicted globular domain')
+    writer.write_ranges(
+        record.name, record.disorder, 'Protein Disorder', 'Probable unstructured peptide region'
     )
-    print(row, file=file)
-    if graph.type == GraphType.LINE_GRAPH:
-        if graphline is not None:
-            print('GRAPHLINE\t{name}\t{value}\t{label}\t{colour}'.format(
-                name=graph.label, value=graphline.value, label=graphline.label,
-                colour=graphline.colour
-            ), file=file)
-        if colour is not None:
-            print('COLOUR\t{name}\t{colour}'.format(name=graph.label, colour=colour), file=file)
-
-
-def print_features_file(data, file=None):
-    file = file or sys.stdout
-    file.write(
-        'Protein Disorder\tc5b938\n'
-        'Globular Domain\t876d2a\n\n'
-        'STARTGROUP\tGlobPlotWS\n'
-    )
-    for seq, (doms, dis, annots) in data.items():
-        for domain in doms:
-            feature = Feature(
-                description="Predicted globular domain",
-                name=seq,
-                index='-1',
-                start=domain[0],
-                end=domain[1],
-                feature_type="Globular Domain",
-                score=None
-            )
-            print_feature_row(feature, file)
-        for region in dis:
-            feature = Feature(
-                description="Probable unstructured peptide region",
-                name=seq,
-                index='-1',
-                start=region[0],
-                end=region[1],
-                feature_type="Protein Disorder",
-                score=None
-            )
-            print_feature_row(feature, file=file)
-    file.write('ENDGROUP\tGlobPlotWS\n')
-
-
-def print_feature_row(feature, file=None):
-    def is_not_none(val): return val is not None
-    print(str.join('\t', map(str, filter(is_not_none, feature))), file=file)
 
 
 if __name__ == '__main__':
@@ -127,5 +69,7 @@ if __name__ == '__main__':
     parser.add_argument('--input', '-i', required=True)
     parser.add_argument('--annot', '-a')
     parser.add_argument('--feat', '-f')
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help='number of processes for large inputs, 0 for all cores')
     args = parser.parse_args()
     run(args)
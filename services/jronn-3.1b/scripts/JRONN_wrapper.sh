@@ -2,12 +2,16 @@
 
 set -e
 jronn "$@"
+# the annotations are converted with as many processes as jronn's threads
+jobs=1
 for arg in "$@"; do
     if [[ ${arg} == -o=* ]]; then
         outputFile=${arg:3}
-        break
+    elif [[ ${arg} == -n=* ]]; then
+        jobs=${arg:3}
     fi
 done
 python $JALVIEW_PARSER_SCRIPT \
     --annot jronn.jvannot \
+    --jobs "$jobs" \
      "$outputFile"
@@ -1,19 +1,9 @@
 import argparse
-import enum
 import re
-import sys
-from collections import defaultdict, namedtuple
+from collections import defaultdict
 from operator import itemgetter
 
-
-class GraphType(enum.Enum):
-    BAR_GRAPH = 'BAR_GRAPH'
-    LINE_GRAPH = 'LINE_GRAPH'
-    NO_GRAPH = 'NO_GRAPH'
-
-
-Graph = namedtuple('graph', 'type, label, description, values')
-Graphline = namedtuple('graphline', 'value, label, colour')
+from jalview import AnnotationWriter, GraphType
 
 
 float_pat = r'[+-]?(?:[0-9]*\.)?[0-9]+'
@@ -93,62 +83,61 @@ def read_alifold(file):
     return contacts
 
 
-def print_annotations(data, file=sys.stdout):
-    file.write("JALVIEW_ANNOTATION\n\n")
-    print(
-        'NO_GRAPH', 'RNAalifold Consensus',
-        'Consensus alignment produced by RNAalifold',
-        '|'.join(data['alignment']), sep='\t', file=file
-    )
-    structure, scores = data['mfe']
-    print(
-        'NO_GRAPH', 'MFE structure', 
-        'Minimum free energy structure. Energy: %s = %s + %s' % scores,
-        structure_to_annotations(structure), sep='\t', file=file
-    )
-    if 'partition' in data and 'contacts' in data:
-        structure, scores = data['partition']
-        contacts = data['contacts']
-        graph = []
-        for i, char in enumerate(structure):
-            i = i + 1
-            if i in contacts:
-                # second value (probability) of zeroth item (highest) of i-th column
-                value = contacts[i][0][2] 
-                tooltip = ('%i->%i: %.1f%%' % it for it in contacts[i])
-                tooltip = str.join('; ', tooltip)
-            else:
-                value = 0.0
-                tooltip = 'No data'
-            graph.append(f'{value:.1f},{char},{tooltip}')
-        print(
-            'BAR_GRAPH', 'Contact Probabilities',
-            "Base Pair Contact Probabilities. " +
-            "Energy of Ensemble: %s, frequency: %s, diversity: %s." % scores,
-            "|".join(graph), sep='\t', file=file
+def print_annotations(data, file):
+    with AnnotationWriter(file) as writer:
+        writer.write_row(
+            GraphType.NO_GRAPH, 'RNAalifold Consensus',
+            'Consensus alignment produced by RNAalifold', '|'.join(data['alignment'])
         )
-    if 'centroid' in data:
-        structure, scores = data['centroid']
-        print(
-            'NO_GRAPH', 'Centroid Structure',
-            'Centroid Structure. Energy: %s = %s + %s, %s' % scores,
-            structure_to_annotations(structure), sep='\t', file=file
+        structure, scores = data['mfe']
+        writer.write_row(
+            GraphType.NO_GRAPH, 'MFE structure',
+            'Minimum free energy structure. Energy: %s = %s + %s' % scores,
+            structure_to_annotations(structure)
         )
-    if 'mea' in data:
-        structure, scores = data['mea']
-        print(
-            "NO_GRAPH", "MEA Structure",
-            "Maximum Expected Accuracy Values. %s = %s + %s, %s" % scores,
-            structure_to_annotations(structure), sep='\t', file=file
-        )
-    file.write('\n')
-    props = "scaletofit=true\tshowalllabs=true\tcentrelabs=false"
-    if 'mfe' in data:
-        print(f"ROWPROPERTIES\tMFE Structure\t{props}", file=file)
-    if 'centroid' in data:
-        print(f"ROWPROPERTIES\tCentroid Structure\t{props}", file=file)
-    if 'mea' in data:
-        print(f"ROWPROPERTIES\tMEA Structure\t{props}", file=file)
+        if 'partition' in data and 'contacts' in data:
+            structure, scores = data['partition']
+            contacts = data['contacts']
+            graph = []
+            for i, char in enumerate(structure):
+                i = i + 1
+                if i in contacts:
+                    # second value (probability) of zeroth item (highest) of i-th column
+                    value = contacts[i][0][2]
+                    tooltip = ('%i->%i: %.1f%%' % it for it in contacts[i])
+                    tooltip = str.join('; ', tooltip)
+                else:
+                    value = 0.0
+                    tooltip = 'No data'
+                graph.append(f'{value:.1f},{char},{tooltip}')
+            writer.write_row(
+                GraphType.BAR_GRAPH, 'Contact Probabilities',
+                "Base Pair Contact Probabilities. " +
+                "Energy of Ensemble: %s, frequency: %s, diversity: %s." % scores,
+                "|".join(graph)
+            )
+        if 'centroid' in data:
+            structure, scores = data['centroid']
+            writer.write_row(
+                GraphType.NO_GRAPH, 'Centroid Structure',
+                'Centroid Structure. Energy: %s = %s + %s, %s' % scores,
+                structure_to_annotations(structure)
+            )
+        if 'mea' in data:
+            structure, scores = data['mea']
+            writer.write_row(
+                GraphType.NO_GRAPH, "MEA Structure",
+                "Maximum Expected Accuracy Values. %s = %s + %s, %s" % scores,
+                structure_to_annotations(structure)
+            )
+        writer.blank_line()
+        props = dict(scaletofit=True, showalllabs=True, centrelabs=False)
+        if 'mfe' in data:
+            writer.row_properties('MFE Structure', **props)
+        if 'centroid' in data:
+            writer.row_properties('Centroid Structure', **props)
+        if 'mea' in data:
+            writer.row_properties('MEA Structure', **props)
 
 
 def structure_to_annotations(structure):
@@ -158,24 +147,6 @@ def structure_to_annotations(structure):
     return '|'.join(tokens)
 
 
-def print_annotation_row(graph, graphline=None, colour=None, file=None):
-    row = "{type}\t{label}\t{description}\t{values}".format(
-        type=graph.type.name,
-        label=graph.label,
-        description=graph.description,
-        values=str.join('|', map('{0},{0}'.format, graph.values))
-    )
-    print(row, file=file)
-    if graph.type == GraphType.LINE_GRAPH:
-        if graphline is not None:
-            print('GRAPHLINE\t{name}\t{value}\t{label}\t{colour}'.format(
-                name=graph.label, value=graphline.value, label=graphline.label,
-                colour=graphline.colour
-            ), file=file)
-        if colour is not None:
-            print('COLOUR\t{name}\t{colour}'.format(name=graph.label, colour=colour), file=file)
-
-
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--alifold')
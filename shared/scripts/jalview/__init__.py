@@ -0,0 +1,27 @@
+"""
+Streaming writers of Jalview annotation and feature files and parsers of
+the predictor outputs shared by the service scripts.
+
+Rows are written as soon as they are produced, so the memory used does not
+depend on the number of sequences, and the lines are passed to the file in
+batches.
+"""
+from .annotations import AnnotationWriter, Graph, Graphline, GraphType, format_values
+from .features import Feature, FeatureWriter
+from .parsers import SEQUENCE_HEADER, parse_ranges, read_score_lines
+from .sharding import Output, convert
+
+__all__ = [
+    "AnnotationWriter",
+    "Feature",
+    "FeatureWriter",
+    "Graph",
+    "GraphType",
+    "Graphline",
+    "Output",
+    "SEQUENCE_HEADER",
+    "convert",
+    "format_values",
+    "parse_ranges",
+    "read_score_lines",
+]
@@ -0,0 +1,32 @@
+import shutil
+
+
+class BatchedLines:
+    """
+    Collects lines and writes them to the file with a single call per batch.
+
+    :param file:
+        Text file open for writing.
+    :param int batch_size:
+        Number of lines written at once.
+    """
+
+    def __init__(self, file, batch_size=256):
+        self.file = file
+        self.batch_size = batch_size
+        self._lines = []
+
+    def append(self, line: str):
+        self._lines.append(line)
+        if len(self._lines) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self._lines:
+            self.file.writelines(self._lines)
+            self._lines.clear()
+
+    def append_file(self, file):
+        """Copy the contents of the file after the lines collected so far."""
+        self.flush()
+        shutil.copyfileobj(file, self.file)
@@ -0,0 +1,93 @@
+import enum
+from collections import namedtuple
+
+from ._batch import BatchedLines
+
+
+class GraphType(enum.Enum):
+    BAR_GRAPH = "BAR_GRAPH"
+    LINE_GRAPH = "LINE_GRAPH"
+    NO_GRAPH = "NO_GRAPH"
+
+
+Graph = namedtuple("graph", "type, label, description, values")
+Graphline = namedtuple("graphline", "value, label, colour")
+
+
+def format_values(values) -> str:
+    """
+    Format the scores as annotation values, each score used both as
+    the value and the label of its column.
+
+    :param values:
+        Scores as strings.
+    """
+    return "|".join(map(",".join, zip(values, values)))
+
+
+class AnnotationWriter:
+    """
+    Writes a ``JALVIEW_ANNOTATION`` file row by row.
+
+    :param file:
+        Text file open for writing.
+    :param int batch_size:
+        Number of lines passed to the file at once.
+    :param bool fragment:
+        Write a part of the file, without the header.
+    """
+
+    def __init__(self, file, batch_size=256, fragment=False):
+        self._lines = BatchedLines(file, batch_size)
+        if not fragment:
+            self._lines.append("JALVIEW_ANNOTATION\n\n")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def sequence_ref(self, name: str):
+        """Associate the following rows with the sequence."""
+        self._lines.append(f"SEQUENCE_REF\t{name}\n")
+
+    def write_row(self, graph_type: GraphType, label, description, values: str):
+        """Write the row with the values already formatted."""
+        self._lines.append(f"{graph_type.name}\t{label}\t{description}\t{values}\n")
+
+    def write_graph(self, graph: Graph, graphline: Graphline = None, colour=None):
+        """
+        Write the row of the graph. Graph lines and colours apply to
+        line graphs only.
+        """
+        self.write_row(graph.type, graph.label, graph.description, format_values(graph.values))
+        if graph.type == GraphType.LINE_GRAPH:
+            if graphline is not None:
+                self._lines.append(
+                    f"GRAPHLINE\t{graph.label}\t{graphline.value}\t"
+                    f"{graphline.label}\t{graphline.colour}\n"
+                )
+            if colour is not None:
+                self._lines.append(f"COLOUR\t{graph.label}\t{colour}\n")
+
+    def row_properties(self, label, **properties):
+        """Write the display properties of the row, e.g. ``scaletofit=True``."""
+        values = "\t".join(
+            f"{key}={str(value).lower() if isinstance(value, bool) else value}"
+            for key, value in properties.items()
+        )
+        self._lines.append(f"ROWPROPERTIES\t{label}\t{values}\n")
+
+    def blank_line(self):
+        self._lines.append("\n")
+
+    def append(self, fragment):
+        """Copy the rows of the fragment file to the end of the file."""
+        self._lines.append_file(fragment)
+
+    def flush(self):
+        self._lines.flush()
+
+    def close(self):
+        self._lines.flush()
@@ -0,0 +1,63 @@
+from collections import namedtuple
+
+from ._batch import BatchedLines
+
+Feature = namedtuple("feature", "description, name, index, start, end, feature_type, score")
+
+
+class FeatureWriter:
+    """
+    Writes a Jalview features file feature by feature. The colours are
+    written on creation and the features are enclosed in the group until
+    the writer is closed.
+
+    :param file:
+        Text file open for writing.
+    :param dict colours:
+        Colours of the feature types.
+    :param str group:
+        Name of the feature group.
+    :param int batch_size:
+        Number of lines passed to the file at once.
+    :param bool fragment:
+        Write a part of the file, only the features.
+    """
+
+    def __init__(self, file, colours: dict, group=None, batch_size=256, fragment=False):
+        self._lines = BatchedLines(file, batch_size)
+        self.group = None if fragment else group
+        if fragment:
+            return
+        for feature_type, colour in colours.items():
+            self._lines.append(f"{feature_type}\t{colour}\n")
+        self._lines.append("\n")
+        if group is not None:
+            self._lines.append(f"STARTGROUP\t{group}\n")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def write_feature(self, feature: Feature):
+        """Write the feature, leaving out the fields which are None."""
+        self._lines.append("\t".join(str(value) for value in feature if value is not None) + "\n")
+
+    def write_ranges(self, name, ranges, feature_type, description):
+        """Write a feature of the type for each (start, end) range of the sequence."""
+        for start, end in ranges:
+            self._lines.append(f"{description}\t{name}\t-1\t{start}\t{end}\t{feature_type}\n")
+
+    def blank_line(self):
+        self._lines.append("\n")
+
+    def append(self, fragment):
+        """Copy the features of the fragment file to the end of the file."""
+        self._lines.append_file(fragment)
+
+    def close(self):
+        """End the group and flush the remaining lines."""
+        if self.group is not None:
+            self._lines.append(f"ENDGROUP\t{self.group}\n")
+        self._lines.flush()
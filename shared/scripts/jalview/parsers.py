@@ -0,0 +1,27 @@
+import re
+
+SEQUENCE_HEADER = re.compile(r"^>\s?(.*\S)\s*$")
+RANGE = re.compile(r"(\d+)-(\d+)")
+SCORE_LINE = re.compile(r"^#(\w+) ((?:-?\d+\.\d+ ?)+)$")
+
+
+def parse_ranges(text: str) -> list[tuple[str, str]]:
+    """Parse comma separated ranges, e.g. ``1-10, 25-40``, into (start, end) pairs."""
+    return RANGE.findall(text)
+
+
+def read_score_lines(file):
+    """
+    Read the lines of scores, e.g. ``#name 0.25 0.50``, as (name, scores)
+    pairs one at a time, skipping empty lines.
+
+    :raise ValueError:
+        If a line is not a line of scores.
+    """
+    for line in file:
+        if line == "\n":
+            continue
+        match = SCORE_LINE.match(line)
+        if match is None:
+            raise ValueError(f"Unrecognised line \"{line.rstrip()}\"")
+        yield match.group(1), match.group(2).split()
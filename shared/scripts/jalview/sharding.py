@@ -0,0 +1,150 @@
+import concurrent.futures
+import io
+import os
+import shutil
+import tempfile
+from collections import namedtuple
+
+# inputs smaller than this are converted in a single process
+MIN_SHARDED_SIZE = 4 * 1024 * 1024
+# chunks per process, so that processes finishing early take more work
+CHUNKS_PER_JOB = 4
+# bounds the memory a process uses for its chunk of the input
+MAX_CHUNK_SIZE = 16 * 1024 * 1024
+
+Output = namedtuple("Output", "path, make_writer, write")
+
+
+def available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def split_records(path, parts: int, record_start: bytes) -> list[tuple[int, int]]:
+    """
+    Split the file into at most ``parts`` byte ranges of similar size
+    which begin at the lines starting with ``record_start``.
+    """
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, "rb") as fp:
+        for i in range(1, parts):
+            offset = size * i // parts
+            if offset <= bounds[-1]:
+                continue
+            fp.seek(offset - 1)
+            # skip to the start of the next line
+            fp.readline()
+            position = fp.tell()
+            line = fp.readline()
+            while line and not line.startswith(record_start):
+                position = fp.tell()
+                line = fp.readline()
+            if not line:
+                break
+            if position > bounds[-1]:
+                bounds.append(position)
+    bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+
+def _convert(src, read_records, writers):
+    for record in read_records(src):
+        for writer, write in writers:
+            write(writer, record)
+
+
+def _convert_chunk(input_path, start, end, read_records, outputs, fragment_paths):
+    with open(input_path, "rb") as fp:
+        fp.seek(start)
+        src = io.TextIOWrapper(io.BytesIO(fp.read(end - start)))
+    files = [open(path, "w") for path in fragment_paths]
+    try:
+        writers = [
+            (output.make_writer(file, fragment=True), output.write)
+            for output, file in zip(outputs, files)
+        ]
+        _convert(src, read_records, writers)
+        for writer, _ in writers:
+            writer.close()
+    finally:
+        for file in files:
+            file.close()
+
+
+def convert(input_path, read_records, outputs: list, jobs=1, record_start=b">",
+            min_size=MIN_SHARDED_SIZE):
+    """
+    Convert the records read from the input file to the output files.
+
+    With more than one job, inputs of at least ``min_size`` bytes are split
+    at record boundaries into chunks converted in a pool of processes.
+    The fragments of the outputs are joined in the order of the input.
+
+    :param input_path:
+        File of the predictor output.
+    :param read_records:
+        Generator function reading the records from a text file.
+    :param outputs:
+        Output files to write, each with the callable creating its writer,
+        called with the file and ``fragment=True`` for the parts of the
+        file converted by the workers, and the callable writing a record
+        with the writer.
+    :param int jobs:
+        Number of processes, all available cores if 0.
+    :param bytes record_start:
+        Prefix of the first line of a record.
+    :param int min_size:
+        Size of the smallest input processed in parallel.
+    """
+    if not outputs:
+        return
+    jobs = jobs or available_cores()
+    size = os.path.getsize(input_path)
+    chunks = []
+    if jobs > 1 and size >= min_size:
+        parts = max(jobs * CHUNKS_PER_JOB, -(-size // MAX_CHUNK_SIZE))
+        chunks = split_records(input_path, parts, record_start)
+    files = [open(output.path, "w") for output in outputs]
+    try:
+        writers = [
+            (output.make_writer(file), output.write) for output, file in zip(outputs, files)
+        ]
+        if len(chunks) > 1:
+            _convert_sharded(input_path, read_records, outputs, writers, chunks, jobs)
+        else:
+            with open(input_path) as src:
+                _convert(src, read_records, writers)
+        for writer, _ in writers:
+            writer.close()
+    finally:
+        for file in files:
+            file.close()
+
+
+def _convert_sharded(input_path, read_records, outputs, writers, chunks, jobs):
+    fragments_dir = tempfile.mkdtemp(
+        prefix=".fragments-", dir=os.path.dirname(os.path.abspath(outputs[0].path))
+    )
+    try:
+        with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+            futures = []
+            for index, (start, end) in enumerate(chunks):
+                fragment_paths = [
+                    os.path.join(fragments_dir, f"{index}.{position}")
+                    for position in range(len(outputs))
+                ]
+                future = executor.submit(
+                    _convert_chunk, input_path, start, end, read_records, outputs, fragment_paths
+                )
+                futures.append((future, fragment_paths))
+            for future, fragment_paths in futures:
+                future.result()
+                for (writer, _), path in zip(writers, fragment_paths):
+                    with open(path) as fragment:
+                        writer.append(fragment)
+                    os.remove(path)
+    finally:
+        shutil.rmtree(fragments_dir, ignore_errors=True)
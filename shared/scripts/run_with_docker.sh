@@ -1,46 +1,255 @@
 #! /bin/bash
 
+# Runs the job in a docker container with the job directory mounted.
+#
+#   run_with_docker.sh [--mount|--volume|--env ARG]... IMAGE ENTRYPOINT [ARG]...
+#   run_with_docker.sh --plan PLAN_FILE ENTRYPOINT [ARG]...
+#   run_with_docker.sh --evict-idle
+#
+# The first form mounts every symlink in the job directory separately and
+# forwards the whole environment. With a plan file written by the installer,
+# holding the image, the data mounts and the names (or patterns) of the
+# forwarded variables, the job directory is mounted at the same path, the
+# directories of the symlink targets are collapsed into the fewest bind
+# mounts and only the allowed variables are passed through an env file.
+#
+# With SLIVKA_DOCKER_POOL=N the job runs with 'docker exec' in one of up
+# to N long-lived containers kept per image ID and data mounts, which mount
+# the shared work root SLIVKA_DOCKER_POOL_ROOT (SLIVKA_HOME by default) at
+# the same path. Containers idle for SLIVKA_DOCKER_POOL_IDLE seconds are
+# removed when the next pooled job starts; the --evict-idle form removes
+# them and exits, to be run periodically once the jobs stop. Jobs fall back
+# to a one-shot 'docker run' if no container is free or healthy or the job
+# files are outside the work root.
+
 set -eu
 guest_workdir="/root"
 
+pool_size=${SLIVKA_DOCKER_POOL:-0}
+pool_root=${SLIVKA_DOCKER_POOL_ROOT:-${SLIVKA_HOME:-}}
+pool_idle=${SLIVKA_DOCKER_POOL_IDLE:-600}
+pool_dir=${SLIVKA_DOCKER_POOL_DIR:-${TMPDIR:-/tmp}/slivka-docker-pool}
+
+evict_idle_containers() {
+    local used_file container
+    [[ -d $pool_dir ]] || return 0
+    for used_file in $(find "$pool_dir" -name '*.used' ! -newermt "@$(( $(date +%s) - pool_idle ))")
+    do
+        container=$(basename "$used_file" .used)
+        # containers running a job hold their lock
+        (
+            flock -n 9 || exit 0
+            docker rm --force "$container" >/dev/null 2>&1 || true
+            rm -f "$used_file"
+        ) 9>"$pool_dir/$container.lock"
+    done
+}
+
+if [[ ${1:-} == --evict-idle ]]; then
+    evict_idle_containers
+    exit 0
+fi
+
+plan_file=
+if [[ ${1:-} == --plan ]]; then
+    plan_file=$2
+    shift 2
+fi
+
+# symlinks of the job directory and their targets
+link_files=()
+link_targets=()
+data_mount_args=()
 docker_env_args=()
-for env_var in $(env | grep -vw '^PATH')
-do
-    docker_env_args+=(--env "$env_var")
-done
-
-docker_mount_args=()
-for link_file in $(find * -type l)
-do
-    link_target="$(readlink -f $link_file)"
-    docker_mount_args+=(--mount "type=bind,src=$link_target,dst=$guest_workdir/$link_file,ro")
-done
-
-while [[ $# -gt 0 ]]; do
-case $1 in
-    --mount|--volume)
-        docker_mount_args+=("$1" "$2")
-        shift 2;;
-    --env)
-        docker_env_args+=("$1" "$2")
-        shift 2;;
-    *)
-        break;;
-esac
-done
-
-image=$1
-shift
+if [[ -n $plan_file ]]; then
+    image=
+    env_names=()
+    # shellcheck source=/dev/null
+    source "$plan_file"
+    data_mount_args=(${mount_args[@]+"${mount_args[@]}"})
+    while IFS=$'\t' read -r link_file link_target
+    do
+        [[ $link_target == /* ]] || link_target="$PWD/$link_target"
+        link_files+=("$link_file")
+        link_targets+=("$link_target")
+    done < <(find . -type l -printf '%P\t%l\n')
+else
+    for env_var in $(env | grep -vw '^PATH')
+    do
+        docker_env_args+=(--env "$env_var")
+    done
+    for link_file in $(find * -type l)
+    do
+        link_files+=("$link_file")
+        link_targets+=("$(readlink -f $link_file)")
+    done
+    while [[ $# -gt 0 ]]; do
+    case $1 in
+        --mount|--volume)
+            data_mount_args+=("$1" "$2")
+            shift 2;;
+        --env)
+            docker_env_args+=("$1" "$2")
+            shift 2;;
+        *)
+            break;;
+    esac
+    done
+    image=$1
+    shift
+fi
+
 # The first argument is typically the binary to be run inside the container
 entrypoint=$1
 shift
 
+is_under() {
+    local path=$1 root
+    shift
+    for root in "$@"
+    do
+        [[ $path == "$root" || $path == "$root"/* ]] && return 0
+    done
+    return 1
+}
+
+# Write the allowed variables to the env file, skipping multi-line values
+# which the env file format does not support.
+write_env_file() {
+    local name pattern
+    : > .docker.env
+    for name in $(compgen -e)
+    do
+        for pattern in ${env_names[@]+"${env_names[@]}"}
+        do
+            # shellcheck disable=SC2053
+            if [[ $name == $pattern && ${!name} != *$'\n'* ]]; then
+                printf '%s=%s\n' "$name" "${!name}" >> .docker.env
+                break
+            fi
+        done
+    done
+    docker_env_args=(--env-file .docker.env)
+}
+
+# Bind the fewest directories containing all symlink targets outside
+# the job directory at their own paths, so the links resolve unchanged.
+plan_link_mounts() {
+    local dir kept=()
+    while IFS= read -r dir
+    do
+        [[ -n $dir ]] || continue
+        is_under "$dir" "$PWD" ${kept[@]+"${kept[@]}"} || kept+=("$dir")
+    done < <(
+        for target in ${link_targets[@]+"${link_targets[@]}"}
+        do
+            printf '%s\n' "${target%/*}"
+        done | sort -u
+    )
+    docker_mount_args=()
+    for dir in ${kept[@]+"${kept[@]}"}
+    do
+        docker_mount_args+=(--mount "type=bind,src=$dir,dst=$dir,ro")
+    done
+}
+
+# Acquire a free healthy container of the pool, starting it if needed.
+# Sets the container variable and keeps the slot locked on the fd 9.
+acquire_pool_container() {
+    (( pool_size > 0 )) && [[ -n $pool_root ]] || return 1
+    pool_root=$(readlink -f "$pool_root")
+    is_under "$(readlink -f "$PWD")" "$pool_root" || return 1
+    local target
+    for target in ${link_targets[@]+"${link_targets[@]}"}
+    do
+        is_under "$target" "$pool_root" || return 1
+    done
+    mkdir -p "$pool_dir"
+    evict_idle_containers
+    local image_id key slot
+    # an image rebuilt or pulled under the same reference gets new containers
+    image_id=$(docker image inspect --format '{{.Id}}' "$image" 2>/dev/null) || return 1
+    key=$(printf '%s\0' "$image_id" "$pool_root" ${data_mount_args[@]+"${data_mount_args[@]}"} | sha1sum | cut -c1-12)
+    for (( slot = 0; slot < pool_size; slot++ ))
+    do
+        container="slivka-pool-$key-$slot"
+        exec 9>"$pool_dir/$container.lock"
+        if ! flock -n 9; then
+            exec 9>&-
+            continue
+        fi
+        touch "$pool_dir/$container.used"
+        if [[ $(docker inspect --format '{{.State.Running}}' "$container" 2>/dev/null) == true ]]; then
+            return 0
+        fi
+        docker rm --force "$container" >/dev/null 2>&1 || true
+        if docker run --detach --name "$container" \
+            --label slivka.pool="$key" \
+            --mount "type=bind,src=$pool_root,dst=$pool_root" \
+            ${data_mount_args[@]+"${data_mount_args[@]}"} \
+            --entrypoint sleep \
+            -- "$image_id" infinity >/dev/null &&
+            [[ $(docker inspect --format '{{.State.Running}}' "$container") == true ]]
+        then
+            return 0
+        fi
+        docker rm --force "$container" >/dev/null 2>&1 || true
+        exec 9>&-
+        return 1
+    done
+    return 1
+}
+
+if [[ -n $plan_file ]]; then
+    write_env_file
+fi
+
+if acquire_pool_container; then
+    job_pid_file=".docker.pid"
+    rm -f "$job_pid_file"
+    # killing the docker client does not stop the job in the container
+    stop_job() {
+        trap - TERM INT
+        if [[ -s $job_pid_file ]]; then
+            docker exec "$container" kill -TERM "$(cat "$job_pid_file")" || true
+        fi
+        wait "$job" || true
+        exit 143
+    }
+    trap stop_job TERM INT
+    exec {BASH_XTRACEFD}>.docker.command
+    set -o xtrace
+    docker exec \
+        ${docker_env_args[@]+"${docker_env_args[@]}"} \
+        --workdir "$PWD" \
+        "$container" \
+        sh -c 'echo $$ > .docker.pid && exec "$@"' sh "$entrypoint" "$@" &
+    job=$!
+    set +o xtrace
+    status=0
+    wait "$job" || status=$?
+    touch "$pool_dir/$container.used"
+    exit $status
+fi
+
+if [[ -n $plan_file ]]; then
+    plan_link_mounts
+    guest_workdir=$PWD
+else
+    docker_mount_args=()
+    for i in ${link_files[@]+"${!link_files[@]}"}
+    do
+        docker_mount_args+=(--mount "type=bind,src=${link_targets[$i]},dst=$guest_workdir/${link_files[$i]},ro")
+    done
+fi
+
 exec {BASH_XTRACEFD}>.docker.command
 set -o xtrace
 exec docker run --rm \
     --mount "type=bind,src=$PWD,dst=$guest_workdir" \
-    "${docker_mount_args[@]}" \
-    "${docker_env_args[@]}" \
+    ${data_mount_args[@]+"${data_mount_args[@]}"} \
+    ${docker_mount_args[@]+"${docker_mount_args[@]}"} \
+    ${docker_env_args[@]+"${docker_env_args[@]}"} \
     --workdir "$guest_workdir" \
     --entrypoint "$entrypoint" \
     -- "$image" "$@"
@@ -0,0 +1,52 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+MATRIX_SCRIPT = Path(__file__).parent / "benchmarks" / "aligner_matrix.py"
+
+
+def make_aligner(project: Path, base_name: str, command: str, thread_arg=None):
+    testdata = project / "data" / base_name / "testdata"
+    testdata.mkdir(parents=True)
+    (testdata / "input.fa").write_text(">a\nAC-DEFGH\n>b\nACDKLM\n")
+    args = "  input:\n    arg: $(value)\n    symlink: input.fa\n"
+    if thread_arg:
+        args += f"  threads:\n    arg: {thread_arg} $(value)\n"
+    (project / "services" / f"{base_name}.service.yaml").write_text(
+        f"command: [sh, -c, '{command}', aligner]\n"
+        f"parameters:\n  input:\n    type: file\n"
+        f"args:\n{args}"
+        f"tests:\n- parameters: {{input: {testdata / 'input.fa'}}}\n  timeout: 10\n"
+    )
+
+
+def test_aligner_matrix(tmp_path):
+    project = tmp_path / "project"
+    (project / "services").mkdir(parents=True)
+    make_aligner(project, "mafft-7.475", 'test "$(grep -c ">" "$1")" -gt 0')
+    make_aligner(project, "muscle-5.1", 'test "$2" = -threads', thread_arg="-threads")
+    make_aligner(project, "jronn-3.1b", "exit 1")
+    report_file = tmp_path / "report.json"
+    proc = subprocess.run(
+        [
+            sys.executable, MATRIX_SCRIPT,
+            "--counts", "3,30", "--lengths", "20", "--threads", "1,2",
+            "--json", report_file, project,
+        ],
+        capture_output=True,
+        text=True,
+    )
+    assert proc.returncode == 0, proc.stdout + proc.stderr
+    assert "without a thread argument run with the tool's default threads only: mafft-7.475." in proc.stderr
+    rows = json.loads(report_file.read_text())
+    assert [(row["service"], row["sequences"], row["threads"]) for row in rows] == [
+        ("mafft-7.475", 3, None),
+        ("mafft-7.475", 30, None),
+        ("muscle-5.1", 3, 1),
+        ("muscle-5.1", 3, 2),
+        ("muscle-5.1", 30, 1),
+        ("muscle-5.1", 30, 2),
+    ]
+    assert all(row["status"] == "passed" for row in rows)
+    assert all(row["max-rss"] > 0 for row in rows)
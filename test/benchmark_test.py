@@ -0,0 +1,156 @@
+import itertools
+import shutil
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from install import (
+    ServiceCatalogue,
+    ServiceTemplate,
+    TemplateContext,
+    copy_data_dirs,
+    find_data_dirs,
+    interpolate_dict,
+)
+
+# Run with --benchmark-autosave to store a baseline in .benchmarks and with
+# --benchmark-compare --benchmark-compare-fail=mean:20% to fail on regressions.
+# Plain test runs skip the benchmarks (see conftest.py). No baseline is
+# committed: the baselines are specific to the machine and the file copying
+# benchmarks vary by more than the threshold between runs on shared hosts.
+
+
+def make_data_tree(root: Path, dirs: int, files_per_dir: int, file_size=256):
+    """Create a tree of data directories with nested subdirectories."""
+    content = b"x" * file_size
+    for i in range(dirs):
+        data_dir = root / f"data{i:04d}" / "sub" / f"set{i % 10}"
+        data_dir.mkdir(parents=True)
+        for j in range(files_per_dir):
+            (data_dir / f"file{j:04d}.dat").write_bytes(content)
+        (root / f"data{i:04d}" / "tmp").mkdir()
+    return root
+
+
+@pytest.fixture(scope="module", params=[(20, 50), (100, 50)], ids=["1k-files", "5k-files"])
+def data_tree(request, tmp_path_factory):
+    dirs, files_per_dir = request.param
+    return make_data_tree(tmp_path_factory.mktemp("src"), dirs, files_per_dir)
+
+
+@pytest.fixture(scope="module")
+def wide_tree(tmp_path_factory):
+    return make_data_tree(tmp_path_factory.mktemp("wide"), 2000, 0)
+
+
+def test_find_data_dirs_deep_rules(benchmark, wide_tree):
+    patterns = [
+        {"include": "data*"},
+        {"include": "data*/sub/set*"},
+        {"exclude": "data*/tmp"},
+        {"exclude": "data1*/sub/set[0-4]"},
+        {"include": "data0*/*"},
+    ]
+    result = benchmark(lambda: find_data_dirs(wide_tree, list(patterns)))
+    assert len(result) > 2000
+
+
+@pytest.mark.parametrize("mode", ["copy", "hardlink"])
+def test_copy_data_dirs(benchmark, tmp_path, data_tree, mode):
+    counter = itertools.count()
+
+    def setup():
+        dst = tmp_path / f"dst{next(counter)}"
+        return ([(data_tree, dst)],), {"overwrite": True, "mode": mode}
+
+    benchmark.pedantic(copy_data_dirs, setup=setup, rounds=5)
+
+
+def test_copy_data_dirs_unchanged(benchmark, tmp_path, data_tree):
+    dst = tmp_path / "dst"
+    copy_data_dirs([(data_tree, dst)], overwrite=True, mode="copy")
+    benchmark(copy_data_dirs, [(data_tree, dst)], overwrite=True, mode="copy")
+    shutil.rmtree(dst)
+
+
+@pytest.fixture(params=[100, 1000], ids=lambda n: f"{n}-placeholders")
+def service_template(request, tmp_path):
+    count = request.param
+    lines = ["name: Benchmark", "version: '1.0'", "command:", "- tool", "args:"]
+    for i in range(count):
+        lines.append(f"  arg{i}:")
+        lines.append(f'    arg: "--in={{{{ local-path:dir{i % 50} }}}}/file{i} --tool={{{{ which:tool{i % 20} }}}}"')
+        lines.append(f'    default: "{{{{ var:var{i % 100} }}}}"')
+    template_file = tmp_path / "benchmark.service.yaml"
+    template_file.write_text("\n".join(lines) + "\n")
+    return template_file
+
+
+def _template_values():
+    values = {f"local-path:dir{i}": f"/srv/slivka/data/dir{i}" for i in range(50)}
+    values.update({f"which:tool{i}": f"/usr/bin/tool{i}" for i in range(20)})
+    variables = {f"var{i}": f"{{{{ local-path:dir{i % 50} }}}}/var{i}" for i in range(100)}
+    return values, variables
+
+
+def test_service_template_load(benchmark, service_template):
+    benchmark(ServiceTemplate, service_template)
+
+
+def test_service_template_render(benchmark, service_template):
+    values, variables = _template_values()
+
+    def setup():
+        return (TemplateContext(values, variables=variables),), {}
+
+    template = ServiceTemplate(service_template)
+    slots = template.slots
+
+    def render(context):
+        template.slots = list(slots)
+        return template.render(context)
+
+    benchmark.pedantic(render, setup=setup, rounds=20)
+
+
+@pytest.mark.parametrize("count", [100, 1000, 5000], ids=lambda n: f"{n}-vars")
+def test_template_context_chained_vars(benchmark, count):
+    # each variable refers to the previous one
+    variables = {"var0": "{{ local-path:root }}"}
+    variables.update({f"var{i}": f"{{{{ var:var{i - 1} }}}}/x" for i in range(1, count)})
+
+    def resolve():
+        context = TemplateContext({"local-path:root": "/srv"}, variables=variables)
+        return context[f"var:var{count - 1}"]
+
+    assert benchmark(resolve).startswith("/srv/x")
+
+
+@pytest.mark.parametrize("count", [100, 1000], ids=lambda n: f"{n}-vars")
+def test_interpolate_dict_large_vars(benchmark, count):
+    values, _ = _template_values()
+    data = {
+        f"var{i}": {
+            "path": f"{{{{ local-path:dir{i % 50} }}}}/file{i}",
+            "tools": [f"{{{{ which:tool{j} }}}}" for j in range(i % 20)],
+        }
+        for i in range(count)
+    }
+    benchmark(interpolate_dict, data, values)
+
+
+def test_service_catalogue_warm(benchmark, tmp_path):
+    root = tmp_path / "services"
+    for i in range(200):
+        service_dir = root / f"service{i}-1.0"
+        (service_dir / "testdata").mkdir(parents=True)
+        (service_dir / f"service{i}-1.0.service.yaml").write_text(
+            f"name: Service{i}\nversion: '1.0'\n"
+        )
+        (service_dir / f"service{i}-1.0.conda.yaml").write_text("files:\n- include: testdata\n")
+    cache_file = tmp_path / "catalogue.json"
+    ServiceCatalogue(root, cache_file)
+    catalogue = benchmark(ServiceCatalogue, root, cache_file)
+    assert len(catalogue.select()) == 200
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Benchmark matrix of the multiple sequence aligners installed in a project.
+
+Every aligner runs the command line generated in the project's service
+file over synthetic FASTA sets of growing sequence count and length,
+derived from the sequences of its test data. Wall time, CPU time and peak
+memory are recorded for each run, for each thread count of the aligners
+whose services have a thread argument, and reported as a table, CSV
+or JSON and optional plots.
+"""
+import csv
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+from pathlib import Path
+
+import click
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+
+from install import (  # noqa: E402
+    available_cores,
+    build_test_command,
+    format_size,
+    read_installed_service,
+    run_service_test,
+)
+
+ALIGNERS = ("clustalo", "clustalw", "mafft", "muscle", "probcons", "msaprobs", "tcoffee")
+AMINO_ACIDS = "ACDEFGHIKLMNPQRSTVWY"
+
+
+def read_fasta(path: Path) -> list[tuple[str, str]]:
+    """Read the sequences from the FASTA file, removing alignment gaps."""
+    records = []
+    with open(path) as fp:
+        for line in fp:
+            line = line.strip()
+            if line.startswith(">"):
+                records.append((line[1:].split()[0], []))
+            elif line and records:
+                records[-1][1].append(line.replace("-", "").replace(".", ""))
+    return [(name, "".join(chunks)) for name, chunks in records]
+
+
+def make_sequence_set(
+    seeds: list[tuple[str, str]], count: int, length: int, rng: random.Random
+) -> list[tuple[str, str]]:
+    """
+    Generate sequences related to the seed sequences. Each sequence is
+    a seed repeated to the length with 15% substitutions and 2% indels.
+    """
+    sequences = []
+    for i in range(count):
+        _, seed = seeds[i % len(seeds)]
+        residues = list((seed * (length // len(seed) + 1))[:length])
+        for position in range(len(residues)):
+            roll = rng.random()
+            if roll < 0.15:
+                residues[position] = rng.choice(AMINO_ACIDS)
+            elif roll < 0.16:
+                residues[position] = ""
+            elif roll < 0.17:
+                residues[position] += rng.choice(AMINO_ACIDS)
+        sequences.append((f"seq{i:05d}", "".join(residues)))
+    return sequences
+
+
+def write_fasta(path: Path, sequences: list[tuple[str, str]]):
+    with open(path, "w") as fp:
+        for name, sequence in sequences:
+            fp.write(f">{name}\n")
+            for start in range(0, len(sequence), 60):
+                fp.write(sequence[start:start + 60] + "\n")
+
+
+def find_aligners(project_path: Path, prefixes=ALIGNERS) -> dict[str, dict]:
+    """Return the installed service configurations of the aligners."""
+    services = {}
+    for service_file in sorted((project_path / "services").glob("*.service.yaml")):
+        base_name = service_file.name[: -len(".service.yaml")]
+        if base_name.startswith(tuple(prefixes)):
+            services[base_name] = read_installed_service(service_file)
+    return services
+
+
+def input_parameter(service: dict) -> str:
+    """Return the name of the sequence file parameter of the service tests."""
+    parameters = service.get("parameters") or {}
+    for test in service.get("tests") or []:
+        for key in test.get("parameters") or {}:
+            if (parameters.get(key) or {}).get("type") == "file":
+                return key
+    raise ValueError("no test with a file parameter")
+
+
+def thread_parameter(service: dict):
+    """Return the name of the argument setting the number of threads, if any."""
+    for key, argument in (service.get("args") or {}).items():
+        if "thread" in key.lower() and "$(value)" in str(argument.get("arg")):
+            return key
+    return None
+
+
+def run_matrix(
+    project_path: Path,
+    work_root: Path,
+    services: dict[str, dict],
+    counts=(10, 50, 200),
+    lengths=(100, 400),
+    threads=(1,),
+    repeat=1,
+    timeout=600,
+    seed=0,
+):
+    """
+    Run every aligner over every sequence set and thread count.
+
+    :return:
+        List of result rows.
+    """
+    rows = []
+    base_env = {**os.environ, "SLIVKA_HOME": str(project_path.absolute())}
+    for base_name, service in services.items():
+        key = input_parameter(service)
+        test = next(t for t in service["tests"] if key in (t.get("parameters") or {}))
+        seeds = read_fasta(Path(test["parameters"][key]))
+        threads_key = thread_parameter(service)
+        for count in counts:
+            for length in lengths:
+                input_file = work_root / f"{base_name}-{count}x{length}.fa"
+                write_fasta(
+                    input_file, make_sequence_set(seeds, count, length, random.Random(seed))
+                )
+                for thread_count in threads if threads_key else (None,):
+                    inputs = {**test["parameters"], key: str(input_file)}
+                    if threads_key is not None:
+                        inputs[threads_key] = thread_count
+                    results = []
+                    for _ in range(repeat):
+                        work_dir = work_root / "job"
+                        shutil.rmtree(work_dir, ignore_errors=True)
+                        work_dir.mkdir()
+                        args, env = build_test_command(service, inputs, work_dir, base_env)
+                        results.append(run_service_test(args, env, work_dir, timeout))
+                        if results[-1]["status"] != "passed":
+                            break
+                    row = {
+                        "service": base_name,
+                        "sequences": count,
+                        "length": length,
+                        "threads": thread_count,
+                        "status": results[-1]["status"],
+                    }
+                    if "wall-time" in results[-1]:
+                        row.update({
+                            "wall-time": statistics.median(r["wall-time"] for r in results),
+                            "cpu-time": statistics.median(r["cpu-time"] for r in results),
+                            "max-rss": max(r["max-rss"] for r in results),
+                        })
+                    click.echo(format_row(row), err=True)
+                    rows.append(row)
+    return rows
+
+
+def format_row(row: dict) -> str:
+    threads = "-" if row["threads"] is None else row["threads"]
+    text = (
+        f"{row['service']:<22} {row['sequences']:>6} {row['length']:>6} "
+        f"{threads:>7} {row['status']:<8}"
+    )
+    if "wall-time" in row:
+        text += (
+            f" {row['wall-time']:>9.2f} {row['cpu-time']:>9.2f} "
+            f"{format_size(row['max-rss'] * 1024):>9}"
+        )
+    return text
+
+
+def print_table(rows: list[dict]):
+    click.echo(
+        f"{'service':<22} {'seqs':>6} {'length':>6} {'threads':>7} {'status':<8} "
+        f"{'wall s':>9} {'cpu s':>9} {'max rss':>9}"
+    )
+    for row in sorted(rows, key=lambda r: (r["sequences"], r["length"], r["service"])):
+        click.echo(format_row(row))
+
+
+def write_csv(path: Path, rows: list[dict]):
+    fields = ["service", "sequences", "length", "threads", "status", "wall-time", "cpu-time", "max-rss"]
+    with open(path, "w", newline="") as fp:
+        writer = csv.DictWriter(fp, fields)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def plot(path: Path, rows: list[dict]):
+    """Plot wall time and peak memory against sequence count per length."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    lengths = sorted({row["length"] for row in rows})
+    fig, axes = plt.subplots(2, len(lengths), figsize=(5 * len(lengths), 8), squeeze=False)
+    passed = [row for row in rows if row["status"] == "passed"]
+    for column, length in enumerate(lengths):
+        series = {}
+        for row in passed:
+            if row["length"] == length:
+                label = row["service"] if row["threads"] is None else f"{row['service']} x{row['threads']}"
+                series.setdefault(label, []).append(row)
+        for label, points in sorted(series.items()):
+            points.sort(key=lambda r: r["sequences"])
+            counts = [r["sequences"] for r in points]
+            axes[0][column].plot(counts, [r["wall-time"] for r in points], marker="o", label=label)
+            axes[1][column].plot(counts, [r["max-rss"] / 1024 for r in points], marker="o", label=label)
+        axes[0][column].set_title(f"length {length}")
+        axes[0][column].set_ylabel("wall time [s]")
+        axes[1][column].set_ylabel("peak RSS [MB]")
+        for axis in (axes[0][column], axes[1][column]):
+            axis.set_xlabel("sequences")
+            axis.set_xscale("log")
+            axis.set_yscale("log")
+    axes[0][-1].legend(fontsize="small")
+    fig.tight_layout()
+    fig.savefig(path)
+
+
+def _int_list(ctx, param, value):
+    try:
+        return [int(item) for item in value.split(",")]
+    except ValueError:
+        raise click.BadParameter("expected comma separated integers")
+
+
+@click.command()
+@click.option("--service", "-s", "prefixes", multiple=True, help="Aligner service name prefix.")
+@click.option("--counts", default="10,50,200", show_default=True, callback=_int_list,
+              help="Numbers of sequences.")
+@click.option("--lengths", default="100,400", show_default=True, callback=_int_list,
+              help="Sequence lengths.")
+@click.option("--threads", default=None, callback=lambda ctx, param, value: _int_list(
+    ctx, param, value or f"1,{available_cores()}"), show_default="1,available cores",
+              help="Thread counts of the aligners with a thread argument.")
+@click.option("--repeat", type=click.IntRange(min=1), default=1, show_default=True)
+@click.option("--timeout", type=float, default=600, show_default=True, help="Timeout of a run.")
+@click.option("--seed", type=int, default=0, show_default=True)
+@click.option("--csv", "csv_file", type=click.Path(dir_okay=False, path_type=Path))
+@click.option("--json", "json_file", type=click.Path(dir_okay=False, path_type=Path))
+@click.option("--plot", "plot_file", type=click.Path(dir_okay=False, path_type=Path),
+              help="Save plots of the results, requires matplotlib.")
+@click.argument("project", type=click.Path(exists=True, file_okay=False, path_type=Path))
+def main(project, prefixes, counts, lengths, threads, repeat, timeout, seed,
+         csv_file, json_file, plot_file):
+    """
+    Benchmark the aligners installed in the slivka PROJECT.
+    """
+    if plot_file is not None:
+        try:
+            import matplotlib  # noqa: F401
+        except ImportError:
+            raise click.UsageError("--plot requires matplotlib")
+    services = find_aligners(project, prefixes or ALIGNERS)
+    if not services:
+        raise click.UsageError(f"No aligners installed in {project}")
+    unthreaded = [name for name, service in services.items() if thread_parameter(service) is None]
+    if len(threads) > 1 and unthreaded:
+        click.echo(
+            f"Warning: aligners without a thread argument run with the tool's default "
+            f"threads only: {', '.join(unthreaded)}. Reinstall them with "
+            f"--job-concurrency to sweep the thread counts.",
+            err=True,
+        )
+    work_root = Path(tempfile.mkdtemp(prefix="slivka-aligners-"))
+    try:
+        rows = run_matrix(
+            project, work_root, services, counts, lengths, threads, repeat, timeout, seed
+        )
+    finally:
+        shutil.rmtree(work_root, ignore_errors=True)
+    print_table(rows)
+    if csv_file is not None:
+        write_csv(csv_file, rows)
+    if json_file is not None:
+        json_file.write_text(json.dumps(rows, indent=2))
+    if plot_file is not None:
+        plot(plot_file, rows)
+
+
+if __name__ == "__main__":
+    main()
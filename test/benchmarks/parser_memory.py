@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark of the Jalview parsers of the disorder predictors.
+
+Synthetic DisEMBL and GlobPlot outputs of a growing number of sequences
+are converted to annotation and feature files by the services' parser
+scripts. The wall time and peak memory of every run are reported; with
+record streaming the peak memory stays flat as the input grows. The
+parsers of an earlier revision can be run alongside for comparison.
+"""
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import click
+
+REPO_ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from install import format_size, run_service_test  # noqa: E402
+
+PARSERS = {
+    "disembl": "services/disembl-1.4/scripts/jalview_parser.py",
+    "globplot": "services/globplot-2.3/scripts/jalview_parser.py",
+}
+RESIDUES = "ACDEFGHIKLMNPQRSTVWY"
+
+
+def _ranges(length: int, rng: random.Random) -> str:
+    ranges = []
+    start = rng.randint(1, 20)
+    while start + 10 < length:
+        end = start + rng.randint(5, 30)
+        if end > length:
+            break
+        ranges.append(f"{start}-{end}")
+        start = end + rng.randint(10, 60)
+    return ", ".join(ranges)
+
+
+def write_disembl_output(path: Path, count: int, length: int, seed=0):
+    """Write the DisEMBL output of count sequences of the length."""
+    rng = random.Random(seed)
+    with open(path, "w") as fp:
+        for i in range(count):
+            fp.write(f"> seq{i:06d}\n")
+            for name in ("COILS", "REM465", "HOTLOOPS"):
+                fp.write(f"# {name} {_ranges(length, rng)}\n")
+            fp.write("# RESIDUE\tCOILS\tREM465\tHOTLOOPS\n")
+            for _ in range(length):
+                fp.write(
+                    f"{rng.choice(RESIDUES)}\t{rng.random():.3f}\t"
+                    f"{rng.random():.3f}\t{rng.random():.3f}\n"
+                )
+            fp.write("\n")
+
+
+def write_globplot_output(path: Path, count: int, length: int, seed=0):
+    """Write the GlobPlot output of count sequences of the length."""
+    rng = random.Random(seed)
+    with open(path, "w") as fp:
+        for i in range(count):
+            fp.write(f"> seq{i:06d}\n")
+            fp.write(f"# GlobDoms {_ranges(length, rng)}\n")
+            fp.write(f"# Disorder {_ranges(length, rng)}\n")
+            fp.write("# RESIDUE\tDYDX\tRAW\tSMOOTHED\n")
+            for _ in range(length):
+                fp.write(
+                    f"{rng.choice(RESIDUES)}\t{rng.uniform(-1, 1):.3f}\t"
+                    f"{rng.random():.3f}\t{rng.random():.3f}\n"
+                )
+            fp.write("\n")
+
+
+OUTPUT_WRITERS = {"disembl": write_disembl_output, "globplot": write_globplot_output}
+
+
+def checkout_parsers(revision: str, dst: Path) -> dict[str, Path]:
+    """Extract the parser scripts of the git revision."""
+    scripts = {}
+    for name, path in PARSERS.items():
+        scripts[name] = dst / f"{name}.py"
+        scripts[name].write_bytes(
+            subprocess.check_output(["git", "show", f"{revision}:{path}"], cwd=REPO_ROOT)
+        )
+    return scripts
+
+
+def run_benchmark(
+    work_root: Path, scripts: dict, counts=(1000, 10000), length=300, timeout=600, jobs=1
+):
+    """
+    Run the parser scripts, keyed by version, over outputs of every count.
+    The current parsers run with the number of processes given by jobs.
+
+    :return:
+        List of result rows.
+    """
+    rows = []
+    env = {**os.environ, "PYTHONPATH": str(REPO_ROOT / "shared" / "scripts")}
+    for name, write_output in OUTPUT_WRITERS.items():
+        for count in counts:
+            input_file = work_root / f"{name}-{count}.out"
+            write_output(input_file, count, length)
+            for version, version_scripts in scripts.items():
+                work_dir = work_root / "job"
+                shutil.rmtree(work_dir, ignore_errors=True)
+                work_dir.mkdir()
+                args = [
+                    sys.executable, str(version_scripts[name]),
+                    "--input", str(input_file),
+                    "--annot", "out.jvannot",
+                    "--feat", "out.jvfeat",
+                ]
+                if version == "current":
+                    args += ["--jobs", str(jobs)]
+                result = run_service_test(args, env, work_dir, timeout)
+                row = {
+                    "parser": name,
+                    "version": version,
+                    "sequences": count,
+                    "input-size": input_file.stat().st_size,
+                    "status": result["status"],
+                }
+                if "wall-time" in result:
+                    row.update({"wall-time": result["wall-time"], "max-rss": result["max-rss"]})
+                click.echo(format_row(row), err=True)
+                rows.append(row)
+            input_file.unlink()
+    return rows
+
+
+def format_row(row: dict) -> str:
+    text = (
+        f"{row['parser']:<9} {row['version']:<12} {row['sequences']:>8} "
+        f"{format_size(row['input-size']):>9} {row['status']:<8}"
+    )
+    if "wall-time" in row:
+        text += f" {row['wall-time']:>8.2f} {format_size(row['max-rss'] * 1024):>9}"
+    return text
+
+
+def print_table(rows: list[dict]):
+    click.echo(
+        f"{'parser':<9} {'version':<12} {'seqs':>8} {'input':>9} {'status':<8} "
+        f"{'wall s':>8} {'max rss':>9}"
+    )
+    for row in rows:
+        click.echo(format_row(row))
+
+
+def _int_list(ctx, param, value):
+    try:
+        return [int(item) for item in value.split(",")]
+    except ValueError:
+        raise click.BadParameter("expected comma separated integers")
+
+
+@click.command()
+@click.option("--counts", default="1000,10000,50000", show_default=True, callback=_int_list,
+              help="Numbers of sequences.")
+@click.option("--length", type=click.IntRange(min=20), default=300, show_default=True,
+              help="Sequence length.")
+@click.option("--compare", "revision", metavar="REV",
+              help="Also run the parsers of the git revision.")
+@click.option("--jobs", type=click.IntRange(min=0), default=1, show_default=True,
+              help="Processes of the current parsers, 0 for all cores.")
+@click.option("--timeout", type=float, default=600, show_default=True, help="Timeout of a run.")
+@click.option("--json", "json_file", type=click.Path(dir_okay=False, path_type=Path))
+def main(counts, length, revision, jobs, timeout, json_file):
+    """
+    Measure the peak memory of the disorder predictor parsers on outputs
+    of growing size.
+    """
+    work_root = Path(tempfile.mkdtemp(prefix="slivka-parsers-"))
+    try:
+        scripts = {"current": {name: REPO_ROOT / path for name, path in PARSERS.items()}}
+        if revision is not None:
+            scripts[revision] = checkout_parsers(revision, work_root)
+        rows = run_benchmark(work_root, scripts, counts, length, timeout, jobs)
+    finally:
+        shutil.rmtree(work_root, ignore_errors=True)
+    print_table(rows)
+    if json_file is not None:
+        json_file.write_text(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
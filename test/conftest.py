@@ -0,0 +1,22 @@
+import pytest
+
+
+def benchmarks_requested(config) -> bool:
+    """Whether the run asks for benchmarks with pytest-benchmark options."""
+    return bool(
+        config.getoption("benchmark_only", False)
+        or config.getoption("benchmark_autosave", False)
+        or config.getoption("benchmark_save", None)
+        or config.getoption("benchmark_compare", False)
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    # benchmarks are slow and their timings are only meaningful on
+    # a dedicated machine, plain test runs skip them
+    if benchmarks_requested(config):
+        return
+    skip = pytest.mark.skip(reason="benchmarks run with --benchmark-only")
+    for item in items:
+        if "benchmark" in getattr(item, "fixturenames", ()):
+            item.add_marker(skip)
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+End-to-end throughput harness for the installer.
+
+Runs the full installation of the services with stand-ins for conda,
+micromamba, docker and slivka on PATH, in a copy of the repository's
+services and shared files, and reports the total wall time, the numbers of
+subprocesses started and the time spent in each installation phase.
+"""
+import collections
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import click
+
+HARNESS_DIR = Path(__file__).resolve().parent
+REPO_ROOT = HARNESS_DIR.parent.parent
+
+
+def run_harness(
+    work_dir: Path,
+    services=(),
+    installer="conda,docker",
+    conda="conda",
+    delays=None,
+    install_args=(),
+    answers=None,
+    env_vars=None,
+) -> dict:
+    """
+    Install the services into a project in the work directory using
+    the stand-in executables.
+
+    :param Path work_dir:
+        Directory the services are copied to and installed in, which may
+        hold the project of an earlier run.
+    :param services:
+        Service name prefixes, all services if empty.
+    :param str installer:
+        Installer preference passed to ``--installer``, None to install
+        interactively.
+    :param str conda:
+        Name of the conda stand-in, conda or micromamba.
+    :param dict delays:
+        Latencies in seconds keyed by solve, create, activate, build,
+        pull or run.
+    :param install_args:
+        Extra arguments of install.py.
+    :param str answers:
+        Input of the prompts of the interactive installation, which runs
+        if no installer preference is given.
+    :param dict env_vars:
+        Extra environment variables of the stand-ins, e.g.
+        HARNESS_FAIL_CREATE.
+    :return:
+        Report of the run.
+    """
+    for name in ("services", "shared"):
+        # files of an earlier run in the work directory are kept
+        shutil.copytree(
+            REPO_ROOT / name,
+            work_dir / name,
+            ignore=shutil.ignore_patterns("*.conda.lock"),
+            dirs_exist_ok=True,
+        )
+    # sources of uninitialized git submodules are replaced with empty directories
+    for path in _submodule_paths():
+        (work_dir / path).mkdir(parents=True, exist_ok=True)
+    project = work_dir / "project"
+    calls_log = work_dir / "calls.jsonl"
+    trace_file = work_dir / "trace.jsonl"
+    for path in (calls_log, trace_file):
+        path.unlink(missing_ok=True)
+    env = {
+        key: value for key, value in os.environ.items()
+        if key not in ("CONDA_EXE", "MAMBA_EXE") and not key.startswith("DOCKER_")
+    }
+    env.update({
+        "PATH": os.pathsep.join([str(HARNESS_DIR / "bin"), env.get("PATH", "")]),
+        "HARNESS_STATE": str(work_dir / "state"),
+        "HARNESS_LOG": str(calls_log),
+        "SLIVKA_INSTALLER_CACHE": str(work_dir / "cache"),
+    })
+    env.update(env_vars or {})
+    for phase, seconds in (delays or {}).items():
+        env[f"HARNESS_DELAY_{phase.upper()}"] = str(seconds)
+    command = [
+        sys.executable, str(REPO_ROOT / "install.py"),
+        "--conda-exe", conda,
+        *(["--installer", installer] if installer else []),
+        "--trace", str(trace_file),
+        *(f"--service={service}" for service in services),
+        *install_args,
+        str(project),
+    ]
+    start = time.perf_counter()
+    proc = subprocess.run(
+        command, cwd=work_dir, env=env, input=answers, capture_output=True, text=True
+    )
+    wall_time = time.perf_counter() - start
+    return {
+        "returncode": proc.returncode,
+        "wall-time": wall_time,
+        "output": proc.stdout + proc.stderr,
+        "installed": sorted(path.name for path in project.glob("services/*.service.yaml")),
+        "subprocesses": _count_calls(calls_log),
+        "phases": _aggregate_phases(trace_file),
+    }
+
+
+def _submodule_paths():
+    gitmodules = REPO_ROOT / ".gitmodules"
+    if not gitmodules.exists():
+        return []
+    return [
+        line.split("=", 1)[1].strip()
+        for line in gitmodules.read_text().splitlines()
+        if line.strip().startswith("path")
+    ]
+
+
+def _count_calls(calls_log: Path) -> dict:
+    counts = collections.Counter()
+    if calls_log.exists():
+        for line in calls_log.read_text().splitlines():
+            record = json.loads(line)
+            counts[f"{record['tool']} {record['command']}".strip()] += 1
+    return dict(sorted(counts.items()))
+
+
+def _aggregate_phases(trace_file: Path) -> dict:
+    phases = {}
+    if trace_file.exists():
+        for line in trace_file.read_text().splitlines():
+            span = json.loads(line)
+            phase = phases.setdefault(
+                span["name"], {"count": 0, "total": 0.0, "max": 0.0, "subprocesses": 0}
+            )
+            phase["count"] += 1
+            phase["total"] += span["duration"]
+            phase["max"] = max(phase["max"], span["duration"])
+            phase["subprocesses"] += span["subprocesses"]
+    return dict(sorted(phases.items()))
+
+
+def print_report(report: dict):
+    click.echo(
+        f"Installed {len(report['installed'])} service(s) in "
+        f"{report['wall-time']:.2f} s (exit code {report['returncode']})"
+    )
+    click.echo(f"Subprocesses: {sum(report['subprocesses'].values())}")
+    for command, count in report["subprocesses"].items():
+        click.echo(f"  {command:<28} {count:>5}")
+    click.echo("Phases:")
+    click.echo(f"  {'name':<20} {'count':>5} {'total s':>9} {'max s':>8} {'subproc':>8}")
+    for name, phase in report["phases"].items():
+        click.echo(
+            f"  {name:<20} {phase['count']:>5} {phase['total']:>9.3f} "
+            f"{phase['max']:>8.3f} {phase['subprocesses']:>8}"
+        )
+
+
+@click.command(context_settings={"ignore_unknown_options": True})
+@click.option("--service", "-s", "services", multiple=True, help="Service name prefix.")
+@click.option("--installer", "-i", default="conda,docker", show_default=True)
+@click.option("--conda", type=click.Choice(["conda", "micromamba"]), default="conda", show_default=True)
+@click.option("--solve", type=float, default=2.0, show_default=True, help="Conda solve latency.")
+@click.option("--create", type=float, default=1.0, show_default=True, help="Conda env creation latency.")
+@click.option("--activate", type=float, default=0.3, show_default=True, help="Conda run latency.")
+@click.option("--build", type=float, default=3.0, show_default=True, help="Docker build latency.")
+@click.option("--pull", type=float, default=1.5, show_default=True, help="Docker pull latency.")
+@click.option("--run", type=float, default=0.5, show_default=True, help="Docker run latency.")
+@click.option("--json", "json_file", type=click.Path(dir_okay=False, path_type=Path),
+              help="Write the report to the file as JSON.")
+@click.option("--keep", is_flag=True, help="Keep the work directory.")
+@click.argument("install_args", nargs=-1, type=click.UNPROCESSED)
+def main(services, installer, conda, json_file, keep, install_args, **delays):
+    """
+    Install services with stand-ins for conda and docker and report the time
+    spent. Arguments after -- are passed to install.py, e.g. -- --jobs 8.
+    """
+    work_dir = Path(tempfile.mkdtemp(prefix="slivka-harness-"))
+    try:
+        report = run_harness(work_dir, services, installer, conda, delays, install_args)
+    finally:
+        if keep:
+            click.echo(f"Work directory: {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    if report["returncode"] != 0:
+        click.echo(report["output"], err=True)
+    print_report(report)
+    if json_file is not None:
+        json_file.write_text(json.dumps(report, indent=2))
+    sys.exit(report["returncode"])
+
+
+if __name__ == "__main__":
+    main()
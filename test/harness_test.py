@@ -0,0 +1,75 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+HARNESS_SCRIPT = Path(__file__).parent / "harness" / "run_harness.py"
+
+
+@pytest.fixture
+def run_harness(monkeypatch):
+    monkeypatch.syspath_prepend(str(HARNESS_SCRIPT.parent))
+    from run_harness import run_harness
+
+    return run_harness
+
+
+@pytest.mark.parametrize("conda", ["conda", "micromamba"])
+def test_harness_installs_services(tmp_path, conda):
+    report_file = tmp_path / "report.json"
+    proc = subprocess.run(
+        [
+            sys.executable, HARNESS_SCRIPT,
+            "--conda", conda,
+            "--service", "mafft", "--service", "jronn", "--service", "absolve",
+            "--solve", "0", "--create", "0", "--activate", "0",
+            "--build", "0", "--pull", "0", "--run", "0",
+            "--json", report_file,
+        ],
+        capture_output=True,
+        text=True,
+    )
+    assert proc.returncode == 0, proc.stdout + proc.stderr
+    report = json.loads(report_file.read_text())
+    assert report["installed"] == [
+        "absolve-prot.service.yaml",
+        "jronn-3.1b.service.yaml",
+        "mafft-7.458.service.yaml",
+        "mafft-7.475.service.yaml",
+    ]
+    assert report["subprocesses"][f"{conda} env create"] == 2
+    assert report["subprocesses"]["docker buildx build"] == 2
+    assert report["phases"]["install"]["count"] == 4
+    assert report["phases"]["conda.solve"]["subprocesses"] == 2
+
+
+def test_harness_second_run_is_up_to_date(tmp_path, run_harness):
+    first = run_harness(tmp_path, services=["jronn"], installer="conda")
+    assert first["returncode"] == 0, first["output"]
+    # the first run writes the lock file of the environment
+    assert list(tmp_path.glob("services/jronn-3.1b/*.conda.lock"))
+    second = run_harness(tmp_path, services=["jronn"], installer="conda")
+    assert second["returncode"] == 0, second["output"]
+    assert "jronn-3.1b (up to date)" in second["output"]
+    assert "conda env create" not in second["subprocesses"]
+
+
+def test_harness_failed_interactive_install_is_not_resumed(tmp_path, run_harness):
+    # confirm, choose conda and skip the service after the failure
+    first = run_harness(
+        tmp_path,
+        services=["jronn"],
+        installer=None,
+        answers="y\nc\ns\n",
+        env_vars={"HARNESS_FAIL_CREATE": "1"},
+    )
+    assert first["returncode"] == 0, first["output"]
+    assert "Skipping: jronn-3.1b" in first["output"]
+    journal = (tmp_path / "project" / ".slivka-installer" / "journal.jsonl").read_text()
+    assert '"event": "failed"' in journal
+    second = run_harness(tmp_path, services=["jronn"], installer=None, answers="y\nc\n")
+    assert second["returncode"] == 0, second["output"]
+    assert "Resuming interrupted installation" not in second["output"]
+    assert second["installed"] == ["jronn-3.1b.service.yaml"]
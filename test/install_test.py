@@ -1,17 +1,70 @@
 import builtins
 import contextlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
 from pathlib import Path
 
 import pytest
 from hamcrest import assert_that, contains_inanyorder
 
 from install import (
+    CondaEnvStore,
+    CondaInstaller,
+    DockerEnvContextMap,
+    ImageIntrospectionCache,
+    InstallReport,
+    InstallState,
+    PhaseLimits,
+    ServiceCatalogue,
+    ServiceTemplate,
+    SharedPathsContextMap,
+    TemplateContext,
+    ThreadAllocation,
+    Tracer,
+    VerifyBaseline,
+    UnresolvedPlaceholdersError,
+    apply_threads,
+    binary_replace,
+    build_test_command,
+    buildx_driver,
+    capture_activation,
+    check_bundle_manifest,
+    choose_installer,
+    conda_env_key,
     copy_data_dirs,
+    copy_shared_files,
+    copy_service_file,
+    dockerfile_digest,
     find_and_copy_data_dirs,
     find_data_dirs,
+    format_size,
+    install_concurrently,
     interpolate_string,
     interpolate_list,
-    interpolate_dict
+    interpolate_dict,
+    image_reference,
+    load_plan_file,
+    make_bundle_manifest,
+    make_bake_plan,
+    pack_conda_envs,
+    parse_installer_choices,
+    parse_introspection_output,
+    parse_job_concurrency,
+    plan_service,
+    read_lock_spec_hash,
+    relocate_prefix,
+    replace_path,
+    rendering_options,
+    run_service_test,
+    service_fingerprint,
+    sync_tree,
+    unpack_conda_envs,
+    verify_services,
 )
 
 @pytest.fixture
@@ -265,4 +318,1119 @@ def test_interpolate_dict_missing_key():
     context = {"key:value": "replacement"}
     data = {"key": "This is a {{ missing:key }}."}
     with pytest.raises(KeyError):
-        interpolate_dict(data, context)
\ No newline at end of file
+        interpolate_dict(data, context)
+
+# Test cases for the template engine
+
+class _CountingMap(dict):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lookups = []
+
+    def __getitem__(self, key):
+        self.lookups.append(key)
+        return super().__getitem__(key)
+
+
+def test_template_context_memoizes_lookups():
+    values = _CountingMap({"which:tool": "/usr/bin/tool", "which:unused": "/usr/bin/unused"})
+    context = TemplateContext(values)
+    assert context["which:tool"] == "/usr/bin/tool"
+    assert context["which:tool"] == "/usr/bin/tool"
+    assert values.lookups == ["which:tool"]
+
+
+def test_template_context_variables_refer_to_variables():
+    context = TemplateContext(
+        {"local-path:src": "/data/src"},
+        variables={
+            "script": "{{ var:bin }}/run.py",
+            "bin": "{{ var:root }}/bin",
+            "root": "{{ local-path:src }}",
+        },
+    )
+    assert context["var:script"] == "/data/src/bin/run.py"
+    assert context.required_keys(["var:script"]) == {
+        "var:script", "var:bin", "var:root", "local-path:src"
+    }
+
+
+def test_template_context_renders_nested_variables():
+    variables = {
+        "paths": {"bin": "{{ var:root }}/bin", "data": ["{{ local-path:src }}", 3]},
+        "root": "{{ local-path:src }}",
+        "count": 3,
+    }
+    context = TemplateContext({"local-path:src": "/data/src"}, variables=variables)
+    assert context["var:paths"] == {"bin": "/data/src/bin", "data": ["/data/src", 3]}
+    assert context["var:count"] == 3
+    assert context.required_keys(["var:paths"]) == {"var:paths", "var:root", "local-path:src"}
+    # the variables of the install file are not modified
+    assert variables["paths"]["bin"] == "{{ var:root }}/bin"
+
+
+def test_template_context_circular_variables():
+    context = TemplateContext(variables={"a": "{{ var:b }}", "b": "{{ var:a }}"})
+    with pytest.raises(ValueError):
+        context["var:a"]
+
+
+def test_template_context_reports_all_unresolved():
+    context = TemplateContext({"env:HOME": "/home/slivka"}, variables={"x": "{{ env:MISSING }}"})
+    with pytest.raises(UnresolvedPlaceholdersError) as exc_info:
+        context.resolve(["env:HOME", "which:missing", "var:x"])
+    assert isinstance(exc_info.value, KeyError)
+    assert list(exc_info.value.errors) == ["var:x", "which:missing"]
+
+
+def test_service_template_render(tmp_path):
+    template_file = tmp_path / "example.service.yaml"
+    template_file.write_text(
+        "command:\n"
+        "- \"{{ which:tool }}\"\n"
+        "- --data={{ runtime-path:data }}\n"
+        "execution:\n"
+        "  runners: !include _profiles.yaml#/local\n"
+        "env:\n"
+        "  TOOL_HOME: \"{{ var:home }}\"\n"
+    )
+    values = _CountingMap({"which:tool": "/bin/tool", "runtime-path:data": "/data", "which:unused": ""})
+    template = ServiceTemplate(template_file)
+    assert template.keys == {"which:tool", "runtime-path:data", "var:home"}
+    data = template.render(TemplateContext(values, variables={"home": "{{ which:tool }}/.."}))
+    assert data["command"] == ["/bin/tool", "--data=/data"]
+    assert data["env"]["TOOL_HOME"] == "/bin/tool/.."
+    assert data["execution"]["runners"].tag.value == "!include"
+    assert sorted(values.lookups) == ["runtime-path:data", "which:tool"]
+
+
+@pytest.mark.parametrize(
+    "concurrency, profile, maximum, expected",
+    [
+        ({}, "default", None, 16),
+        ({"default": 4}, "default", None, 4),
+        ({"default": 4}, "gpu", None, 16),
+        ({"": 3, "default": 4}, "gpu", None, 5),
+        ({"default": 32}, "default", None, 1),
+        ({}, "default", 8, 8),
+    ],
+)
+def test_thread_allocation(concurrency, profile, maximum, expected):
+    allocation = ThreadAllocation(cores=16, concurrency=concurrency)
+    assert allocation.threads(profile, maximum) == expected
+
+
+def test_parse_job_concurrency():
+    assert parse_job_concurrency(["4", "gpu=1"]) == {"": 4, "gpu": 1}
+    with pytest.raises(ValueError):
+        parse_job_concurrency(["gpu=0"])
+
+
+def test_copy_service_file_injects_threads(tmp_path):
+    template_file = tmp_path / "example.service.yaml"
+    template_file.write_text(
+        "command: [tool]\n"
+        "threads:\n  arg: --threads=$(value)\n  max: 6\n"
+        "args:\n  input:\n    arg: $(value)\n"
+        "execution:\n  runners:\n    default: !include _profiles.yaml::local\n"
+    )
+    allocation = ThreadAllocation(cores=16, concurrency={"local": 2})
+    output_file = copy_service_file(
+        template_file, tmp_path, TemplateContext({}), threads=allocation
+    )
+    text = output_file.read_text()
+    assert "max: 6" not in text
+    assert text.index("_threads:") < text.index("input:")
+    assert "arg: --threads=$(value)\n    default: '6'" in text
+    output_file = copy_service_file(template_file, tmp_path, TemplateContext({}))
+    assert "threads" not in output_file.read_text()
+
+@pytest.mark.parametrize(
+    "metadata, concurrency, expected",
+    [
+        ({"arg": "-n=$(value)", "default": 4}, {}, "4"),
+        ({"arg": "-n=$(value)", "default": 4}, {"": 2}, "8"),
+        ({"arg": "-n=$(value)", "default": 4}, {"local": 16}, "1"),
+        ({"arg": "-n=$(value)", "default": 4}, {"gpu": 16}, "4"),
+        ({"arg": "-n=$(value)"}, {}, None),
+    ],
+)
+def test_apply_threads_default(metadata, concurrency, expected):
+    service_config = {
+        "threads": metadata,
+        "args": {"input": {"arg": "$(value)"}},
+        "execution": {"runners": {"default": "_profiles.yaml::local"}},
+    }
+    apply_threads(service_config, ThreadAllocation(cores=16, concurrency=concurrency))
+    assert "threads" not in service_config
+    if expected is None:
+        assert "_threads" not in service_config["args"]
+    else:
+        assert service_config["args"]["_threads"] == {"arg": "-n=$(value)", "default": expected}
+
+
+# Test cases for the service catalogue
+
+@pytest.fixture
+def services_root(tmp_path):
+    root = tmp_path / "services"
+    (root / "example-1.0").mkdir(parents=True)
+    (root / "example-1.0" / "example-1.0.service.yaml").write_text(
+        "name: Example\nversion: '1.0'\ndescription: Example service\n"
+        "execution:\n  runners:\n    default: !include _profiles.yaml::default\n"
+    )
+    (root / "example-1.0" / "example-1.0.conda.yaml").write_text(
+        "files:\n- include: data\n"
+    )
+    (root / "other-2").mkdir()
+    (root / "other-2" / "other-2.service.yaml").write_text("name: Other\nversion: 2\n")
+    return root
+
+
+def test_service_catalogue_entries(services_root):
+    catalogue = ServiceCatalogue(services_root)
+    entry, other = catalogue.select()
+    assert entry["base-name"] == "example-1.0"
+    assert entry["name"] == "Example"
+    assert entry["version"] == "1.0"
+    assert entry["description"] == "Example service"
+    assert entry["installers"] == {"conda": {"files": [{"include": "data"}]}}
+    assert entry["runners"] == {"default": "!include _profiles.yaml::default"}
+    assert catalogue.path(entry) == services_root / "example-1.0" / "example-1.0.service.yaml"
+    assert other["version"] == "2"
+    assert other["installers"] == {}
+    assert [e["base-name"] for e in catalogue.select(["oth", "x"])] == ["other-2"]
+
+
+def test_service_catalogue_cache(services_root, tmp_path, monkeypatch):
+    cache_file = tmp_path / "catalogue.json"
+    ServiceCatalogue(services_root, cache_file)
+    assert cache_file.is_file()
+    # unchanged files are not parsed again
+    monkeypatch.setattr("install.read_service_entry", None)
+    assert len(ServiceCatalogue(services_root, cache_file).select()) == 2
+    monkeypatch.undo()
+
+    service_file = services_root / "other-2" / "other-2.service.yaml"
+    service_file.write_text("name: Other\nversion: 3\n")
+    os.utime(service_file, ns=(0, service_file.stat().st_mtime_ns + 1))
+    (services_root / "new-1").mkdir()
+    (services_root / "new-1" / "new-1.service.yaml").write_text("name: New\nversion: 1\n")
+    catalogue = ServiceCatalogue(services_root, cache_file)
+    assert [(e["base-name"], e["version"]) for e in catalogue.select()] == [
+        ("example-1.0", "1.0"), ("new-1", "1"), ("other-2", "3")
+    ]
+
+
+@pytest.mark.parametrize(
+    ("size", "expected"),
+    [(0, "0 B"), (999, "999 B"), (1000, "1.0 kB"), (123_456_789, "123.5 MB"), (5 * 10**12, "5000.0 GB")],
+)
+def test_format_size(size, expected):
+    assert format_size(size) == expected
+
+
+def test_plan_service(services_root, tmp_path):
+    (services_root / "example-1.0" / "data").mkdir()
+    (services_root / "example-1.0" / "data" / "model.dat").write_bytes(b"x" * 1500)
+    (services_root / "example-1.0" / "other").mkdir()
+    catalogue = ServiceCatalogue(services_root)
+    entry = catalogue.select(["example"])[0]
+    project = tmp_path / "project"
+    actions = plan_service(
+        entry, catalogue.path(entry), "conda", project, copy_mode="hardlink"
+    )
+    assert actions[0].startswith(f"solve and create env {project}/conda_env/example-1.0")
+    assert actions[1:] == [
+        f"hardlink {services_root}/example-1.0/data -> {project}/data/example-1.0/data "
+        f"(1 file, 1.5 kB)",
+        f"write service file {project}/services/example-1.0.service.yaml",
+    ]
+    assert not project.exists()
+
+
+def test_plan_service_existing_env(services_root, tmp_path):
+    (services_root / "example-1.0" / "data").mkdir()
+    (services_root / "example-1.0" / "environment.yaml").write_text("dependencies: [python]\n")
+    catalogue = ServiceCatalogue(services_root)
+    entry = catalogue.select(["example"])[0]
+    project = tmp_path / "project"
+    (project / "conda_env" / "example-1.0").mkdir(parents=True)
+    (project / "data" / "example-1.0" / "data").mkdir(parents=True)
+    actions = plan_service(entry, catalogue.path(entry), "conda", project, overwrite=False)
+    assert actions == [
+        f"keep existing env {project}/conda_env/example-1.0",
+        f"keep existing {project}/data/example-1.0/data",
+        f"write service file {project}/services/example-1.0.service.yaml",
+    ]
+    store = CondaEnvStore(tmp_path / "store")
+    key = conda_env_key({"dependencies": ["python"]})
+    store.env_path(key).mkdir(parents=True)
+    store._write_meta(key, {"key": key, "references": []})
+    actions = plan_service(
+        entry, catalogue.path(entry), "conda", project, env_store=store, overwrite=True
+    )
+    assert actions[:2] == [
+        f"overwrite existing env {project}/conda_env/example-1.0",
+        f"link stored env {store.env_path(key)} to {project}/conda_env/example-1.0",
+    ]
+
+# Test cases for the unattended installation
+
+@pytest.mark.parametrize(
+    ("choices", "expected_rules"),
+    [
+        (["conda"], [("*", ["conda"])]),
+        (["docker,conda"], [("*", ["docker", "conda"])]),
+        (["mafft-*=docker"], [("mafft-*", ["docker"])]),
+        (["absolve-prot=skip", "conda"], [("absolve-prot", ["skip"]), ("*", ["conda"])]),
+        pytest.param(["clustalo=apt"], [], marks=pytest.mark.xfail(raises=ValueError)),
+    ]
+)
+def test_parse_installer_choices(choices, expected_rules):
+    assert parse_installer_choices(choices) == expected_rules
+
+
+def test_load_plan_file(tmp_path):
+    plan_file = tmp_path / "plan.yaml"
+    plan_file.write_text('"*": [conda, docker]\nabsolve-prot: docker\n')
+    assert load_plan_file(plan_file) == [
+        ("*", ["conda", "docker"]),
+        ("absolve-prot", ["docker"]),
+    ]
+
+
+@pytest.mark.parametrize(
+    ("rules", "applicable", "expected"),
+    [
+        ([], ["conda", "docker"], "conda"),
+        ([], ["docker"], "docker"),
+        ([("*", ["docker", "conda"])], ["conda", "docker"], "docker"),
+        ([("*", ["docker"])], ["conda"], None),
+        ([("*", ["docker"]), ("example-*", ["conda"])], ["conda", "docker"], "conda"),
+        ([("example-*", ["skip"])], ["conda"], "skip"),
+        ([("other", ["docker"])], ["conda", "docker"], "conda"),
+    ]
+)
+def test_choose_installer(rules, applicable, expected):
+    assert choose_installer("example-0.1", rules, applicable) == expected
+
+
+class _FakeInstaller:
+    def __init__(self, fail=()):
+        self.fail = fail
+
+    def install_service(self, install_file, project_path, overwrite=None):
+        if install_file.name in self.fail:
+            raise RuntimeError("installation failed")
+        return project_path / "services" / install_file.name
+
+    def rendering_options(self):
+        return {}
+
+
+def test_install_concurrently_collects_failures(tmp_path):
+    installer = _FakeInstaller(fail={"bad.conda.yaml"})
+    tasks = []
+    for name in ("good", "bad"):
+        (tmp_path / f"{name}.service.yaml").touch()
+        (tmp_path / f"{name}.conda.yaml").write_text("environment: {}\n")
+        tasks.append((name, "conda", installer, tmp_path / f"{name}.conda.yaml", "0"))
+    report = InstallReport()
+    install_concurrently(tasks, tmp_path, 2, report)
+    assert report.installed == [
+        ("good", "conda", tmp_path / "services" / "good.conda.yaml")
+    ]
+    assert [(name, installer) for name, installer, _ in report.failed] == [
+        ("bad", "conda")
+    ]
+
+
+def test_phase_limits_bounds_concurrency():
+    limits = PhaseLimits(copy=2)
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def task():
+        with limits.acquire("copy"):
+            with lock:
+                active.append(1)
+                peak.append(len(active))
+            time.sleep(0.01)
+            with lock:
+                active.pop()
+
+    threads = [threading.Thread(target=task) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(peak) <= 2
+
+
+# Test cases for the conda environment store
+
+def test_conda_env_key_ignores_dependency_order_and_name():
+    spec_a = {
+        "name": "a",
+        "channels": ["conda-forge", "bioconda"],
+        "dependencies": ["bioconda::mafft=7.458", "bioconda::fasta3=36.3.8"],
+    }
+    spec_b = {
+        "channels": ["conda-forge", "bioconda"],
+        "dependencies": ["bioconda::fasta3=36.3.8", "bioconda::mafft=7.458"],
+    }
+    assert conda_env_key(spec_a, "linux-64") == conda_env_key(spec_b, "linux-64")
+
+
+@pytest.mark.parametrize(
+    ("spec_b", "platform_b"),
+    [
+        ({"channels": ["bioconda", "conda-forge"], "dependencies": ["mafft"]}, "linux-64"),
+        ({"channels": ["conda-forge", "bioconda"], "dependencies": ["mafft=7.475"]}, "linux-64"),
+        ({"channels": ["conda-forge", "bioconda"], "dependencies": ["mafft"]}, "osx-arm64"),
+    ]
+)
+def test_conda_env_key_differs(spec_b, platform_b):
+    spec_a = {"channels": ["conda-forge", "bioconda"], "dependencies": ["mafft"]}
+    assert conda_env_key(spec_a, "linux-64") != conda_env_key(spec_b, platform_b)
+
+
+def _fake_create_env(created):
+    def create(prefix):
+        created.append(prefix)
+        (prefix / "bin").mkdir(parents=True)
+    return create
+
+
+def test_conda_env_store_reuses_environment(tmp_path):
+    store = CondaEnvStore(tmp_path / "store")
+    spec = {"channels": ["bioconda"], "dependencies": ["clustalo=1.2.4"]}
+    created = []
+    key_a = store.provide(spec, tmp_path / "a" / "clustalo", _fake_create_env(created))
+    key_b = store.provide(spec, tmp_path / "b" / "clustalo", _fake_create_env(created))
+    assert key_a == key_b
+    assert created == [store.env_path(key_a)]
+    assert (tmp_path / "a" / "clustalo" / "bin").is_dir()
+    assert (tmp_path / "b" / "clustalo").resolve() == store.env_path(key_a).resolve()
+
+
+def test_conda_env_store_recreates_missing_environment(tmp_path):
+    store = CondaEnvStore(tmp_path / "store")
+    spec = {"channels": ["bioconda"], "dependencies": ["clustalo=1.2.4"]}
+    created = []
+    key = store.provide(spec, tmp_path / "a" / "clustalo", _fake_create_env(created))
+    shutil.rmtree(store.env_path(key))
+    store.provide(spec, tmp_path / "b" / "clustalo", _fake_create_env(created))
+    assert created == [store.env_path(key)] * 2
+    assert (tmp_path / "a" / "clustalo" / "bin").is_dir()
+    assert store.read_meta(key)["references"] == [
+        str(tmp_path / "a" / "clustalo"), str(tmp_path / "b" / "clustalo")
+    ]
+
+
+@pytest.mark.parametrize("mode", ["link", "clone"])
+def test_create_env_overwrites_directory_with_stored_env(tmp_path, mode):
+    installer = CondaInstaller(
+        str(Path(__file__).parent / "harness" / "bin" / "conda"),
+        tmp_path / "conda_env",
+        overwrite=True,
+        env_store=CondaEnvStore(tmp_path / "store", mode=mode),
+    )
+    installer._create_prefix = lambda prefix, *args: (prefix / "bin").mkdir(parents=True)
+    installer._clone_prefix = lambda src, dst: shutil.copytree(src, dst)
+    env_file = tmp_path / "environment.yaml"
+    env_file.write_text("channels: [bioconda]\ndependencies: [clustalo=1.2.4]\n")
+    (tmp_path / "conda_env" / "clustalo" / "old").mkdir(parents=True)
+    env_path = installer.create_env("clustalo", env_file)
+    assert (env_path / "bin").is_dir()
+    assert not (env_path / "old").exists()
+
+
+def test_conda_env_store_collect_garbage(tmp_path):
+    store = CondaEnvStore(tmp_path / "store")
+    spec_a = {"channels": ["bioconda"], "dependencies": ["clustalo=1.2.4"]}
+    spec_b = {"channels": ["bioconda"], "dependencies": ["clustalw=2.1"]}
+    created = []
+    key_a = store.provide(spec_a, tmp_path / "project" / "clustalo", _fake_create_env(created))
+    key_b = store.provide(spec_b, tmp_path / "project" / "clustalw", _fake_create_env(created))
+    (tmp_path / "project" / "clustalw").unlink()
+    assert store.collect_garbage() == [key_b]
+    assert store.env_path(key_a).is_dir()
+    assert not store.env_path(key_b).exists()
+
+
+# Test cases for the conda lock files
+
+def test_read_lock_spec_hash(tmp_path):
+    lock_file = tmp_path / "example-0.1.linux-64.conda.lock"
+    lock_file.write_text(
+        "# Generated by slivka-bio-installer. Do not edit.\n"
+        "# spec-hash: 0123abcd\n"
+        "# platform: linux-64\n"
+        "@EXPLICIT\n"
+        "https://conda.anaconda.org/bioconda/linux-64/example-0.1-0.tar.bz2#abcdef\n"
+    )
+    assert read_lock_spec_hash(lock_file) == "0123abcd"
+
+
+def test_read_lock_spec_hash_missing_file(tmp_path):
+    assert read_lock_spec_hash(tmp_path / "missing.conda.lock") is None
+
+
+def test_read_lock_spec_hash_without_hash(tmp_path):
+    lock_file = tmp_path / "example.conda.lock"
+    lock_file.write_text("@EXPLICIT\n# spec-hash: 0123abcd\n")
+    assert read_lock_spec_hash(lock_file) is None
+
+
+# Test cases for the installation state
+
+@pytest.fixture
+def service_dir(tmp_path):
+    src_dir = Path(__file__).parent.joinpath("resources", "data_dirs")
+    service_dir = tmp_path / "src"
+    service_dir.mkdir()
+    for name in ("example-0.1.service.yaml", "example-0.1.conda.yaml"):
+        (service_dir / name).write_bytes((src_dir / name).read_bytes())
+    (service_dir / "data").mkdir()
+    (service_dir / "data" / "datafile.txt").write_text("data")
+    return service_dir
+
+
+def test_service_fingerprint_stable(service_dir):
+    service_file = service_dir / "example-0.1.service.yaml"
+    assert service_fingerprint(service_file, "conda") == service_fingerprint(service_file, "conda")
+
+
+@pytest.mark.parametrize(
+    "modify",
+    [
+        lambda d: (d / "example-0.1.service.yaml").write_text("name: changed\n"),
+        lambda d: (d / "example-0.1.conda.yaml").write_text("environment: {}\n"),
+        lambda d: (d / "data" / "datafile.txt").write_text("changed data"),
+        lambda d: (d / "data" / "newfile.txt").write_text(""),
+    ]
+)
+def test_service_fingerprint_changes(service_dir, modify):
+    service_file = service_dir / "example-0.1.service.yaml"
+    fingerprint = service_fingerprint(service_file, "conda")
+    modify(service_dir)
+    assert service_fingerprint(service_file, "conda") != fingerprint
+
+
+@pytest.mark.parametrize(
+    "installer_name, options",
+    [
+        ("conda", {"launch_mode": "conda-run"}),
+        ("conda", {"job_threads": ThreadAllocation(cores=8, concurrency={"": 2})}),
+        ("docker", {"pool_size": 2}),
+        ("docker", {"launch_plan": True}),
+        ("docker", {"env_names": ["BLASTDB"]}),
+    ]
+)
+def test_service_fingerprint_changes_with_options(service_dir, installer_name, options):
+    service_file = service_dir / "example-0.1.service.yaml"
+    (service_dir / "example-0.1.docker.yaml").write_text("image: example\n")
+    default = rendering_options(installer_name, ThreadAllocation(cores=8))
+    assert service_fingerprint(service_file, installer_name, default) != service_fingerprint(
+        service_file,
+        installer_name,
+        rendering_options(installer_name, **{"job_threads": ThreadAllocation(cores=8), **options}),
+    )
+
+
+def test_install_state_up_to_date(tmp_path):
+    output_file = tmp_path / "services" / "example-0.1.service.yaml"
+    output_file.parent.mkdir()
+    output_file.touch()
+    state = InstallState(tmp_path)
+    state.begin_run()
+    state.started("example-0.1", "conda", "abc")
+    state.finished("example-0.1", "conda", "abc", output_file)
+    state.end_run()
+    state = InstallState(tmp_path)
+    assert state.begin_run() == set()
+    assert state.is_up_to_date("example-0.1", "conda", "abc")
+    assert not state.is_up_to_date("example-0.1", "conda", "def")
+    assert not state.is_up_to_date("example-0.1", "docker", "abc")
+
+
+def test_install_state_resumes_interrupted(tmp_path):
+    state = InstallState(tmp_path)
+    state.begin_run()
+    state.started("example-0.1", "conda", "abc")
+    state.started("example-0.2", "conda", "abc")
+    state.finished("example-0.2", "conda", "abc", tmp_path / "example-0.2.service.yaml")
+    # no end_run, installer crashed
+    state = InstallState(tmp_path)
+    assert state.begin_run() == {"example-0.1"}
+    assert not state.is_up_to_date("example-0.1", "conda", "abc")
+    state.started("example-0.1", "conda", "abc")
+    state.finished("example-0.1", "conda", "abc", tmp_path / "example-0.1.service.yaml")
+    state.end_run()
+    assert InstallState(tmp_path).begin_run() == set()
+
+
+def test_install_state_failure_is_not_interrupted(tmp_path):
+    state = InstallState(tmp_path)
+    state.begin_run()
+    state.started("example-0.1", "conda", "abc")
+    state.failed("example-0.1", "conda", RuntimeError("solve failed"))
+    state.end_run()
+    state = InstallState(tmp_path)
+    assert state.begin_run() == set()
+    # the journal of the finished run is truncated
+    assert len(state.journal_file.read_text().splitlines()) == 1
+
+
+# Test cases for the tracing of installation phases
+
+def test_tracer_disabled_records_nothing():
+    tracer = Tracer()
+    with tracer.span("phase", service="example") as span:
+        span["bytes"] = 10
+    assert tracer.spans == []
+
+
+def test_tracer_spans_count_subprocesses(tmp_path):
+    tracer = Tracer()
+    tracer.start(tmp_path / "trace.jsonl")
+    with tracer.span("install", service="example"):
+        with tracer.span("copy", mode="copy") as span:
+            span["bytes"] = 1024
+            subprocess.run(["true"])
+        subprocess.run(["true"])
+    with pytest.raises(RuntimeError):
+        with tracer.span("failing"):
+            raise RuntimeError
+    tracer.finish(chrome_trace=tmp_path / "trace.json")
+    copy, install, failing = tracer.spans
+    assert copy["name"] == "copy"
+    assert copy["bytes"] == 1024
+    assert copy["subprocesses"] == 1
+    assert install["subprocesses"] == 2
+    assert install["start"] <= copy["start"]
+    assert install["duration"] >= copy["duration"]
+    assert failing["error"] == "RuntimeError"
+    lines = (tmp_path / "trace.jsonl").read_text().splitlines()
+    assert [json.loads(line)["name"] for line in lines] == ["copy", "install", "failing"]
+    events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+    assert [e["name"] for e in events if e["ph"] == "X"] == ["copy", "install", "failing"]
+    assert events[0]["args"] == {"mode": "copy", "bytes": 1024, "subprocesses": 1}
+
+
+def test_tracer_profile(tmp_path):
+    tracer = Tracer()
+    tracer.start(profile=True)
+    with tracer.profile_thread():
+        sum(range(1000))
+    tracer.finish(profile_file=tmp_path / "install.prof")
+    assert (tmp_path / "install.prof").stat().st_size > 0
+
+# Test cases for the verification of installed services
+
+def test_build_test_command(tmp_path):
+    input_file = tmp_path / "input.fa"
+    input_file.write_text(">seq\nACDE\n")
+    service = {
+        "env": {"TOOL_HOME": "${HOME}/tool"},
+        "command": ["tool", "${TOOL_HOME}/run"],
+        "parameters": {
+            "input": {"type": "file"},
+            "verbose": {"type": "flag", "default": False},
+            "quiet": {"type": "flag"},
+            "method": {"type": "choice"},
+            "count": {"type": "int", "default": 3},
+        },
+        "args": {
+            "input": {"arg": "--in=$(value)", "symlink": "data.fa"},
+            "verbose": {"arg": "-v"},
+            "quiet": {"arg": "-q"},
+            "method": {"arg": "-m=$(value)", "join": ","},
+            "count": {"arg": "-n $(value)"},
+            "_const": {"arg": "-o out.txt", "default": "present"},
+        },
+    }
+    work_dir = tmp_path / "job"
+    work_dir.mkdir()
+    args, env = build_test_command(
+        service,
+        {"input": str(input_file), "quiet": "true", "method": ["a", "b"]},
+        work_dir,
+        {"HOME": "/home/user"},
+    )
+    assert args == [
+        "tool", "/home/user/tool/run",
+        "--in=data.fa", "-q", "-m=a,b", "-n", "3", "-o", "out.txt",
+    ]
+    assert env == {"HOME": "/home/user", "TOOL_HOME": "/home/user/tool"}
+    assert (work_dir / "data.fa").resolve() == input_file
+
+
+@pytest.mark.parametrize(
+    "script, timeout, status",
+    [("exit 0", 10, "passed"), ("exit 3", 10, "failed"), ("sleep 10", 0.2, "timeout")],
+)
+def test_run_service_test(tmp_path, script, timeout, status):
+    result = run_service_test(["sh", "-c", script], dict(os.environ), tmp_path, timeout)
+    assert result["status"] == status
+    assert result["wall-time"] < 5
+    assert result["cpu-time"] >= 0
+    assert result["max-rss"] > 0
+    assert (tmp_path / "stdout").exists()
+
+
+def test_verify_baseline_regressions(tmp_path):
+    baseline = VerifyBaseline(tmp_path / "baseline.json", threshold=0.25)
+    baseline.update("tool", {"status": "passed", "wall-time": 2.0, "cpu-time": 1.0})
+    # existing entries are kept unless overwritten
+    baseline.update("tool", {"status": "passed", "wall-time": 9.0, "cpu-time": 9.0})
+    baseline.save()
+    baseline = VerifyBaseline(tmp_path / "baseline.json", threshold=0.25)
+    assert baseline.compare("tool", {"status": "passed", "wall-time": 2.4, "cpu-time": 1.2}) == []
+    regressions = baseline.compare("tool", {"status": "passed", "wall-time": 4.0, "cpu-time": 1.2})
+    assert len(regressions) == 1
+    assert regressions[0].startswith("wall-time 4.00 s, baseline 2.00 s")
+    assert baseline.compare("other", {"status": "passed", "wall-time": 4.0, "cpu-time": 1.2}) == []
+
+
+def test_verify_services(tmp_path):
+    (tmp_path / "services").mkdir()
+    (tmp_path / "testdata.txt").write_text("data")
+    for name, script in [("good-1.0", "cat input.txt"), ("bad-1.0", "exit 1")]:
+        (tmp_path / "services" / f"{name}.service.yaml").write_text(
+            f"command: [sh, -c, '{script}']\n"
+            "args:\n"
+            "  input:\n"
+            "    arg: $(value)\n"
+            "    symlink: input.txt\n"
+            "tests:\n"
+            "- applicable-runners: [default]\n"
+            f"  parameters: {{input: {tmp_path / 'testdata.txt'}}}\n"
+            "  timeout: 10\n"
+        )
+    assert not verify_services(tmp_path, ["good-1.0", "bad-1.0", "missing-1.0"], jobs=2)
+    baseline = json.loads((tmp_path / ".slivka-installer" / "verify-baseline.json").read_text())
+    assert list(baseline["tests"]) == ["good-1.0"]
+    verify_dir = tmp_path / ".slivka-installer" / "verify"
+    assert sorted(path.name for path in verify_dir.iterdir()) == ["bad-1.0"]
+    assert verify_services(tmp_path, ["good-1.0"])
+
+
+# Test cases for the data directory copy modes
+
+@pytest.fixture
+def data_tree(tmp_path):
+    src = tmp_path / "src"
+    (src / "sub").mkdir(parents=True)
+    for i in range(10):
+        (src / f"file{i}.txt").write_text(f"content {i}")
+    (src / "sub" / "nested.txt").write_text("nested")
+    return src
+
+
+@pytest.mark.parametrize("mode", ["auto", "reflink", "hardlink", "copy"])
+def test_copy_data_dirs_modes(tmp_path, data_tree, mode):
+    dst = tmp_path / "dst"
+    try:
+        copy_data_dirs([(data_tree, dst)], mode=mode, threads=4)
+    except OSError:
+        if mode == "reflink":
+            pytest.skip("Filesystem does not support reflinks")
+        raise
+    assert (dst / "file3.txt").read_text() == "content 3"
+    assert (dst / "sub" / "nested.txt").read_text() == "nested"
+
+
+def test_copy_data_dirs_hardlink_shares_inode(tmp_path, data_tree):
+    dst = tmp_path / "dst"
+    copy_data_dirs([(data_tree, dst)], mode="hardlink")
+    assert (dst / "file0.txt").samefile(data_tree / "file0.txt")
+
+
+def test_copy_data_dirs_symlink(tmp_path, data_tree):
+    dst = tmp_path / "dst"
+    copy_data_dirs([(data_tree, dst)], mode="symlink")
+    assert dst.is_symlink()
+    assert (dst / "sub" / "nested.txt").read_text() == "nested"
+
+
+def test_copy_data_dirs_overwrite_replaces_symlink(tmp_path, data_tree):
+    dst = tmp_path / "dst"
+    copy_data_dirs([(data_tree, dst)], mode="symlink")
+    copy_data_dirs([(data_tree, dst)], overwrite=True, mode="copy")
+    assert not dst.is_symlink()
+    assert (dst / "file1.txt").read_text() == "content 1"
+
+
+def test_sync_tree_skips_unchanged_files(tmp_path, data_tree):
+    dst = tmp_path / "dst"
+    sync_tree(data_tree, dst, mode="copy")
+    unchanged_inode = (dst / "file0.txt").stat().st_ino
+    (data_tree / "file1.txt").write_text("changed")
+    sync_tree(data_tree, dst, mode="copy", threads=4)
+    assert (dst / "file0.txt").stat().st_ino == unchanged_inode
+    assert (dst / "file1.txt").read_text() == "changed"
+
+
+@pytest.mark.parametrize("mode", ["copy", "symlink"])
+def test_copy_data_dirs_missing_source(tmp_path, mode):
+    dst = tmp_path / "dst"
+    with pytest.raises(FileNotFoundError):
+        copy_data_dirs([(tmp_path / "missing", dst)], mode=mode)
+    assert not dst.exists() and not dst.is_symlink()
+
+
+def test_sync_tree_source_not_directory(tmp_path):
+    (tmp_path / "file.txt").write_text("content")
+    with pytest.raises(NotADirectoryError):
+        sync_tree(tmp_path / "file.txt", tmp_path / "dst")
+
+
+def test_sync_tree_removes_extra_files(tmp_path, data_tree):
+    dst = tmp_path / "dst"
+    sync_tree(data_tree, dst, mode="copy")
+    (dst / "extra.txt").write_text("extra")
+    (dst / "extra_dir").mkdir()
+    sync_tree(data_tree, dst, mode="copy")
+    assert not (dst / "extra.txt").exists()
+    assert not (dst / "extra_dir").exists()
+
+
+# Test cases for the docker image introspection
+
+def test_shared_paths_context(tmp_path):
+    context = TemplateContext(
+        SharedPathsContextMap(tmp_path),
+        variables={"parser": "{{ shared-path:scripts }}/jalview"},
+    )
+    assert interpolate_string("{{ var:parser }}", context) == f"{tmp_path}/scripts/jalview"
+    with pytest.raises(KeyError):
+        SharedPathsContextMap(tmp_path)["runtime-path:scripts"]
+    required = context.required_keys(["var:parser", "which:jronn"])
+    assert SharedPathsContextMap.required_paths(required) == ["scripts"]
+
+
+def test_parse_introspection_output():
+    output = (
+        "PATH=/usr/bin:/bin\nPROTEIN_MPNN=/opt/mpnn\n"
+        "--- slivka-installer which ---\n"
+        "muscle=/usr/bin/muscle\ncd=cd\nmissing=\n"
+    )
+    env_vars, which = parse_introspection_output(output)
+    assert env_vars == {"PATH": "/usr/bin:/bin", "PROTEIN_MPNN": "/opt/mpnn"}
+    assert which == {"muscle": "/usr/bin/muscle", "cd": None, "missing": None}
+
+
+@pytest.fixture
+def fake_docker(tmp_path):
+    """Docker stand-in running the entrypoint on the host."""
+    log_file = tmp_path / "docker.log"
+    docker_exe = tmp_path / "docker"
+    docker_exe.write_text(
+        "#!/bin/sh\n"
+        f'printf "%s\\n" "$*" >> "{log_file}"\n'
+        'if [ "$1" = image ]; then echo "${FAKE_IMAGE_ID:-sha256:1}"; exit 0; fi\n'
+        "shift 3\n"  # run --rm --entrypoint
+        'entrypoint="$1"\n'
+        "shift 2\n"  # <entrypoint> <image>
+        'exec "$entrypoint" "$@"\n'
+    )
+    docker_exe.chmod(0o755)
+    return docker_exe, log_file
+
+
+def test_docker_env_context_prefetch_single_container(fake_docker):
+    docker_exe, log_file = fake_docker
+    context = DockerEnvContextMap(str(docker_exe), "image")
+    context.prefetch(["which:sh", "which:nonexistent-program", "env:PATH", "var:x"])
+    assert context["which:sh"].endswith("/sh")
+    assert context["env:PATH"] == os.environ["PATH"]
+    with pytest.raises(FileNotFoundError):
+        context["which:nonexistent-program"]
+    assert len(log_file.read_text().splitlines()) == 1
+
+
+@pytest.mark.parametrize("prefetch", [True, False])
+def test_template_context_reports_all_missing_docker_executables(fake_docker, prefetch):
+    docker_exe, _ = fake_docker
+    docker_context = DockerEnvContextMap(str(docker_exe), "image")
+    keys = ["which:sh", "which:missing-program-a", "which:missing-program-b"]
+    if prefetch:
+        docker_context.prefetch(keys)
+    with pytest.raises(UnresolvedPlaceholdersError) as exc_info:
+        TemplateContext(docker_context).resolve(keys)
+    assert list(exc_info.value.errors) == ["which:missing-program-a", "which:missing-program-b"]
+
+
+def test_docker_env_context_uses_cache(tmp_path, fake_docker):
+    docker_exe, log_file = fake_docker
+    cache = ImageIntrospectionCache(tmp_path / "cache")
+    keys = ["which:sh", "env:PATH"]
+    DockerEnvContextMap(str(docker_exe), "image", cache).prefetch(keys)
+    context = DockerEnvContextMap(str(docker_exe), "image", cache)
+    context.prefetch(keys)
+    assert context["which:sh"].endswith("/sh")
+    assert context["env:PATH"] == os.environ["PATH"]
+    runs = [line for line in log_file.read_text().splitlines() if line.startswith("run")]
+    assert len(runs) == 1
+
+
+def test_docker_env_context_cache_invalidated_by_image_id(tmp_path, fake_docker, monkeypatch):
+    docker_exe, log_file = fake_docker
+    cache = ImageIntrospectionCache(tmp_path / "cache")
+    DockerEnvContextMap(str(docker_exe), "image", cache).prefetch(["which:sh"])
+    monkeypatch.setenv("FAKE_IMAGE_ID", "sha256:2")
+    DockerEnvContextMap(str(docker_exe), "image", cache).prefetch(["which:sh"])
+    runs = [line for line in log_file.read_text().splitlines() if line.startswith("run")]
+    assert len(runs) == 2
+
+
+# Test cases for the docker image builds
+
+def test_dockerfile_digest(tmp_path):
+    dockerfile = tmp_path / "Dockerfile"
+    dockerfile.write_text("FROM debian:12-slim\n")
+    digest = dockerfile_digest(dockerfile)
+    assert dockerfile_digest(dockerfile) == digest
+    assert dockerfile_digest(dockerfile, "linux/amd64") != digest
+    dockerfile.write_text("FROM debian:11-slim\n")
+    assert dockerfile_digest(dockerfile) != digest
+
+
+def test_make_bake_plan(tmp_path):
+    specs = [
+        {
+            "dockerfile": tmp_path / "aacon-1.1" / "Dockerfile",
+            "tag": "aacon:1.1",
+            "platform": None,
+            "digest": "abc",
+        },
+        {
+            "dockerfile": tmp_path / "mafft" / "mafft-7.475.Dockerfile",
+            "tag": "mafft:7.475-debian",
+            "platform": "linux/amd64",
+            "digest": "def",
+        },
+    ]
+    plan = make_bake_plan(specs, cache_dir=tmp_path / "cache")
+    assert plan["group"]["default"]["targets"] == ["aacon_1_1", "mafft_7_475-debian"]
+    target = plan["target"]["mafft_7_475-debian"]
+    assert target["context"] == str(tmp_path / "mafft")
+    assert target["dockerfile"] == "mafft-7.475.Dockerfile"
+    assert target["tags"] == ["mafft:7.475-debian"]
+    assert target["platforms"] == ["linux/amd64"]
+    assert target["cache-from"] == [f"type=local,src={tmp_path / 'cache' / 'mafft_7_475-debian'}"]
+    assert "platforms" not in plan["target"]["aacon_1_1"]
+
+
+@pytest.mark.parametrize(
+    ("output", "status", "expected"),
+    [
+        ("Name:   default\nDriver: docker\n", 0, "docker"),
+        ("Name:   builder\nDriver: docker-container\n", 0, "docker-container"),
+        ("", 1, None),
+    ]
+)
+def test_buildx_driver(tmp_path, output, status, expected):
+    docker_exe = tmp_path / "docker"
+    docker_exe.write_text(f"#!/bin/sh\nprintf '{output}'\nexit {status}\n")
+    docker_exe.chmod(0o755)
+    assert buildx_driver(str(docker_exe)) == expected
+
+
+@pytest.mark.parametrize(
+    ("config", "expected"),
+    [
+        ({"pull": "biocontainers/muscle:v1-3.8.1551-2-deb_cv1"}, "biocontainers/muscle:v1-3.8.1551-2-deb_cv1"),
+        ({"pull": {"image": "biocontainers/clustalo", "tag": "v1.2.4"}}, "biocontainers/clustalo:v1.2.4"),
+        ({"build": {"dockerfile": "Dockerfile", "image": "aacon", "tag": "1.1"}}, "aacon:1.1"),
+        ({"build": {"dockerfile": "Dockerfile", "image": "aacon"}}, "aacon"),
+    ]
+)
+def test_image_reference(config, expected):
+    assert image_reference(config) == expected
+
+
+@pytest.fixture
+def docker_services(tmp_path):
+    (tmp_path / "aacon-1.1.docker.yaml").write_text(
+        "build:\n  dockerfile: Dockerfile\n  image: aacon\n  tag: '1.1'\n"
+    )
+    (tmp_path / "Dockerfile").write_text("FROM eclipse-temurin:17-jre-jammy\n")
+    (tmp_path / "clustalo-1.2.4.docker.yaml").write_text(
+        "pull:\n  image: biocontainers/clustalo\n  tag: v1.2.4-2-deb_cv1\n"
+    )
+    return [tmp_path / "aacon-1.1.docker.yaml", tmp_path / "clustalo-1.2.4.docker.yaml"]
+
+
+def test_check_bundle_manifest_up_to_date(docker_services):
+    manifest = make_bundle_manifest(docker_services)
+    assert check_bundle_manifest(manifest, docker_services) == []
+
+
+def test_check_bundle_manifest_stale(docker_services):
+    manifest = make_bundle_manifest(docker_services)
+    docker_services[0].with_name("Dockerfile").write_text("FROM debian:12\n")
+    docker_services[1].write_text("pull: biocontainers/clustalo:latest\n")
+    problems = check_bundle_manifest(manifest, docker_services)
+    assert len(problems) == 2
+    assert problems[0].startswith("aacon-1.1:")
+    assert problems[1].startswith("clustalo-1.2.4:")
+
+
+# Test cases for the captured conda activation
+
+@pytest.fixture
+def fake_conda(tmp_path):
+    conda = tmp_path / "conda"
+    conda.write_text(
+        "#!/bin/sh\n"
+        "# run -p PREFIX COMMAND...\n"
+        "prefix=$3\n"
+        "shift 3\n"
+        "PATH=$prefix/bin:$PATH CONDA_PREFIX=$prefix CONDA_SHLVL=1 "
+        "JAVA_HOME=$prefix/lib/jvm exec \"$@\"\n"
+    )
+    conda.chmod(0o755)
+    return conda
+
+
+def test_capture_activation(tmp_path, fake_conda):
+    env_path = tmp_path / "env"
+    base_env = {"PATH": os.environ["PATH"], "HOME": "/home/slivka"}
+    env = capture_activation(fake_conda, env_path, base_env=base_env)
+    assert env == {
+        "PATH": f"{env_path}/bin:${{PATH}}",
+        "CONDA_PREFIX": str(env_path),
+        "JAVA_HOME": f"{env_path}/lib/jvm",
+    }
+
+
+def test_capture_activation_failed(tmp_path):
+    conda = tmp_path / "conda"
+    conda.write_text("#!/bin/sh\nexit 1\n")
+    conda.chmod(0o755)
+    with pytest.raises(subprocess.CalledProcessError):
+        capture_activation(conda, tmp_path / "env")
+
+
+# Test cases for packing and relocating conda environments
+
+def test_binary_replace_pads_with_nulls():
+    data = b"\0/opt/old/env/lib\0other\0"
+    replaced = binary_replace(data, b"/opt/old/env", b"/srv/env")
+    assert len(replaced) == len(data)
+    assert replaced == b"\0/srv/env/lib\0\0\0\0\0other\0"
+
+
+def test_binary_replace_longer_prefix():
+    with pytest.raises(ValueError):
+        binary_replace(b"/opt/env\0", b"/opt/env", b"/opt/longer/env")
+
+
+def _make_prefix(prefix: Path, old_prefix: str):
+    (prefix / "conda-meta").mkdir(parents=True)
+    (prefix / "bin").mkdir()
+    (prefix / "lib").mkdir()
+    (prefix / "conda-meta" / "example-1.0-0.json").write_text(json.dumps({
+        "paths_data": {"paths": [
+            {"_path": "lib/libexample.so", "prefix_placeholder": "/placeholder", "file_mode": "binary"},
+            {"_path": "lib/example.cfg", "prefix_placeholder": "/placeholder", "file_mode": "text"},
+            {"_path": "bin/untouched"},
+        ]}
+    }))
+    (prefix / "lib" / "libexample.so").write_bytes(b"ELF\0" + old_prefix.encode() + b"/lib\0")
+    (prefix / "lib" / "example.cfg").write_text(f"prefix={old_prefix}\n")
+    (prefix / "bin" / "tool").write_text(f"#!{old_prefix}/bin/python\n")
+    (prefix / "bin" / "tool").chmod(0o755)
+    (prefix / "bin" / "untouched").write_text(f"{old_prefix}\n")
+
+
+def test_relocate_prefix(tmp_path):
+    old_prefix = "/opt/slivka/conda_env/example-1.0"
+    prefix = tmp_path / "env"
+    _make_prefix(prefix, old_prefix)
+    relocate_prefix(prefix, old_prefix, "/srv/env")
+    assert (prefix / "lib" / "libexample.so").read_bytes() == (
+        b"ELF\0/srv/env/lib\0" + b"\0" * (len(old_prefix) - len("/srv/env"))
+    )
+    assert (prefix / "lib" / "example.cfg").read_text() == "prefix=/srv/env\n"
+    assert (prefix / "bin" / "tool").read_text() == "#!/srv/env/bin/python\n"
+    assert os.access(prefix / "bin" / "tool", os.X_OK)
+    assert (prefix / "bin" / "untouched").read_text() == f"{old_prefix}\n"
+
+
+def test_pack_and_unpack_conda_envs(tmp_path):
+    old_project = tmp_path / "a-long-project-directory-name"
+    env_path = old_project / "conda_env" / "example-1.0"
+    _make_prefix(env_path, str(env_path))
+    (old_project / "data" / "example-1.0" / "models").mkdir(parents=True)
+    (old_project / "data" / "example-1.0" / "models" / "model.dat").write_text("model")
+    service_file = old_project / "services" / "example-1.0.service.yaml"
+    service_file.parent.mkdir()
+    service_file.write_text(
+        f"command:\n- {sys.executable}\n- run\n- -p\n- {env_path}\n"
+        f"- {old_project}/data/example-1.0/models/model.dat\n"
+    )
+    state = InstallState(old_project)
+    state.finished("example-1.0", "conda", "abc", service_file)
+    state.finished("other-1.0", "docker", "abc", old_project / "other.service.yaml")
+    archive = tmp_path / "envs.tar.gz"
+    manifest = pack_conda_envs(old_project, ["example-1.0", "other-1.0"], archive)
+    assert list(manifest["services"]) == ["example-1.0"]
+
+    new_project = tmp_path / "project"
+    unpack_conda_envs(archive, new_project)
+    new_env = new_project / "conda_env" / "example-1.0"
+    assert (new_env / "lib" / "example.cfg").read_text() == f"prefix={new_env}\n"
+    assert (new_project / "data" / "example-1.0" / "models" / "model.dat").read_text() == "model"
+    service_text = (new_project / "services" / "example-1.0.service.yaml").read_text()
+    assert str(old_project) not in service_text
+    assert f"- {new_env}\n" in service_text
+    assert InstallState(new_project).is_up_to_date("example-1.0", "conda", "abc")
+
+
+def test_unpack_conda_envs_longer_prefix_fails_before_extracting(tmp_path):
+    old_project = tmp_path / "p"
+    env_path = old_project / "conda_env" / "example-1.0"
+    _make_prefix(env_path, str(env_path))
+    service_file = old_project / "services" / "example-1.0.service.yaml"
+    service_file.parent.mkdir()
+    service_file.write_text(f"command:\n- {env_path}/bin/tool\n")
+    InstallState(old_project).finished("example-1.0", "conda", "abc", service_file)
+    archive = tmp_path / "envs.tar"
+    pack_conda_envs(old_project, ["example-1.0"], archive)
+    new_project = tmp_path / "a-longer-project-directory"
+    with pytest.raises(ValueError):
+        unpack_conda_envs(archive, new_project)
+    assert not new_project.exists()
+
+
+def test_replace_path_matches_whole_segments():
+    text = "/srv/proj/services /srv/project2/data /srv/proj\n/x/srv/proj /srv/proj.bak"
+    assert replace_path(text, "/srv/proj", "/opt/p") == (
+        "/opt/p/services /srv/project2/data /opt/p\n/x/srv/proj /srv/proj.bak"
+    )
+
+
+def test_copy_shared_files_replaces_changed_scripts(tmp_path, monkeypatch):
+    src = tmp_path / "src"
+    (src / "shared" / "scripts" / "jalview").mkdir(parents=True)
+    (src / "shared" / "services").mkdir()
+    (src / "shared" / "scripts" / "run_with_docker.sh").write_text("new launcher")
+    (src / "shared" / "scripts" / "jalview" / "__init__.py").write_text("new package")
+    (src / "shared" / "services" / "_profiles.yaml").write_text("new profiles")
+    project = tmp_path / "project"
+    (project / "scripts" / "jalview").mkdir(parents=True)
+    (project / "services").mkdir()
+    (project / "scripts" / "run_with_docker.sh").write_text("old launcher")
+    (project / "scripts" / "jalview" / "__init__.py").write_text("old package")
+    (project / "services" / "_profiles.yaml").write_text("edited profiles")
+    monkeypatch.chdir(src)
+    copy_shared_files(project)
+    assert (project / "scripts" / "run_with_docker.sh").read_text() == "new launcher"
+    assert (project / "scripts" / "jalview" / "__init__.py").read_text() == "new package"
+    assert (project / "services" / "_profiles.yaml").read_text() == "edited profiles"
@@ -0,0 +1,213 @@
+import functools
+import importlib.util
+import io
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).parent.parent
+SHARED_SCRIPTS = REPO_ROOT / "shared" / "scripts"
+RESOURCES = Path(__file__).parent / "resources" / "jalview"
+
+sys.path.insert(0, str(SHARED_SCRIPTS))
+
+from jalview import (  # noqa: E402
+    AnnotationWriter,
+    FeatureWriter,
+    Graph,
+    Graphline,
+    GraphType,
+    Output,
+    convert,
+    format_values,
+    parse_ranges,
+    read_score_lines,
+)
+from jalview.sharding import split_records  # noqa: E402
+
+
+def run_parser(service, *args, cwd):
+    script = REPO_ROOT / "services" / service / "scripts" / "jalview_parser.py"
+    subprocess.run(
+        [sys.executable, script, *args],
+        cwd=cwd,
+        env={**os.environ, "PYTHONPATH": str(SHARED_SCRIPTS)},
+        check=True,
+    )
+
+
+@pytest.mark.parametrize(
+    "service, args, outputs",
+    [
+        ("jronn-3.1b", ["--annot", "jronn.jvannot", RESOURCES / "jronn.out"], ["jronn.jvannot"]),
+        ("aacon-1.1", ["--annot", "aacon.jvannot", RESOURCES / "aacon.out"], ["aacon.jvannot"]),
+        (
+            "disembl-1.4",
+            ["-i", RESOURCES / "disembl.out", "-a", "disembl.jvannot", "-f", "disembl.jvfeat"],
+            ["disembl.jvannot", "disembl.jvfeat"],
+        ),
+        (
+            "globplot-2.3",
+            ["-i", RESOURCES / "globplot.out", "-a", "globplot.jvannot", "-f", "globplot.jvfeat"],
+            ["globplot.jvannot", "globplot.jvfeat"],
+        ),
+        (
+            "rnaalifold-2.6.4",
+            ["--alifold", RESOURCES / "alifold.out", RESOURCES / "rnaalifold.out", "rnaalifold.jvannot"],
+            ["rnaalifold.jvannot"],
+        ),
+        (
+            "rnaalifold-2.6.4",
+            [RESOURCES / "rnaalifold.out", "rnaalifold-nocontacts.jvannot"],
+            ["rnaalifold-nocontacts.jvannot"],
+        ),
+    ],
+)
+def test_parser_output(tmp_path, service, args, outputs):
+    run_parser(service, *args, cwd=tmp_path)
+    for name in outputs:
+        assert (tmp_path / name).read_text() == (RESOURCES / name).read_text()
+
+
+def test_format_values():
+    assert format_values(["0.1", "-2.0"]) == "0.1,0.1|-2.0,-2.0"
+    assert format_values([]) == ""
+
+
+def test_annotation_writer_batches_lines():
+    file = io.StringIO()
+    writer = AnnotationWriter(file, batch_size=9)
+    for name in ("a", "b", "c"):
+        writer.sequence_ref(name)
+        writer.write_graph(
+            Graph(GraphType.LINE_GRAPH, "Score", "Scores", ["1.0"]),
+            Graphline("0.5", "Above 0.5", "ff0000"),
+            "00ff00",
+        )
+    # a batch of the header and the four lines of the first two sequences
+    assert file.getvalue().count("SEQUENCE_REF") == 2
+    assert "SEQUENCE_REF\tc" not in file.getvalue()
+    writer.flush()
+    assert file.getvalue().count("SEQUENCE_REF") == 3
+    assert file.getvalue().endswith(
+        "SEQUENCE_REF\tc\n"
+        "LINE_GRAPH\tScore\tScores\t1.0,1.0\n"
+        "GRAPHLINE\tScore\t0.5\tAbove 0.5\tff0000\n"
+        "COLOUR\tScore\t00ff00\n"
+    )
+
+
+def test_feature_writer():
+    file = io.StringIO()
+    with FeatureWriter(file, {"COILS": "cfdb48"}, group="Group") as writer:
+        writer.write_ranges("seq", [("1", "5")], "COILS", "Random coil")
+    assert file.getvalue() == (
+        "COILS\tcfdb48\n\n"
+        "STARTGROUP\tGroup\n"
+        "Random coil\tseq\t-1\t1\t5\tCOILS\n"
+        "ENDGROUP\tGroup\n"
+    )
+
+
+def test_parse_ranges():
+    assert parse_ranges("1-10, 25-40") == [("1", "10"), ("25", "40")]
+    assert parse_ranges("") == []
+
+
+def test_read_score_lines_rejects_other_lines():
+    with pytest.raises(ValueError):
+        list(read_score_lines(io.StringIO("#seq 0.1 0.2\nseq 0.3\n")))
+
+
+def load_parser(service):
+    path = REPO_ROOT / "services" / service / "scripts" / "jalview_parser.py"
+    name = f"{service.split('-')[0]}_parser"
+    if name not in sys.modules:
+        spec = importlib.util.spec_from_file_location(name, path)
+        # registered so that the workers can unpickle its functions
+        sys.modules[name] = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(sys.modules[name])
+    return sys.modules[name]
+
+
+@pytest.mark.parametrize(
+    "service, output, names",
+    [
+        ("disembl-1.4", "disembl.out", ["seq1 description", "seq2"]),
+        ("globplot-2.3", "globplot.out", ["seq1", "seq2 other"]),
+    ],
+)
+def test_read_records_streams_sequences(service, output, names):
+    parser = load_parser(service)
+    text = (RESOURCES / output).read_text()
+    file = io.StringIO(text)
+    records = parser.read_records(file)
+    assert next(records).name == names[0]
+    # the second sequence is not read before it is requested
+    assert file.tell() <= text.index(f"> {names[1]}")
+    assert [record.name for record in records] == names[1:]
+
+
+def test_split_records(tmp_path):
+    path = tmp_path / "input.out"
+    path.write_bytes(b"".join(b"> seq%d\n1\n2\n\n" % i for i in range(10)))
+    chunks = split_records(path, 4, b">")
+    assert chunks[0][0] == 0 and chunks[-1][1] == path.stat().st_size
+    assert all(end == start for (_, end), (start, _) in zip(chunks, chunks[1:]))
+    content = path.read_bytes()
+    assert all(content[start:start + 1] == b">" for start, _ in chunks)
+    assert len(chunks) == 4
+
+
+@pytest.mark.parametrize("jobs", [1, 3])
+def test_convert_sharded_disembl(tmp_path, jobs):
+    parser = load_parser("disembl-1.4")
+    records = (RESOURCES / "disembl.out").read_text().replace("seq", "{0}-seq")
+    input_path = tmp_path / "disembl.out"
+    input_path.write_text("".join(records.format(i) for i in range(50)))
+    outputs = [
+        Output(tmp_path / "disembl.jvannot", AnnotationWriter, parser.write_annotations),
+        Output(
+            tmp_path / "disembl.jvfeat",
+            functools.partial(FeatureWriter, colours=parser.FEATURE_COLOURS, group="DisemblWS"),
+            parser.write_features,
+        ),
+    ]
+    convert(input_path, parser.read_records, outputs, jobs=jobs, min_size=0)
+    annotations = (tmp_path / "disembl.jvannot").read_text()
+    assert annotations.startswith("JALVIEW_ANNOTATION\n\nSEQUENCE_REF\t0-seq1 description\n")
+    names = [line.split("\t")[1] for line in annotations.splitlines() if line.startswith("SEQUENCE_REF")]
+    assert names == [f"{i}-seq{n}" for i in range(50) for n in ("1 description", "2")]
+    features = (tmp_path / "disembl.jvfeat").read_text()
+    assert features.count("STARTGROUP") == features.count("ENDGROUP") == 1
+    assert features.endswith("Flexible loops\t49-seq2\t-1\t1\t2\tHOTLOOPS\n\nENDGROUP\tDisemblWS\n")
+    assert not list(tmp_path.glob(".fragments-*"))
+
+
+def test_disembl_wrapper_passes_parser_jobs(tmp_path):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    disembl = bin_dir / "DisEMBL"
+    disembl.write_text(f'#!/bin/sh\necho "$@" > args.txt\ncat {RESOURCES / "disembl.out"}\n')
+    disembl.chmod(0o755)
+    subprocess.run(
+        [
+            "bash", REPO_ROOT / "services" / "disembl-1.4" / "scripts" / "DisEMBL_wrapper.sh",
+            "--parser-jobs=2", "input.fa",
+        ],
+        cwd=tmp_path,
+        env={
+            **os.environ,
+            "PATH": f"{bin_dir}{os.pathsep}{os.environ['PATH']}",
+            "PYTHONPATH": str(SHARED_SCRIPTS),
+            "JALVIEW_PARSER_SCRIPT": str(
+                REPO_ROOT / "services" / "disembl-1.4" / "scripts" / "jalview_parser.py"
+            ),
+        },
+        check=True,
+    )
+    assert (tmp_path / "args.txt").read_text() == "input.fa\n"
+    assert (tmp_path / "disembl.jvfeat").read_text() == (RESOURCES / "disembl.jvfeat").read_text()
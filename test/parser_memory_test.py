@@ -0,0 +1,26 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+BENCHMARK_SCRIPT = Path(__file__).parent / "benchmarks" / "parser_memory.py"
+
+
+def test_parser_memory(tmp_path):
+    report_file = tmp_path / "report.json"
+    proc = subprocess.run(
+        [
+            sys.executable, BENCHMARK_SCRIPT,
+            "--counts", "5,50", "--length", "40", "--json", report_file,
+        ],
+        capture_output=True,
+        text=True,
+    )
+    assert proc.returncode == 0, proc.stdout + proc.stderr
+    rows = json.loads(report_file.read_text())
+    assert [(row["parser"], row["sequences"]) for row in rows] == [
+        ("disembl", 5), ("disembl", 50), ("globplot", 5), ("globplot", 50),
+    ]
+    assert all(row["status"] == "passed" for row in rows)
+    assert all(row["max-rss"] > 0 for row in rows)
+
@@ -0,0 +1,185 @@
+import json
+import os
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from install import write_docker_plan
+
+SCRIPT = Path(__file__).parent.parent / "shared" / "scripts" / "run_with_docker.sh"
+HARNESS_BIN = Path(__file__).parent / "harness" / "bin"
+
+
+@pytest.fixture
+def slivka_home(tmp_path):
+    home = tmp_path / "slivka"
+    (home / "uploads").mkdir(parents=True)
+    (home / "uploads" / "input.fa").write_text(">seq\nACDE\n")
+    return home
+
+
+def run_job(slivka_home, job_id, *args, input_file=None, **env):
+    job_dir = slivka_home / "jobs" / job_id
+    job_dir.mkdir(parents=True, exist_ok=True)
+    (job_dir / "input.fa").symlink_to(input_file or slivka_home / "uploads" / "input.fa")
+    proc = subprocess.run(
+        ["bash", SCRIPT, "--mount", "type=bind,src=/srv/data,dst=/data,ro", "tool:1.0", *args],
+        cwd=job_dir,
+        env={
+            **os.environ,
+            "PATH": f"{HARNESS_BIN}{os.pathsep}{os.environ['PATH']}",
+            "HARNESS_STATE": str(slivka_home.parent / "state"),
+            "HARNESS_LOG": str(slivka_home.parent / "calls.jsonl"),
+            "SLIVKA_HOME": str(slivka_home),
+            "SLIVKA_DOCKER_POOL_DIR": str(slivka_home.parent / "pool"),
+            **env,
+        },
+        capture_output=True,
+        text=True,
+    )
+    return proc, job_dir
+
+
+def docker_calls(slivka_home):
+    log_file = slivka_home.parent / "calls.jsonl"
+    calls = [json.loads(line)["command"] for line in log_file.read_text().splitlines()]
+    log_file.unlink()
+    return calls
+
+
+@pytest.fixture
+def tool_image(slivka_home):
+    subprocess.run(
+        [HARNESS_BIN / "docker", "pull", "tool:1.0"],
+        env={**os.environ, "HARNESS_STATE": str(slivka_home.parent / "state")},
+        check=True,
+    )
+
+
+def test_one_shot_run(slivka_home, tool_image):
+    proc, job_dir = run_job(slivka_home, "job1", "cat", "/etc/hostname")
+    assert proc.returncode == 0, proc.stderr
+    assert docker_calls(slivka_home) == ["run"]
+
+
+def test_pooled_run_reuses_container(slivka_home, tool_image):
+    proc, job_dir = run_job(slivka_home, "job1", "cat", "input.fa", SLIVKA_DOCKER_POOL="2")
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout == ">seq\nACDE\n"
+    assert docker_calls(slivka_home) == [
+        "image inspect", "inspect", "rm", "run", "inspect", "exec"
+    ]
+    proc, _ = run_job(slivka_home, "job2", "sh", "-c", "exit 3", SLIVKA_DOCKER_POOL="2")
+    assert proc.returncode == 3
+    assert docker_calls(slivka_home) == ["image inspect", "inspect", "exec"]
+    assert "docker exec" in (job_dir / ".docker.command").read_text()
+
+
+def test_pooled_run_evicts_idle_containers(slivka_home, tool_image):
+    run_job(slivka_home, "job1", "true", SLIVKA_DOCKER_POOL="1")
+    docker_calls(slivka_home)
+    used_file, = (slivka_home.parent / "pool").glob("*.used")
+    os.utime(used_file, (0, 0))
+    proc, _ = run_job(slivka_home, "job2", "true", SLIVKA_DOCKER_POOL="1")
+    assert proc.returncode == 0, proc.stderr
+    assert docker_calls(slivka_home) == [
+        "rm", "image inspect", "inspect", "rm", "run", "inspect", "exec"
+    ]
+
+
+def test_pooled_run_replaces_containers_of_rebuilt_image(slivka_home, tool_image):
+    run_job(slivka_home, "job1", "true", SLIVKA_DOCKER_POOL="1")
+    subprocess.run(
+        [HARNESS_BIN / "docker", "build", "--tag", "tool:1.0", "--label", "rebuilt=1", "."],
+        env={**os.environ, "HARNESS_STATE": str(slivka_home.parent / "state")},
+        check=True,
+    )
+    docker_calls(slivka_home)
+    proc, _ = run_job(slivka_home, "job2", "true", SLIVKA_DOCKER_POOL="1")
+    assert proc.returncode == 0, proc.stderr
+    assert docker_calls(slivka_home) == ["image inspect", "inspect", "rm", "run", "inspect", "exec"]
+    assert len(list((slivka_home.parent / "pool").glob("*.used"))) == 2
+
+
+def test_evict_idle_removes_containers(slivka_home, tool_image):
+    run_job(slivka_home, "job1", "true", SLIVKA_DOCKER_POOL="1")
+    docker_calls(slivka_home)
+    used_file, = (slivka_home.parent / "pool").glob("*.used")
+    os.utime(used_file, (0, 0))
+    subprocess.run(
+        ["bash", SCRIPT, "--evict-idle"],
+        env={
+            **os.environ,
+            "PATH": f"{HARNESS_BIN}{os.pathsep}{os.environ['PATH']}",
+            "HARNESS_STATE": str(slivka_home.parent / "state"),
+            "HARNESS_LOG": str(slivka_home.parent / "calls.jsonl"),
+            "SLIVKA_DOCKER_POOL_DIR": str(slivka_home.parent / "pool"),
+        },
+        check=True,
+    )
+    assert docker_calls(slivka_home) == ["rm"]
+    assert not used_file.exists()
+    assert not list((slivka_home.parent / "state" / "containers").iterdir())
+
+
+def test_pooled_run_falls_back_outside_work_root(slivka_home, tmp_path, tool_image):
+    (tmp_path / "elsewhere.fa").write_text(">seq\nACDE\n")
+    proc, _ = run_job(
+        slivka_home, "job1", "true", input_file=tmp_path / "elsewhere.fa", SLIVKA_DOCKER_POOL="1"
+    )
+    assert proc.returncode == 0, proc.stderr
+    assert docker_calls(slivka_home) == ["run"]
+
+
+def test_planned_run_collapses_link_mounts(slivka_home, tmp_path, tool_image):
+    plan_file = slivka_home / "services" / "tool.docker.plan"
+    write_docker_plan(
+        plan_file,
+        "tool:1.0",
+        ["--mount", "type=bind,src=/srv/my data,dst=/data,ro"],
+        ["TOOL_HOME", "OMP_*", "TOOL_HOME"],
+    )
+    job_dir = slivka_home / "jobs" / "job1"
+    job_dir.mkdir(parents=True)
+    for i in range(50):
+        (job_dir / f"input{i}.fa").symlink_to(slivka_home / "uploads" / "input.fa")
+    (slivka_home / "uploads" / "nested").mkdir()
+    (job_dir / "nested.fa").symlink_to(slivka_home / "uploads" / "nested" / "input.fa")
+    (job_dir / "other.fa").symlink_to(tmp_path / "elsewhere" / "other.fa")
+    (job_dir / "local.fa").symlink_to("input0.fa")
+    proc = subprocess.run(
+        ["bash", SCRIPT, "--plan", plan_file, "cat", "input0.fa"],
+        cwd=job_dir,
+        env={
+            "PATH": f"{HARNESS_BIN}{os.pathsep}{os.environ['PATH']}",
+            "HARNESS_STATE": str(tmp_path / "state"),
+            "TOOL_HOME": "/opt/tool",
+            "OMP_NUM_THREADS": "4",
+            "SECRET": "hidden",
+        },
+        capture_output=True,
+        text=True,
+    )
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout == ">seq\nACDE\n"
+    command = (job_dir / ".docker.command").read_text()
+    assert command.count("--mount") == 4
+    assert f"src={job_dir},dst={job_dir} " in command
+    assert "'type=bind,src=/srv/my data,dst=/data,ro'" in command
+    assert f"src={slivka_home / 'uploads'},dst={slivka_home / 'uploads'},ro" in command
+    assert f"src={tmp_path / 'elsewhere'},dst={tmp_path / 'elsewhere'},ro" in command
+    assert sorted((job_dir / ".docker.env").read_text().splitlines()) == [
+        "OMP_NUM_THREADS=4", "TOOL_HOME=/opt/tool",
+    ]
+
+
+def test_one_shot_run_skips_hidden_links(slivka_home, tool_image):
+    job_dir = slivka_home / "jobs" / "job1"
+    job_dir.mkdir(parents=True)
+    (job_dir / ".hidden.fa").symlink_to(slivka_home / "uploads" / "input.fa")
+    proc, _ = run_job(slivka_home, "job1", "cat", "input.fa")
+    assert proc.returncode == 0, proc.stderr
+    command = (job_dir / ".docker.command").read_text()
+    assert "dst=/root/input.fa,ro" in command
+    assert ".hidden.fa" not in command